@@ -0,0 +1,235 @@
+"""
+Autocomplete Module
+In-memory typeahead index for the oficina and proveedor pickers.
+
+Each entity keeps its rows in memory with two indexes over the
+normalized search text (upper case, no accents):
+- a sorted token list, searched with bisect for prefix matches
+  ("cal" -> CALI, "100" -> 10045)
+- a trigram index for substring/typo matches when prefixes are not enough
+
+Indexed fields:
+    oficinas:    cod_oficina, nombre, ciudad
+    proveedores: nit, nombre
+
+The index is built on startup and kept current by the crud
+create/update/delete functions. Other workers pick up changes on their
+next rebuild (AUTOCOMPLETE_REFRESH_S).
+"""
+import bisect
+import heapq
+import os
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+import models
+from manager_sync import normalize_nombre
+
+load_dotenv()
+
+AUTOCOMPLETE_REFRESH_S = float(os.getenv("AUTOCOMPLETE_REFRESH_S", "300"))
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+# Trigram matches must share at least this fraction of the query trigrams
+TRIGRAM_MIN_SCORE = 0.5
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class EntityIndex:
+    """Prefix + trigram index over the rows of one entity"""
+
+    def __init__(self, name: str, model, fields: Tuple[str, ...], code_field: str):
+        self.name = name
+        self.model = model
+        self.fields = fields
+        self.code_field = code_field
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        self.search_text: Dict[int, str] = {}
+        self.codes: Dict[int, str] = {}
+        self.trigrams: Dict[str, Set[int]] = {}
+        # Sorted (token, id); rebuilt lazily after writes
+        self._tokens: List[Tuple[str, int]] = []
+        self._tokens_dirty = False
+        self.built_at: Optional[float] = None
+
+    # --- Maintenance ---
+
+    def _row_from(self, obj) -> Dict[str, Any]:
+        return {"id": obj.id, **{f: getattr(obj, f) for f in self.fields}}
+
+    def upsert(self, obj):
+        """Add or replace one row (call after the crud commit)"""
+        self.remove(obj.id)
+        row = self._row_from(obj)
+        text = normalize_nombre(" ".join(str(row[f]) for f in self.fields if row[f]))
+        self.rows[obj.id] = row
+        self.search_text[obj.id] = text
+        self.codes[obj.id] = normalize_nombre(str(row[self.code_field] or ""))
+        for trigram in _trigrams(text):
+            self.trigrams.setdefault(trigram, set()).add(obj.id)
+        self._tokens_dirty = True
+
+    def remove(self, row_id: int):
+        text = self.search_text.pop(row_id, None)
+        if text is None:
+            return
+        self.rows.pop(row_id, None)
+        self.codes.pop(row_id, None)
+        for trigram in _trigrams(text):
+            ids = self.trigrams.get(trigram)
+            if ids is not None:
+                ids.discard(row_id)
+                if not ids:
+                    del self.trigrams[trigram]
+        self._tokens_dirty = True
+
+    def load(self, objects):
+        self.rows.clear()
+        self.search_text.clear()
+        self.codes.clear()
+        self.trigrams.clear()
+        for obj in objects:
+            self.upsert(obj)
+        self._rebuild_tokens()
+        self.built_at = time.monotonic()
+
+    def _rebuild_tokens(self):
+        self._tokens = sorted(
+            (token, row_id) for row_id, text in self.search_text.items() for token in set(text.split())
+        )
+        self._tokens_dirty = False
+
+    @property
+    def stale(self) -> bool:
+        return self.built_at is None or time.monotonic() - self.built_at > AUTOCOMPLETE_REFRESH_S
+
+    # --- Search ---
+
+    def _prefix_range(self, prefix: str) -> Tuple[int, int]:
+        """Slice of the sorted token list whose tokens start with prefix"""
+        tokens = self._tokens
+        lo = bisect.bisect_left(tokens, (prefix, -1))
+        hi = bisect.bisect_left(tokens, (prefix + "\uffff", -1), lo)
+        return lo, hi
+
+    def _prefix_candidates(self, words: List[str]) -> Set[int]:
+        """Rows where every word prefix-matches one of the row's words"""
+        ranges = sorted(((self._prefix_range(word), word) for word in words),
+                        key=lambda item: item[0][1] - item[0][0])
+        (lo, hi), _ = ranges[0]
+        # Start from the most selective word, check the rest on the row text
+        candidates = {row_id for _, row_id in self._tokens[lo:hi]}
+        for _, word in ranges[1:]:
+            candidates = {
+                row_id for row_id in candidates
+                if any(token.startswith(word) for token in self.search_text[row_id].split())
+            }
+            if not candidates:
+                break
+        return candidates
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Top matches for the query.
+        Every query word must prefix-match a word of the row; rows whose code
+        starts with the query rank first. Falls back to trigram similarity.
+        """
+        words = normalize_nombre(query).split()
+        if not words:
+            return []
+        if self._tokens_dirty:
+            self._rebuild_tokens()
+
+        candidates = self._prefix_candidates(words)
+
+        joined = " ".join(words)
+        scored: Dict[int, float] = {}
+        for row_id in candidates:
+            code = self.codes[row_id]
+            if code == joined:
+                score = 3.0
+            elif code.startswith(joined):
+                score = 2.0
+            elif self.search_text[row_id].startswith(joined):
+                score = 1.5
+            else:
+                score = 1.0
+            scored[row_id] = score
+
+        if len(scored) < limit:
+            for row_id, similarity in self._trigram_matches(joined, limit * 4):
+                scored.setdefault(row_id, similarity * 0.9)
+
+        ranked = heapq.nsmallest(limit, scored.items(), key=lambda item: (-item[1], self.search_text[item[0]]))
+        return [self.rows[row_id] for row_id, _ in ranked]
+
+    def _trigram_matches(self, text: str, max_results: int) -> List[Tuple[int, float]]:
+        query_trigrams = _trigrams(text)
+        counts: Dict[int, int] = {}
+        for trigram in query_trigrams:
+            for row_id in self.trigrams.get(trigram, ()):
+                counts[row_id] = counts.get(row_id, 0) + 1
+        total = len(query_trigrams)
+        minimum = total * TRIGRAM_MIN_SCORE
+        best = heapq.nlargest(max_results, ((n, row_id) for row_id, n in counts.items() if n >= minimum))
+        return [(row_id, n / total) for n, row_id in best]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rows": len(self.rows),
+            "tokens": len(self._tokens),
+            "trigrams": len(self.trigrams),
+            "age_s": round(time.monotonic() - self.built_at, 1) if self.built_at else None,
+        }
+
+
+INDEXES: Dict[str, EntityIndex] = {
+    "oficinas": EntityIndex("oficinas", models.Oficina, ("cod_oficina", "nombre", "ciudad"), "cod_oficina"),
+    "proveedores": EntityIndex("proveedores", models.Proveedor, ("nit", "nombre"), "nit"),
+}
+
+
+async def rebuild(db: AsyncSession, entity: str):
+    index = INDEXES[entity]
+    result = await db.execute(select(index.model))
+    index.load(result.scalars().all())
+
+
+async def build_all():
+    """Build every index (app startup). Failures are logged, the index builds on first use."""
+    from database import SessionLocal
+
+    try:
+        async with SessionLocal() as db:
+            for entity in INDEXES:
+                await rebuild(db, entity)
+        print(f"[INFO] Autocomplete: {', '.join(f'{k}={len(v.rows)}' for k, v in INDEXES.items())}")
+    except Exception as e:
+        print(f"Warning: no se pudo construir el indice de autocompletado: {e}")
+
+
+async def search(db: AsyncSession, entity: str, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    index = INDEXES[entity]
+    if index.stale:
+        await rebuild(db, entity)
+    return index.search(query, limit)
+
+
+def upsert(entity: str, obj):
+    """Keep the index current after a crud write"""
+    index = INDEXES[entity]
+    if index.built_at is not None:
+        index.upsert(obj)
+
+
+def remove(entity: str, row_id: int):
+    index = INDEXES[entity]
+    if index.built_at is not None:
+        index.remove(row_id)
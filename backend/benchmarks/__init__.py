@@ -0,0 +1,8 @@
+"""
+Benchmarks for the invoice, report and causacion hot paths.
+
+    cd backend
+    python -m benchmarks.run_benchmarks --scales small,medium --output resultados.json
+
+See run_benchmarks.py for the options.
+"""
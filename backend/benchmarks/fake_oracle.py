@@ -0,0 +1,110 @@
+"""
+In-process stand-in for the Manager Oracle database.
+
+Replaces oracle_database.get_oracle_connection with a fake connection
+that answers the queries the API makes (MNGDNO, MNGCCO, VINCULADO,
+consecutivos) from the synthetic dataset, after a fixed latency. It goes
+through run_oracle and the thread pool like the real driver, so Oracle
+timings in the benchmark include the executor overhead.
+"""
+import time
+from typing import Dict, List, Optional
+
+import oracle_database
+
+
+class FakeCursor:
+    def __init__(self, oracle: "FakeOracle"):
+        self.oracle = oracle
+        self.rows: List[tuple] = []
+        self.arraysize = 100
+        self.description = None
+        self.rowcount = 0
+
+    def execute(self, query: str, params: Optional[dict] = None):
+        self.oracle.calls += 1
+        if self.oracle.latency_ms:
+            time.sleep(self.oracle.latency_ms / 1000)
+        self.rows = self.oracle.answer(" ".join(query.upper().split()), params or {})
+        self.rowcount = len(self.rows)
+
+    def executemany(self, query: str, rows):
+        self.oracle.calls += 1
+        if self.oracle.latency_ms:
+            time.sleep(self.oracle.latency_ms / 1000)
+        self.rowcount = len(rows)
+
+    def fetchall(self) -> List[tuple]:
+        return self.rows
+
+    def fetchone(self) -> Optional[tuple]:
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, oracle: "FakeOracle"):
+        self.oracle = oracle
+        self.call_timeout = 0
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self.oracle)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def cancel(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeOracle:
+    """Answers Manager queries from the synthetic dataset"""
+
+    def __init__(self, dataset: Dict[str, List[dict]], latency_ms: float = 5.0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+        self.centros = {row["codigo"]: row["nombre"] for row in dataset["manager_centros_costo"]}
+        self.oficinas = dataset["manager_oficinas"]
+        self.vinculados = dataset["manager_vinculados"]
+        self._patched = []
+
+    def answer(self, query: str, params: dict) -> List[tuple]:
+        if "FROM MANAGER.MNGDNO" in query:
+            codigo = params.get("codigo")
+            rows = [o for o in self.oficinas if codigo is None or o["codigo"] == str(codigo).strip()]
+            if "MNGCCO" in query:
+                return [(o["codigo"], o["nombre"], o["codigo_ccosto"], self.centros.get(o["codigo_ccosto"]))
+                        for o in rows]
+            return [(o["codigo"], o["nombre"], o["codigo_ccosto"]) for o in rows]
+        if "FROM MANAGER.MNGCCO" in query:
+            return list(self.centros.items())
+        if "FROM MANAGER.VINCULADO" in query:
+            nit = params.get("nit")
+            return [(v["nit"], v["nombre"]) for v in self.vinculados
+                    if nit is None or v["nit"] == str(nit).strip()]
+        if "MAX(" in query:
+            return [(1000,)]
+        return []
+
+    def connect(self):
+        return FakeConnection(self)
+
+    def install(self, *modules):
+        """Patch get_oracle_connection in oracle_database and in the given modules"""
+        for module in (oracle_database, *modules):
+            if hasattr(module, "get_oracle_connection"):
+                self._patched.append((module, module.get_oracle_connection))
+                module.get_oracle_connection = self.connect
+
+    def uninstall(self):
+        for module, original in reversed(self._patched):
+            module.get_oracle_connection = original
+        self._patched.clear()
@@ -0,0 +1,199 @@
+"""
+Synthetic data for the benchmarks.
+
+Generates N proveedores, M oficinas, one or two contratos per oficina and
+12 months of facturas. Each factura covers several oficinas of the same
+proveedor (factura_oficinas), like the real monthly internet invoices.
+Also fills the Manager mirror tables (oficinas, centros de costo,
+vinculados) so causacion and archivo plano resolve centros de costo
+locally.
+
+The data is deterministic for a given seed, so runs are comparable.
+"""
+import random
+from dataclasses import dataclass
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, List
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+import models
+
+
+@dataclass
+class Scale:
+    name: str
+    proveedores: int
+    oficinas: int
+    meses: int = 12
+    oficinas_por_factura: int = 8
+
+
+SCALES: Dict[str, Scale] = {
+    "small": Scale("small", proveedores=10, oficinas=100),
+    "medium": Scale("medium", proveedores=40, oficinas=600),
+    "large": Scale("large", proveedores=100, oficinas=2500),
+}
+
+TIPOS = ["Fijo", "Movil", "Colaboracion", "Leasing"]
+CIUDADES = ["CALI", "PALMIRA", "BUGA", "TULUA", "JAMUNDI", "YUMBO", "CARTAGO"]
+# Manager office codes: cod_oficina "NNxxx" maps to Manager code "NN"
+MANAGER_CODIGOS = [str(n) for n in range(10, 100)]
+
+
+def cod_oficina_for(index: int) -> str:
+    """5-digit local code whose first two digits are the Manager office code"""
+    return f"{MANAGER_CODIGOS[index % len(MANAGER_CODIGOS)]}{index // len(MANAGER_CODIGOS):03d}"
+
+
+def build_dataset(scale: Scale, seed: int = 42, hasta: date = None) -> Dict[str, List[dict]]:
+    """Rows per table, ready for bulk insert"""
+    rng = random.Random(seed)
+    hasta = hasta or date.today().replace(day=1)
+
+    proveedores = [
+        {"id": i, "nit": f"9{i:08d}", "nombre": f"PROVEEDOR {i} TELECOMUNICACIONES SAS"}
+        for i in range(1, scale.proveedores + 1)
+    ]
+
+    centros_costo = [{"codigo": f"CC{c}", "nombre": f"CENTRO DE COSTO {c}"} for c in MANAGER_CODIGOS]
+    manager_oficinas = [
+        {"codigo": c, "nombre": f"OFICINA MANAGER {c}", "codigo_ccosto": f"CC{c}"} for c in MANAGER_CODIGOS
+    ]
+    vinculados = [
+        {"nit": p["nit"], "nombre": p["nombre"], "nombre_normalizado": p["nombre"]} for p in proveedores
+    ]
+
+    oficinas = []
+    for i in range(1, scale.oficinas + 1):
+        cod = cod_oficina_for(i)
+        oficinas.append({
+            "id": i,
+            "cod_oficina": cod,
+            "nombre": f"OFICINA {cod}",
+            "tipo_sitio": rng.choice(["OFICINA", "PUNTO DE VENTA"]),
+            "direccion": f"CALLE {rng.randint(1, 120)} # {rng.randint(1, 99)}-{rng.randint(1, 99)}",
+            "ciudad": rng.choice(CIUDADES),
+            "zona": rng.choice(["NORTE", "SUR", "CENTRO"]),
+            "codigo_ccosto": f"CC{cod[:2]}",
+        })
+
+    contratos = []
+    for oficina in oficinas:
+        for _ in range(rng.choice([1, 1, 2])):
+            proveedor = rng.choice(proveedores)
+            contratos.append({
+                "id": len(contratos) + 1,
+                "proveedor_id": proveedor["id"],
+                "oficina_id": oficina["id"],
+                "titular_nombre": proveedor["nombre"],
+                "titular_cc_nit": proveedor["nit"],
+                "num_contrato": f"CT-{len(contratos) + 1:06d}",
+                "fecha_inicio": date(hasta.year - 2, 1, 1),
+                "estado": "ACTIVO" if rng.random() < 0.9 else "CANCELADO",
+                "tipo": rng.choice(TIPOS),
+                "valor_mensual": Decimal(rng.randrange(80_000, 900_000, 1000)),
+                "tiene_iva": rng.choice(["si", "no"]),
+                "tiene_retefuente": "si",
+                "retefuente_pct": Decimal(4),
+            })
+
+    contratos_por_proveedor: Dict[int, List[dict]] = {}
+    for contrato in contratos:
+        if contrato["estado"] == "ACTIVO":
+            contratos_por_proveedor.setdefault(contrato["proveedor_id"], []).append(contrato)
+
+    facturas, factura_oficinas = [], []
+    for mes in range(scale.meses):
+        y, m = hasta.year, hasta.month - mes
+        while m <= 0:
+            y, m = y - 1, m + 12
+        fecha = date(y, m, 5)
+        for proveedor_id, activos in contratos_por_proveedor.items():
+            # Skip a few months so there are pending contracts to report
+            if rng.random() < 0.05:
+                continue
+            for start in range(0, len(activos), scale.oficinas_por_factura):
+                grupo = activos[start:start + scale.oficinas_por_factura]
+                factura_id = len(facturas) + 1
+                total = sum(c["valor_mensual"] for c in grupo)
+                facturas.append({
+                    "id": factura_id,
+                    "proveedor_id": proveedor_id,
+                    "numero_factura": f"FE{factura_id:07d}",
+                    "cufe": f"{rng.getrandbits(128):032x}",
+                    "fecha_factura": fecha,
+                    "fecha_vencimiento": fecha.replace(day=25),
+                    "valor": total,
+                    "estado": "ASIGNADA",
+                    "created_at": datetime(y, m, 6, 9, 0),
+                })
+                for contrato in grupo:
+                    factura_oficinas.append({
+                        "id": len(factura_oficinas) + 1,
+                        "factura_id": factura_id,
+                        "oficina_id": contrato["oficina_id"],
+                        "contrato_id": contrato["id"],
+                        "valor": contrato["valor_mensual"],
+                        "estado": "PENDIENTE",
+                    })
+
+    return {
+        "proveedores": proveedores,
+        "oficinas": oficinas,
+        "contratos": contratos,
+        "facturas": facturas,
+        "factura_oficinas": factura_oficinas,
+        "manager_centros_costo": centros_costo,
+        "manager_oficinas": manager_oficinas,
+        "manager_vinculados": vinculados,
+    }
+
+
+# Insert order (foreign keys)
+TABLE_MODELS = [
+    ("proveedores", models.Proveedor),
+    ("oficinas", models.Oficina),
+    ("contratos", models.Contrato),
+    ("facturas", models.Factura),
+    ("factura_oficinas", models.FacturaOficina),
+    ("manager_centros_costo", models.ManagerCentroCosto),
+    ("manager_oficinas", models.ManagerOficina),
+    ("manager_vinculados", models.ManagerVinculado),
+]
+
+INSERT_CHUNK_SIZE = 2000
+
+
+async def load_dataset(engine: AsyncEngine, dataset: Dict[str, List[dict]]):
+    """
+    Recreate the schema and bulk insert the dataset.
+    Destructive: only point this at a benchmark database.
+    """
+    from database import Base
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        for table, model in TABLE_MODELS:
+            rows = dataset.get(table, [])
+            for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+                await conn.execute(insert(model), rows[start:start + INSERT_CHUNK_SIZE])
+        # Mark the mirrors as synced so lookups read them instead of Oracle
+        now = datetime.now()
+        await conn.execute(insert(models.SyncWatermark), [
+            {"source": source, "last_success_at": now, "last_attempt_at": now, "status": "OK",
+             "row_count": len(dataset.get(source, []))}
+            for source in ("manager_centros_costo", "manager_oficinas", "manager_vinculados")
+        ])
+        if engine.dialect.name == "postgresql":
+            # Explicit ids were inserted: move the sequences past them
+            for table, model in TABLE_MODELS:
+                if "id" in model.__table__.c:
+                    await conn.exec_driver_sql(
+                        f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                        f"(SELECT COALESCE(MAX(id), 1) FROM {table}))"
+                    )
+            await conn.exec_driver_sql("ANALYZE")
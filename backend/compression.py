@@ -0,0 +1,213 @@
+"""
+Compression Module
+ASGI middleware that compresses responses with Brotli or gzip.
+
+Only text-like content types (JSON, text, CSV, XML, JS) are compressed.
+PDFs, XLSX workbooks and other zip-based files are already compressed and
+are sent untouched. Bodies smaller than COMPRESSION_MIN_SIZE are not worth
+the CPU and are also sent as is.
+
+StreamingResponse bodies are compressed chunk by chunk and flushed after
+each chunk, so streaming endpoints keep streaming.
+
+Brotli is used when the client accepts it and the brotli package is
+installed; otherwise gzip.
+"""
+import os
+import zlib
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+load_dotenv()
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "si", "yes")
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+# 4-5 gives most of the ratio of higher levels at a fraction of the CPU
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "5"))
+
+# Content types worth compressing (prefix match, parameters ignored)
+COMPRESSIBLE_TYPES = (
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "application/problem+json",
+    "image/svg+xml",
+    "text/",
+)
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    if not content_type:
+        return False
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    return any(media_type.startswith(t) for t in COMPRESSIBLE_TYPES)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick 'br' or 'gzip' from an Accept-Encoding header, or None"""
+    accepted = {}
+    for part in accept_encoding.split(","):
+        pieces = [p.strip() for p in part.split(";")]
+        coding = pieces[0].lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in pieces[1:]:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+
+    if BROTLI_AVAILABLE and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def weaken_etag(etag: str) -> str:
+    """A compressed body is not byte-identical to the original: mark the ETag weak"""
+    return etag if etag.startswith("W/") else f"W/{etag}"
+
+
+class _Compressor:
+    """Incremental compressor for one response body"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._brotli = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            # wbits=31: gzip container
+            self._zlib = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.process(data)
+        return self._zlib.compress(data)
+
+    def flush(self) -> bytes:
+        """Emit everything buffered so far (the stream stays open)"""
+        if self.encoding == "br":
+            return self._brotli.flush()
+        return self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+
+class CompressionMiddleware:
+    """
+    Pure ASGI middleware (does not buffer streaming responses).
+
+    Usage:
+        app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = _headers_dict(scope["headers"])
+        encoding = choose_encoding(request_headers.get("accept-encoding", ""))
+        # Range requests address bytes of the uncompressed body
+        if encoding is None or "range" in request_headers:
+            await self.app(scope, receive, send)
+            return
+
+        responder = _CompressionResponder(send, encoding, self.minimum_size)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, send, encoding: str, minimum_size: int):
+        self._send = send
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.start_message: Optional[dict] = None
+        self.compressor: Optional[_Compressor] = None
+        self.passthrough = False
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            headers = _headers_dict(message.get("headers", []))
+            if (message["status"] < 200 or message["status"] in (204, 206, 304)
+                    or "content-encoding" in headers
+                    or not is_compressible(headers.get("content-type"))):
+                self.passthrough = True
+                await self._send(message)
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None:
+            # First body chunk: decide now
+            if not more_body and len(body) < self.minimum_size:
+                self.passthrough = True
+                await self._send(self.start_message)
+                await self._send(message)
+                return
+
+            self.compressor = _Compressor(self.encoding)
+            if not more_body:
+                compressed = self.compressor.compress(body) + self.compressor.finish()
+                await self._send(self._compressed_start(len(compressed)))
+                await self._send({"type": "http.response.body", "body": compressed})
+                return
+
+            # Streaming: length is unknown up front
+            await self._send(self._compressed_start(None))
+
+        if more_body:
+            chunk = self.compressor.compress(body) + self.compressor.flush()
+        else:
+            chunk = self.compressor.compress(body) + self.compressor.finish()
+        await self._send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+    def _compressed_start(self, content_length: Optional[int]) -> dict:
+        headers: List[Tuple[bytes, bytes]] = []
+        vary = []
+        for name, value in self.start_message.get("headers", []):
+            key = name.lower()
+            if key == b"content-length":
+                continue
+            if key == b"vary":
+                vary.append(value.decode("latin-1"))
+                continue
+            if key == b"etag":
+                value = weaken_etag(value.decode("latin-1")).encode("latin-1")
+            headers.append((name, value))
+
+        if not any(v.strip() == "*" or "accept-encoding" in v.lower() for v in vary):
+            vary.append("Accept-Encoding")
+        headers.append((b"vary", ", ".join(vary).encode("latin-1")))
+        headers.append((b"content-encoding", self.encoding.encode("latin-1")))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode("latin-1")))
+        return {**self.start_message, "headers": headers}
+
+
+def _headers_dict(raw_headers) -> Dict[str, str]:
+    return {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in raw_headers}
@@ -0,0 +1,102 @@
+"""
+Contract Matching Module
+Detects the contrato that applies to a proveedor + oficina assignment.
+
+Priority when several contracts match:
+1. ACTIVO contracts first
+2. Contracts in force on the invoice date (fecha_inicio/fecha_fin)
+3. Newest fecha_inicio
+
+Lookups use the (proveedor_id, oficina_id, estado) index and are memoized on
+the session, so repeated oficinas within one request hit the database once.
+"""
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import and_, or_, case, func
+from typing import Dict, Iterable, List, Optional
+from datetime import date
+import models
+
+# Key in AsyncSession.info holding {(proveedor_id, oficina_id, fecha): contrato}
+MEMO_KEY = "contrato_match_memo"
+
+
+def priority_order(fecha: Optional[date] = None) -> List:
+    """ORDER BY clauses implementing the match priority"""
+    order = [case((models.Contrato.estado == 'ACTIVO', 0), else_=1)]
+    if fecha:
+        en_vigencia = and_(
+            or_(models.Contrato.fecha_inicio.is_(None), models.Contrato.fecha_inicio <= fecha),
+            or_(models.Contrato.fecha_fin.is_(None), models.Contrato.fecha_fin >= fecha)
+        )
+        order.append(case((en_vigencia, 0), else_=1))
+    order.append(models.Contrato.fecha_inicio.desc().nulls_last())
+    order.append(models.Contrato.id.desc())
+    return order
+
+
+def _memo(db: AsyncSession) -> dict:
+    return db.info.setdefault(MEMO_KEY, {})
+
+
+def clear_memo(db: AsyncSession):
+    """Forget memoized matches (call after contratos change)"""
+    db.info.pop(MEMO_KEY, None)
+
+
+async def find_contrato(db: AsyncSession, proveedor_id: int, oficina_id: int,
+                        fecha: Optional[date] = None) -> Optional[models.Contrato]:
+    """Best matching contrato for one proveedor + oficina, or None"""
+    matches = await find_contratos_batch(db, proveedor_id, [oficina_id], fecha)
+    return matches.get(oficina_id)
+
+
+async def find_contratos_batch(db: AsyncSession, proveedor_id: int, oficina_ids: Iterable[int],
+                               fecha: Optional[date] = None) -> Dict[int, models.Contrato]:
+    """
+    Best matching contrato for many oficinas of one proveedor in a single query.
+    Returns {oficina_id: contrato}; oficinas without a contract are omitted.
+    """
+    memo = _memo(db)
+    result: Dict[int, models.Contrato] = {}
+    pending = []
+    for oficina_id in dict.fromkeys(oficina_ids):
+        key = (proveedor_id, oficina_id, fecha)
+        if key in memo:
+            if memo[key] is not None:
+                result[oficina_id] = memo[key]
+        else:
+            pending.append(oficina_id)
+
+    if not pending:
+        return result
+
+    # Rank contracts per oficina and keep the first one
+    ranked = (
+        select(
+            models.Contrato.id,
+            func.row_number().over(
+                partition_by=models.Contrato.oficina_id,
+                order_by=priority_order(fecha)
+            ).label("prioridad")
+        )
+        .filter(
+            models.Contrato.proveedor_id == proveedor_id,
+            models.Contrato.oficina_id.in_(pending)
+        )
+        .subquery()
+    )
+    query_result = await db.execute(
+        select(models.Contrato)
+        .join(ranked, models.Contrato.id == ranked.c.id)
+        .filter(ranked.c.prioridad == 1)
+    )
+    found = {c.oficina_id: c for c in query_result.scalars().all()}
+
+    for oficina_id in pending:
+        contrato = found.get(oficina_id)
+        memo[(proveedor_id, oficina_id, fecha)] = contrato
+        if contrato is not None:
+            result[oficina_id] = contrato
+
+    return result
@@ -1,10 +1,15 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from sqlalchemy import or_
-from typing import List, Optional
-from datetime import datetime
+from sqlalchemy import or_, and_, func, literal, true, union_all
+from typing import AsyncIterator, List, Optional
+from datetime import datetime, date
 import models, schemas
+import contract_matching
+import manager_sync
+import response_cache
+import autocomplete
+import reference_data
 
 # --- Proveedor CRUD ---
 async def get_proveedor(db: AsyncSession, proveedor_id: int):
@@ -28,8 +33,12 @@ async def get_proveedores(db: AsyncSession, skip: int = 0, limit: int = 100, sea
 async def create_proveedor(db: AsyncSession, proveedor: schemas.ProveedorCreate):
     db_proveedor = models.Proveedor(**proveedor.model_dump())
     db.add(db_proveedor)
+    await db.flush()
+    await reference_data.record_change(db, "proveedores", db_proveedor.id)
     await db.commit()
+    response_cache.invalidate("proveedores")
     await db.refresh(db_proveedor)
+    autocomplete.upsert("proveedores", db_proveedor)
     return db_proveedor
 
 async def get_proveedor_by_nit(db: AsyncSession, nit: str):
@@ -67,9 +76,14 @@ async def get_oficinas(db: AsyncSession, skip: int = 0, limit: int = 100, search
 
 async def create_oficina(db: AsyncSession, oficina: schemas.OficinaCreate):
     db_oficina = models.Oficina(**oficina.model_dump())
+    await manager_sync.assign_codigo_ccosto(db, db_oficina)
     db.add(db_oficina)
+    await db.flush()
+    await reference_data.record_change(db, "oficinas", db_oficina.id)
     await db.commit()
+    response_cache.invalidate("oficinas")
     await db.refresh(db_oficina)
+    autocomplete.upsert("oficinas", db_oficina)
     return db_oficina
 
 # --- Contrato CRUD ---
@@ -106,7 +120,10 @@ async def get_contratos(db: AsyncSession, skip: int = 0, limit: int = 100, searc
 async def create_contrato(db: AsyncSession, contrato: schemas.ContratoCreate):
     db_contrato = models.Contrato(**contrato.model_dump())
     db.add(db_contrato)
+    await db.flush()
+    await reference_data.record_change(db, "contratos", db_contrato.id)
     await db.commit()
+    contract_matching.clear_memo(db)
     await db.refresh(db_contrato)
     # Return with relationships loaded
     return await get_contrato(db, db_contrato.id)
@@ -117,7 +134,7 @@ async def get_contratos_by_proveedor(db: AsyncSession, proveedor_id: int):
         select(models.Contrato)
         .options(selectinload(models.Contrato.oficina))
         .filter(models.Contrato.proveedor_id == proveedor_id)
-        .order_by(models.Contrato.estado.desc())  # ACTIVO first
+        .order_by(*contract_matching.priority_order())  # ACTIVO first
     )
     return result.scalars().all()
 
@@ -126,6 +143,7 @@ async def create_pago(db: AsyncSession, pago: schemas.PagoCreate):
     db_pago = models.Pago(**pago.model_dump())
     db.add(db_pago)
     await db.commit()
+    response_cache.invalidate("pagos")
     await db.refresh(db_pago)
     return db_pago
 
@@ -139,8 +157,11 @@ async def update_proveedor(db: AsyncSession, proveedor_id: int, data: schemas.Pr
     if db_item:
         for key, value in data.model_dump(exclude_unset=True).items():
             setattr(db_item, key, value)
+        await reference_data.record_change(db, "proveedores", proveedor_id)
         await db.commit()
+        response_cache.invalidate("proveedores")
         await db.refresh(db_item)
+        autocomplete.upsert("proveedores", db_item)
     return db_item
 
 async def update_oficina(db: AsyncSession, oficina_id: int, data: schemas.OficinaCreate):
@@ -148,8 +169,12 @@ async def update_oficina(db: AsyncSession, oficina_id: int, data: schemas.Oficin
     if db_item:
         for key, value in data.model_dump(exclude_unset=True).items():
             setattr(db_item, key, value)
+        await manager_sync.assign_codigo_ccosto(db, db_item)
+        await reference_data.record_change(db, "oficinas", oficina_id)
         await db.commit()
+        response_cache.invalidate("oficinas")
         await db.refresh(db_item)
+        autocomplete.upsert("oficinas", db_item)
     return db_item
 
 async def update_contrato(db: AsyncSession, contrato_id: int, data: schemas.ContratoCreate):
@@ -157,7 +182,9 @@ async def update_contrato(db: AsyncSession, contrato_id: int, data: schemas.Cont
     if db_item:
         for key, value in data.model_dump(exclude_unset=True).items():
             setattr(db_item, key, value)
+        await reference_data.record_change(db, "contratos", contrato_id)
         await db.commit()
+        contract_matching.clear_memo(db)
         # Return with relationships loaded
         return await get_contrato(db, contrato_id)
     return None
@@ -176,22 +203,42 @@ async def update_contrato_archivo(db: AsyncSession, contrato_id: int, archivo_pa
 async def delete_proveedor(db: AsyncSession, proveedor_id: int):
     db_item = await get_proveedor(db, proveedor_id)
     if db_item:
+        # The delete sets contratos.proveedor_id to NULL: log those contratos too
+        result = await db.execute(select(models.Contrato.id).filter(models.Contrato.proveedor_id == proveedor_id))
+        contrato_ids = result.scalars().all()
         await db.delete(db_item)
+        await reference_data.record_change(db, "proveedores", proveedor_id, reference_data.DELETE)
+        await reference_data.record_changes(db, "contratos", contrato_ids)
         await db.commit()
+        if contrato_ids:
+            contract_matching.clear_memo(db)
+        response_cache.invalidate("proveedores")
+        autocomplete.remove("proveedores", proveedor_id)
     return db_item
 
 async def delete_oficina(db: AsyncSession, oficina_id: int):
     db_item = await get_oficina(db, oficina_id)
     if db_item:
+        # The delete sets contratos.oficina_id to NULL: log those contratos too
+        result = await db.execute(select(models.Contrato.id).filter(models.Contrato.oficina_id == oficina_id))
+        contrato_ids = result.scalars().all()
         await db.delete(db_item)
+        await reference_data.record_change(db, "oficinas", oficina_id, reference_data.DELETE)
+        await reference_data.record_changes(db, "contratos", contrato_ids)
         await db.commit()
+        if contrato_ids:
+            contract_matching.clear_memo(db)
+        response_cache.invalidate("oficinas")
+        autocomplete.remove("oficinas", oficina_id)
     return db_item
 
 async def delete_contrato(db: AsyncSession, contrato_id: int):
     db_item = await get_contrato(db, contrato_id)
     if db_item:
         await db.delete(db_item)
+        await reference_data.record_change(db, "contratos", contrato_id, reference_data.DELETE)
         await db.commit()
+        contract_matching.clear_memo(db)
     return db_item
 
 
@@ -274,6 +321,82 @@ async def get_facturas(db: AsyncSession, skip: int = 0, limit: int = 100,
     result = await db.execute(query.offset(skip).limit(limit))
     return result.scalars().all()
 
+# Raw factura export: one row per oficina assignment (name, type for tabular_export)
+FACTURA_EXPORT_COLUMNS = [
+    ("factura_id", "int"),
+    ("numero_factura", "str"),
+    ("cufe", "str"),
+    ("fecha_factura", "date"),
+    ("fecha_vencimiento", "date"),
+    ("valor_factura", "float"),
+    ("estado_factura", "str"),
+    ("created_at", "datetime"),
+    ("nit_proveedor", "str"),
+    ("nombre_proveedor", "str"),
+    ("cod_oficina", "str"),
+    ("nombre_oficina", "str"),
+    ("ciudad", "str"),
+    ("num_contrato", "str"),
+    ("valor_oficina", "float"),
+    ("estado_oficina", "str"),
+]
+
+async def stream_facturas_export(db: AsyncSession, estado: Optional[str] = None,
+                                 proveedor_id: Optional[int] = None, oficina_id: Optional[int] = None,
+                                 fecha_desde: Optional[str] = None, fecha_hasta: Optional[str] = None,
+                                 batch_size: int = 1000) -> AsyncIterator[List[tuple]]:
+    """
+    Factura rows (FACTURA_EXPORT_COLUMNS order) in batches from a server-side
+    cursor. Facturas without oficinas come once with empty oficina columns.
+    Same filters as get_facturas (dates on created_at).
+    """
+    query = (
+        select(
+            models.Factura.id,
+            models.Factura.numero_factura,
+            models.Factura.cufe,
+            models.Factura.fecha_factura,
+            models.Factura.fecha_vencimiento,
+            models.Factura.valor,
+            models.Factura.estado,
+            models.Factura.created_at,
+            models.Proveedor.nit,
+            models.Proveedor.nombre,
+            models.Oficina.cod_oficina,
+            models.Oficina.nombre,
+            models.Oficina.ciudad,
+            models.Contrato.num_contrato,
+            models.FacturaOficina.valor,
+            models.FacturaOficina.estado
+        )
+        .select_from(models.Factura)
+        .outerjoin(models.Proveedor, models.Factura.proveedor_id == models.Proveedor.id)
+        .outerjoin(models.FacturaOficina, models.FacturaOficina.factura_id == models.Factura.id)
+        .outerjoin(models.Oficina, models.FacturaOficina.oficina_id == models.Oficina.id)
+        .outerjoin(models.Contrato, models.FacturaOficina.contrato_id == models.Contrato.id)
+    )
+    
+    if estado:
+        query = query.filter(models.Factura.estado == estado)
+    
+    if proveedor_id:
+        query = query.filter(models.Factura.proveedor_id == proveedor_id)
+    
+    if oficina_id:
+        query = query.filter(models.FacturaOficina.oficina_id == oficina_id)
+    
+    if fecha_desde:
+        query = query.filter(models.Factura.created_at >= datetime.strptime(fecha_desde, '%Y-%m-%d'))
+    
+    if fecha_hasta:
+        fecha_hasta_dt = datetime.strptime(fecha_hasta, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+        query = query.filter(models.Factura.created_at <= fecha_hasta_dt)
+    
+    query = query.order_by(models.Factura.id, models.FacturaOficina.id).execution_options(yield_per=batch_size)
+    result = await db.stream(query)
+    async for partition in result.partitions():
+        yield [tuple(row) for row in partition]
+
 async def create_factura(db: AsyncSession, factura: schemas.FacturaCreate):
     """Create a new factura"""
     db_factura = models.Factura(**factura.model_dump())
@@ -300,24 +423,14 @@ async def delete_factura(db: AsyncSession, factura_id: int):
         await db.commit()
     return db_item
 
-async def find_contrato_by_proveedor_oficina(db: AsyncSession, proveedor_id: int, oficina_id: int):
+async def find_contrato_by_proveedor_oficina(db: AsyncSession, proveedor_id: int, oficina_id: int,
+                                             fecha: Optional[date] = None):
     """
     Find the contract that matches a proveedor and oficina.
     This is used to auto-detect the contrato when an oficina is assigned to a factura.
-    Prioritizes ACTIVO contracts.
+    Prioritizes ACTIVO contracts, then contracts in force on fecha, then the newest.
     """
-    result = await db.execute(
-        select(models.Contrato)
-        .filter(
-            models.Contrato.proveedor_id == proveedor_id,
-            models.Contrato.oficina_id == oficina_id
-        )
-        .order_by(
-            # Prioritize active contracts
-            models.Contrato.estado.desc()  # ACTIVO comes after CANCELADO alphabetically, so desc
-        )
-    )
-    return result.scalars().first()
+    return await contract_matching.find_contrato(db, proveedor_id, oficina_id, fecha)
 
 async def asignar_oficina_a_factura(db: AsyncSession, factura_id: int, oficina_id: int):
     """
@@ -333,7 +446,7 @@ async def asignar_oficina_a_factura(db: AsyncSession, factura_id: int, oficina_i
     
     # Try to find matching contrato
     contrato = await find_contrato_by_proveedor_oficina(
-        db, db_factura.proveedor_id, oficina_id
+        db, db_factura.proveedor_id, oficina_id, db_factura.fecha_factura
     )
     
     if contrato:
@@ -372,7 +485,9 @@ async def add_oficina_to_factura(db: AsyncSession, factura_id: int, oficina_id:
         return None
     
     # Find contrato for this proveedor + oficina combination
-    contrato = await find_contrato_by_proveedor_oficina(db, factura.proveedor_id, oficina_id)
+    contrato = await find_contrato_by_proveedor_oficina(
+        db, factura.proveedor_id, oficina_id, factura.fecha_factura
+    )
     contrato_id = contrato.id if contrato else None
     
     # Create the assignment
@@ -460,12 +575,14 @@ async def asignar_multiples_oficinas(db: AsyncSession, factura_id: int, oficinas
     for item in existing:
         await db.delete(item)
     
+    # Find the contrato of every oficina in one query
+    contratos = await contract_matching.find_contratos_batch(
+        db, factura.proveedor_id, [data['oficina_id'] for data in oficinas_data], factura.fecha_factura
+    )
+    
     # Add new assignments
     for data in oficinas_data:
-        # Find contrato
-        contrato = await find_contrato_by_proveedor_oficina(
-            db, factura.proveedor_id, data['oficina_id']
-        )
+        contrato = contratos.get(data['oficina_id'])
         
         db_item = models.FacturaOficina(
             factura_id=factura_id,
@@ -486,31 +603,44 @@ async def asignar_multiples_oficinas(db: AsyncSession, factura_id: int, oficinas
     return await get_factura(db, factura_id)
 
 
-async def get_contratos_pendientes_por_llegar(db: AsyncSession, year: int, month: int):
+def _month_bounds(year: int, month: int):
+    """First day of the month and first day of the next month"""
+    inicio = date(year, month, 1)
+    fin = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return inicio, fin
+
+
+def _contrato_facturado_entre(inicio, fin):
     """
-    Find active contracts that do not have an associated invoice for the given month/year.
-    Assumes monthly billing.
+    EXISTS subquery: the contrato has an invoice with fecha_factura in [inicio, fin).
+    Range predicates keep it on the fecha_factura / contrato_id indexes.
     """
-    from sqlalchemy import extract, and_
-    
-    # 1. Get IDs of contracts that ALREADY have an invoice for this period
-    # We check through FacturaOficina links to Factura
-    invoiced_contracts_query = (
-        select(models.FacturaOficina.contrato_id)
+    return (
+        select(models.FacturaOficina.id)
         .join(models.Factura, models.Factura.id == models.FacturaOficina.factura_id)
         .filter(
-            and_(
-                extract('year', models.Factura.fecha_factura) == year,
-                extract('month', models.Factura.fecha_factura) == month,
-                models.FacturaOficina.contrato_id.isnot(None)
-            )
+            models.FacturaOficina.contrato_id == models.Contrato.id,
+            models.Factura.fecha_factura >= inicio,
+            models.Factura.fecha_factura < fin
         )
+        .exists()
     )
-    
-    result_invoiced = await db.execute(invoiced_contracts_query)
-    invoiced_ids = {row[0] for row in result_invoiced.all()}
-    
-    # 2. Get all active contracts that are NOT in the invoiced list
+
+
+def _contratos_activos_filter():
+    return and_(
+        models.Contrato.estado == 'ACTIVO',
+        models.Contrato.proveedor_id.isnot(None),
+        models.Contrato.oficina_id.isnot(None)
+    )
+
+
+async def get_contratos_pendientes_por_llegar(db: AsyncSession, year: int, month: int):
+    """
+    Find active contracts that do not have an associated invoice for the given month/year.
+    Assumes monthly billing. Single NOT EXISTS anti-join.
+    """
+    inicio, fin = _month_bounds(year, month)
     query = (
         select(models.Contrato)
         .options(
@@ -518,14 +648,72 @@ async def get_contratos_pendientes_por_llegar(db: AsyncSession, year: int, month
             selectinload(models.Contrato.oficina)
         )
         .filter(
-            and_(
-                models.Contrato.estado == 'ACTIVO',
-                models.Contrato.proveedor_id.isnot(None),
-                models.Contrato.oficina_id.isnot(None),
-                models.Contrato.id.notin_(list(invoiced_ids)) if invoiced_ids else True
-            )
+            _contratos_activos_filter(),
+            ~_contrato_facturado_entre(inicio, fin)
         )
+        .order_by(models.Contrato.id)
     )
     
     result = await db.execute(query)
     return result.scalars().all()
+
+
+async def count_contratos_pendientes_por_llegar(db: AsyncSession, year: int, month: int) -> int:
+    """Number of active contracts without an invoice for the given month/year"""
+    inicio, fin = _month_bounds(year, month)
+    result = await db.execute(
+        select(func.count(models.Contrato.id))
+        .filter(
+            _contratos_activos_filter(),
+            ~_contrato_facturado_entre(inicio, fin)
+        )
+    )
+    return result.scalar() or 0
+
+
+async def get_matriz_pendientes_por_llegar(db: AsyncSession, desde: tuple, hasta: tuple):
+    """
+    Missing-invoice matrix for a range of months (desde/hasta are (year, month)).
+    Returns (contrato_id, num_contrato, proveedor, cod_oficina, oficina, year, month)
+    rows for every active contract and month without an invoice, in one query.
+    """
+    periodos_select = []
+    year, month = desde
+    while (year, month) <= hasta:
+        inicio, fin = _month_bounds(year, month)
+        periodos_select.append(select(
+            literal(year).label("anio"),
+            literal(month).label("mes"),
+            literal(inicio).label("inicio"),
+            literal(fin).label("fin")
+        ))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    
+    if not periodos_select:
+        return []
+    
+    periodos = union_all(*periodos_select).subquery("periodos")
+    
+    query = (
+        select(
+            models.Contrato.id,
+            models.Contrato.num_contrato,
+            models.Proveedor.nombre,
+            models.Oficina.cod_oficina,
+            models.Oficina.nombre,
+            periodos.c.anio,
+            periodos.c.mes
+        )
+        .select_from(models.Contrato)
+        .join(periodos, true())
+        .join(models.Proveedor, models.Proveedor.id == models.Contrato.proveedor_id)
+        .join(models.Oficina, models.Oficina.id == models.Contrato.oficina_id)
+        .filter(
+            _contratos_activos_filter(),
+            ~_contrato_facturado_entre(periodos.c.inicio, periodos.c.fin)
+        )
+        .order_by(models.Contrato.id, periodos.c.anio, periodos.c.mes)
+    )
+    
+    result = await db.execute(query)
+    return result.all()
@@ -0,0 +1,196 @@
+"""
+Excel Render Module
+Runs CPU-heavy workbook rendering (openpyxl) in a process pool.
+
+openpyxl is pure Python: rendering on the event loop (or in a thread,
+holding the GIL) freezes every other request while a workbook is written.
+Routes load the data, then hand a module-level render function and plain
+data (rows, months, ...) to render_to_file(). The workbook is written by
+a worker process to a temp file whose path comes back to the route.
+
+- EXCEL_RENDER_WORKERS processes (default: one per core)
+- At most EXCEL_RENDER_MAX_PENDING renders running or queued in the pool;
+  callers wait up to EXCEL_RENDER_QUEUE_TIMEOUT s for a slot, then get
+  ExcelRenderBusy (routes answer 503)
+- EXCEL_RENDER_PROCESSES=false renders in threads instead (debugging, or
+  platforms where child processes are not allowed)
+
+Render functions and their arguments are pickled: use module-level
+functions (or functools.partial of them) and plain data, not ORM objects.
+"""
+import asyncio
+import functools
+import os
+import tempfile
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional
+from dotenv import load_dotenv
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
+
+import metrics
+
+load_dotenv()
+
+EXCEL_RENDER_WORKERS = int(os.getenv("EXCEL_RENDER_WORKERS", str(os.cpu_count() or 2)))
+EXCEL_RENDER_MAX_PENDING = int(os.getenv("EXCEL_RENDER_MAX_PENDING", str(EXCEL_RENDER_WORKERS * 2)))
+EXCEL_RENDER_QUEUE_TIMEOUT = float(os.getenv("EXCEL_RENDER_QUEUE_TIMEOUT", "30"))
+EXCEL_RENDER_PROCESSES = os.getenv("EXCEL_RENDER_PROCESSES", "true").lower() in ("1", "true", "si", "yes")
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+class ExcelRenderBusy(Exception):
+    """No render slot became free within the queue timeout"""
+
+
+# Created on first use: importing this module (also done by the worker
+# processes themselves) must not start processes
+_executor: Optional[Executor] = None
+_slots = asyncio.Semaphore(EXCEL_RENDER_MAX_PENDING)
+
+render_stats = {
+    "renders": 0,
+    "in_flight": 0,
+    "busy": 0,
+    "errors": 0,
+    "max_ms": 0.0,
+    "total_ms": 0.0,
+}
+
+
+def _get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        if EXCEL_RENDER_PROCESSES:
+            _executor = ProcessPoolExecutor(max_workers=EXCEL_RENDER_WORKERS)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=EXCEL_RENDER_WORKERS, thread_name_prefix="excel")
+    return _executor
+
+
+async def _submit(report: str, func: Callable, *args, queue_timeout: Optional[float] = EXCEL_RENDER_QUEUE_TIMEOUT) -> Future:
+    """
+    Take a render slot and start func(*args) in the pool.
+    The slot is released when the pool future is done, not when the caller
+    stops waiting: a cancelled request cannot free a slot whose worker still runs.
+    """
+    global _executor
+    try:
+        await asyncio.wait_for(_slots.acquire(), queue_timeout)
+    except asyncio.TimeoutError:
+        render_stats["busy"] += 1
+        raise ExcelRenderBusy("El servidor esta generando demasiados archivos Excel, intente de nuevo en unos segundos")
+
+    executor = _get_executor()
+    try:
+        future = executor.submit(functools.partial(func, *args))
+    except BaseException as e:
+        _slots.release()
+        if isinstance(e, BrokenProcessPool):
+            render_stats["errors"] += 1
+            _executor = None
+        raise
+
+    render_stats["renders"] += 1
+    render_stats["in_flight"] += 1
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+
+    def _done(f: Future):
+        # Runs in a pool thread: hand the bookkeeping back to the event loop
+        try:
+            loop.call_soon_threadsafe(_render_done, report, executor, start, f)
+        except RuntimeError:
+            pass  # loop already closed (shutdown)
+
+    future.add_done_callback(_done)
+    return future
+
+
+def _render_done(report: str, executor: Executor, start: float, future: Future):
+    global _executor
+    _slots.release()
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    render_stats["in_flight"] -= 1
+    render_stats["total_ms"] += elapsed_ms
+    render_stats["max_ms"] = max(render_stats["max_ms"], elapsed_ms)
+    metrics.record_excel_render(report, elapsed_ms)
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        render_stats["errors"] += 1
+        # A worker died (e.g. out of memory): start a new pool on the next render
+        if isinstance(error, BrokenProcessPool) and _executor is executor:
+            _executor = None
+
+
+async def render(report: str, func: Callable, *args, queue_timeout: Optional[float] = EXCEL_RENDER_QUEUE_TIMEOUT):
+    """
+    Run func(*args) in the render pool and return its result.
+    queue_timeout=None waits for a slot indefinitely (background jobs).
+    """
+    future = await _submit(report, func, *args, queue_timeout=queue_timeout)
+    return await asyncio.wrap_future(future)
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+async def render_to_file(report: str, func: Callable, *args, suffix: str = ".xlsx") -> str:
+    """
+    Run func(*args, path) in the render pool, writing to a new temp file.
+    Returns the path; the caller deletes it (file_response does).
+    """
+    fd, path = tempfile.mkstemp(prefix=f"{report}_", suffix=suffix)
+    os.close(fd)
+    try:
+        future = await _submit(report, func, *args, path)
+    except BaseException:
+        _remove(path)
+        raise
+    try:
+        await asyncio.wrap_future(future)
+    except BaseException:
+        # Failed or abandoned: the worker may still be writing, remove the
+        # file only once it is done with it
+        future.add_done_callback(lambda f: _remove(path))
+        raise
+    return path
+
+
+def file_response(path: str, headers: Dict[str, str], media_type: str = XLSX_MEDIA_TYPE) -> FileResponse:
+    """Send a rendered temp file and delete it once sent"""
+    return FileResponse(path, media_type=media_type, headers=headers, background=BackgroundTask(_remove, path))
+
+
+def get_render_status() -> Dict[str, Any]:
+    """Render pool settings and counters"""
+    renders = render_stats["renders"]
+    return {
+        "workers": EXCEL_RENDER_WORKERS,
+        "processes": EXCEL_RENDER_PROCESSES,
+        "max_pending": EXCEL_RENDER_MAX_PENDING,
+        "queue_timeout_s": EXCEL_RENDER_QUEUE_TIMEOUT,
+        "renders": renders,
+        "in_flight": render_stats["in_flight"],
+        "busy": render_stats["busy"],
+        "errors": render_stats["errors"],
+        "avg_ms": round(render_stats["total_ms"] / renders, 2) if renders else 0,
+        "max_ms": round(render_stats["max_ms"], 2),
+    }
+
+
+def shutdown_render_executor():
+    """Stop the render pool (called on app shutdown)"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,326 @@
+"""
+Export Jobs Module
+Background rendering of large exports (reportes, consolidado, archivo plano).
+
+A job is submitted with an async build function. build(db, job) reads the
+data and returns a sync render(path) function plus the download file name.
+Jobs wait in a bounded queue (EXPORT_JOBS_MAX_QUEUE); EXPORT_JOBS_WORKERS
+workers take them in order, run build() with their own session and
+render() in the excel_render process pool, so the event loop keeps
+serving interactive requests while a workbook is written. render is
+pickled: return a module-level function or a functools.partial of one.
+
+Artifacts go to EXPORT_JOBS_DIR next to a small JSON with the job state,
+so any API worker process can report the status and serve the download.
+Finished artifacts expire after EXPORT_JOBS_TTL_MIN and are deleted by a
+periodic cleanup.
+
+States: PENDIENTE -> EN_PROCESO -> COMPLETADO | ERROR
+"""
+import asyncio
+import json
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import excel_render
+import metrics
+
+load_dotenv()
+
+EXPORT_JOBS_DIR = os.getenv("EXPORT_JOBS_DIR", os.path.join(tempfile.gettempdir(), "facturacion_exports"))
+# Concurrent jobs; each holds a DB session and a render slot while it runs
+EXPORT_JOBS_WORKERS = int(os.getenv("EXPORT_JOBS_WORKERS", "1"))
+# Jobs waiting beyond this are rejected (503) instead of piling up
+EXPORT_JOBS_MAX_QUEUE = int(os.getenv("EXPORT_JOBS_MAX_QUEUE", "20"))
+EXPORT_JOBS_TTL_MIN = float(os.getenv("EXPORT_JOBS_TTL_MIN", "60"))
+EXPORT_JOBS_CLEANUP_S = 60
+
+PENDIENTE = "PENDIENTE"
+EN_PROCESO = "EN_PROCESO"
+COMPLETADO = "COMPLETADO"
+ERROR = "ERROR"
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+RenderFunc = Callable[[str], None]
+BuildFunc = Callable[[AsyncSession, "ExportJob"], Awaitable[Tuple[RenderFunc, str]]]
+
+
+class ExportQueueFull(Exception):
+    """Raised by submit() when EXPORT_JOBS_MAX_QUEUE jobs are already waiting"""
+
+
+class ExportJob:
+    """State of one export (persisted as <id>.json in EXPORT_JOBS_DIR)"""
+
+    FIELDS = (
+        "id", "tipo", "estado", "progreso", "mensaje", "error", "filename", "media_type",
+        "size_bytes", "artifact", "created_at", "started_at", "finished_at", "expires_at",
+    )
+
+    def __init__(self, tipo: str, media_type: str = XLSX_MEDIA_TYPE, job_id: Optional[str] = None):
+        self.id = job_id or uuid.uuid4().hex
+        self.tipo = tipo
+        self.estado = PENDIENTE
+        self.progreso = 0
+        self.mensaje = "En cola"
+        self.error: Optional[str] = None
+        self.filename: Optional[str] = None
+        self.media_type = media_type
+        self.size_bytes: Optional[int] = None
+        # Artifact file name inside EXPORT_JOBS_DIR
+        self.artifact: Optional[str] = None
+        self.created_at = datetime.now()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.expires_at: Optional[datetime] = None
+
+    @property
+    def path(self) -> Optional[str]:
+        return os.path.join(EXPORT_JOBS_DIR, self.artifact) if self.artifact else None
+
+    @property
+    def finished(self) -> bool:
+        return self.estado in (COMPLETADO, ERROR)
+
+    @property
+    def expired(self) -> bool:
+        return self.expires_at is not None and datetime.now() >= self.expires_at
+
+    def set_progress(self, progreso: int, mensaje: str):
+        """Update progress (0-100); build functions may call this"""
+        self.progreso = progreso
+        self.mensaje = mensaje
+        self.save()
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {}
+        for field in self.FIELDS:
+            value = getattr(self, field)
+            data[field] = value.isoformat() if isinstance(value, datetime) else value
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ExportJob":
+        job = cls(data["tipo"], data.get("media_type") or XLSX_MEDIA_TYPE, data["id"])
+        for field in cls.FIELDS:
+            value = data.get(field)
+            if field.endswith("_at") and value:
+                value = datetime.fromisoformat(value)
+            setattr(job, field, value)
+        return job
+
+    def save(self):
+        """Write the state file (atomic rename, readers never see half a file)"""
+        tmp_path = os.path.join(EXPORT_JOBS_DIR, f"{self.id}.json.tmp")
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.to_dict(), f)
+            os.replace(tmp_path, _state_path(self.id))
+        except OSError as e:
+            print(f"Warning: no se pudo guardar el estado de la exportacion {self.id}: {e}")
+
+
+def _state_path(job_id: str) -> str:
+    return os.path.join(EXPORT_JOBS_DIR, f"{job_id}.json")
+
+
+# Jobs accepted by this process (others are read from their state file)
+_jobs: Dict[str, ExportJob] = {}
+_builds: Dict[str, BuildFunc] = {}
+_queue: Optional[asyncio.Queue] = None
+_workers: List[asyncio.Task] = []
+_cleanup_task: Optional[asyncio.Task] = None
+
+
+# --- Submit / query ---
+
+def submit(tipo: str, build: BuildFunc, media_type: str = XLSX_MEDIA_TYPE) -> ExportJob:
+    """Queue an export. Raises ExportQueueFull when the queue is at capacity."""
+    start_workers()
+    job = ExportJob(tipo, media_type)
+    try:
+        _queue.put_nowait(job.id)
+    except asyncio.QueueFull:
+        raise ExportQueueFull(f"Hay {EXPORT_JOBS_MAX_QUEUE} exportaciones en cola, intente mas tarde")
+    _jobs[job.id] = job
+    _builds[job.id] = build
+    job.save()
+    return job
+
+
+def get_job(job_id: str) -> Optional[ExportJob]:
+    """Job by id (this process or any other sharing EXPORT_JOBS_DIR); None if unknown or expired"""
+    job = _jobs.get(job_id)
+    if job is None:
+        # Only hex ids: the id ends up in a file path
+        if not all(c in "0123456789abcdef" for c in job_id) or len(job_id) != 32:
+            return None
+        try:
+            with open(_state_path(job_id), encoding="utf-8") as f:
+                job = ExportJob.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+    if job.expired:
+        return None
+    return job
+
+
+def list_jobs() -> List[ExportJob]:
+    """Jobs of this process, newest first"""
+    return sorted((j for j in _jobs.values() if not j.expired), key=lambda j: j.created_at, reverse=True)
+
+
+def queue_status() -> Dict[str, Any]:
+    estados: Dict[str, int] = {}
+    for job in _jobs.values():
+        estados[job.estado] = estados.get(job.estado, 0) + 1
+    return {
+        "workers": EXPORT_JOBS_WORKERS,
+        "en_cola": _queue.qsize() if _queue is not None else 0,
+        "max_cola": EXPORT_JOBS_MAX_QUEUE,
+        "ttl_min": EXPORT_JOBS_TTL_MIN,
+        "directorio": EXPORT_JOBS_DIR,
+        "jobs": estados,
+    }
+
+
+# --- Workers ---
+
+async def _run(job: ExportJob, build: BuildFunc):
+    from database import SessionLocal
+
+    job.estado = EN_PROCESO
+    job.started_at = datetime.now()
+    job.set_progress(5, "Consultando datos")
+    try:
+        async with SessionLocal() as db:
+            render, filename = await build(db, job)
+        job.filename = filename
+        job.artifact = f"{job.id}{os.path.splitext(filename)[1]}"
+        job.set_progress(max(job.progreso, 50), "Generando archivo")
+
+        tmp_path = job.path + ".part"
+        # Background jobs wait for a render slot instead of failing with busy
+        await excel_render.render(job.tipo, render, tmp_path, queue_timeout=None)
+        os.replace(tmp_path, job.path)
+
+        job.size_bytes = os.path.getsize(job.path)
+        job.estado = COMPLETADO
+        job.progreso = 100
+        job.mensaje = "Listo para descargar"
+    except Exception as e:
+        # HTTPException from the shared builders carries the message in detail
+        job.error = str(getattr(e, "detail", None) or e)
+        job.estado = ERROR
+        job.mensaje = "Error generando el archivo"
+        print(f"Warning: exportacion {job.tipo} {job.id} fallo: {job.error}")
+        if job.path:
+            _remove(job.path + ".part")
+    job.finished_at = datetime.now()
+    job.expires_at = job.finished_at + timedelta(minutes=EXPORT_JOBS_TTL_MIN)
+    job.save()
+    metrics.record_export_job(job.tipo, job.estado, (job.finished_at - job.created_at).total_seconds())
+
+
+async def _worker():
+    while True:
+        job_id = await _queue.get()
+        try:
+            job, build = _jobs.get(job_id), _builds.pop(job_id, None)
+            if job is not None and build is not None:
+                await _run(job, build)
+        finally:
+            _queue.task_done()
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"Warning: no se pudo borrar {path}: {e}")
+
+
+def cleanup_expired() -> int:
+    """
+    Delete expired jobs and their artifacts. Also removes files left in
+    EXPORT_JOBS_DIR by other processes or restarts once they are older
+    than the TTL. Returns the number of jobs removed.
+    """
+    removed = 0
+    for job_id, job in list(_jobs.items()):
+        if job.expired:
+            if job.path:
+                _remove(job.path)
+            _remove(_state_path(job_id))
+            del _jobs[job_id]
+            removed += 1
+
+    cutoff = time.time() - EXPORT_JOBS_TTL_MIN * 60
+    active = {job_id for job_id, job in _jobs.items() if not job.finished}
+    try:
+        entries = list(os.scandir(EXPORT_JOBS_DIR))
+    except FileNotFoundError:
+        return removed
+    for entry in entries:
+        if entry.name.split(".", 1)[0] in active:
+            continue
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                _remove(entry.path)
+        except OSError:
+            continue
+    return removed
+
+
+async def _periodic_cleanup():
+    while True:
+        await asyncio.sleep(EXPORT_JOBS_CLEANUP_S)
+        cleanup_expired()
+
+
+def start_workers():
+    """Start the queue, workers and cleanup task (app lifespan; submit() also calls it)"""
+    global _queue, _cleanup_task
+    if _queue is not None:
+        return
+    os.makedirs(EXPORT_JOBS_DIR, exist_ok=True)
+    cleanup_expired()
+    _queue = asyncio.Queue(maxsize=EXPORT_JOBS_MAX_QUEUE)
+    for _ in range(max(1, EXPORT_JOBS_WORKERS)):
+        _workers.append(asyncio.create_task(_worker()))
+    _cleanup_task = asyncio.create_task(_periodic_cleanup())
+
+
+async def stop_workers():
+    """Cancel workers and cleanup. Queued and running jobs are marked as failed."""
+    global _queue, _cleanup_task
+    tasks = _workers + ([_cleanup_task] if _cleanup_task else [])
+    for task in tasks:
+        task.cancel()
+    for task in tasks:
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+    _workers.clear()
+    _cleanup_task = None
+    _queue = None
+    for job in _jobs.values():
+        if not job.finished:
+            job.estado = ERROR
+            job.error = "Servidor detenido antes de terminar la exportacion"
+            job.finished_at = datetime.now()
+            job.expires_at = job.finished_at + timedelta(minutes=EXPORT_JOBS_TTL_MIN)
+            job.save()
+            if job.path:
+                _remove(job.path + ".part")
+    _builds.clear()
@@ -0,0 +1,136 @@
+"""
+Fast JSON Module
+Response class backed by orjson, used as the app default.
+
+orjson serializes date/datetime natively and Decimal through a default
+hook, so routes that return plain dicts skip FastAPI's jsonable_encoder
+walk. Without orjson it falls back to the standard json module.
+
+orm_response() renders trusted ORM rows with a response schema without
+validating them again: it copies the fields the schema declares straight
+from the ORM attributes. Use it only for rows loaded by crud (relationships
+already eager-loaded), never for user input.
+
+Usage in a route:
+    rows = await crud.get_facturas(db, ...)
+    return orm_response(rows, schemas.Factura)
+"""
+import json
+import typing
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Type
+from fastapi.encoders import decimal_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def _default(value: Any) -> Any:
+    """Types orjson does not serialize by itself (same output as jsonable_encoder)"""
+    if isinstance(value, Decimal):
+        return decimal_encoder(value)
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content to JSON bytes"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, default=_json_default, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def _json_default(value: Any) -> Any:
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return _default(value)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+# --- ORM rows -> response schema without re-validation ---
+
+# Field kinds in a serialization plan
+_VALUE, _DECIMAL, _MODEL, _MODEL_LIST = range(4)
+
+# {schema: [(field_name, kind, nested_schema), ...]}
+_plans: Dict[Type[BaseModel], List[Tuple[str, int, Optional[Type[BaseModel]]]]] = {}
+
+
+def _unwrap_optional(annotation: Any) -> Any:
+    if typing.get_origin(annotation) is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _is_model(annotation: Any) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
+
+
+def _plan_for(schema: Type[BaseModel]) -> List[Tuple[str, int, Optional[Type[BaseModel]]]]:
+    plan = _plans.get(schema)
+    if plan is not None:
+        return plan
+
+    plan = []
+    for name, field in schema.model_fields.items():
+        annotation = _unwrap_optional(field.annotation)
+        origin = typing.get_origin(annotation)
+        if _is_model(annotation):
+            plan.append((name, _MODEL, annotation))
+        elif origin in (list, List) and _is_model(typing.get_args(annotation)[0]):
+            plan.append((name, _MODEL_LIST, typing.get_args(annotation)[0]))
+        elif annotation is Decimal:
+            plan.append((name, _DECIMAL, None))
+        else:
+            plan.append((name, _VALUE, None))
+    _plans[schema] = plan
+    return plan
+
+
+def orm_to_dict(obj: Any, schema: Type[BaseModel]) -> Optional[Dict[str, Any]]:
+    """
+    Copy the fields declared by schema from an ORM object.
+    Decimals are emitted as strings, like the response_model path does.
+    """
+    if obj is None:
+        return None
+    data = {}
+    for name, kind, nested in _plan_for(schema):
+        value = getattr(obj, name, None)
+        if value is None:
+            if kind == _MODEL_LIST:
+                value = []
+        elif kind == _DECIMAL:
+            value = str(value)
+        elif kind == _MODEL:
+            value = orm_to_dict(value, nested)
+        elif kind == _MODEL_LIST:
+            value = [orm_to_dict(item, nested) for item in value]
+        data[name] = value
+    return data
+
+
+def orm_response(rows: Iterable[Any], schema: Type[BaseModel], status_code: int = 200) -> FastJSONResponse:
+    """Render a list of trusted ORM rows as schema, skipping response_model validation"""
+    return FastJSONResponse(
+        content=[orm_to_dict(row, schema) for row in rows],
+        status_code=status_code
+    )
@@ -0,0 +1,163 @@
+"""
+HTTP Clients Module
+Application-scoped httpx clients with keep-alive connection pooling per target.
+
+Each target (n8n webhook, ...) gets its own AsyncClient so
+connections and TLS sessions are reused across requests instead of being
+negotiated again on every call.
+"""
+import os
+import time
+import httpx
+from dotenv import load_dotenv
+from typing import Optional, Dict, Any
+import metrics
+
+load_dotenv()
+
+# Pool settings (shared defaults, can be overridden per target)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+
+# n8n webhook host
+N8N_TIMEOUT = float(os.getenv("N8N_TIMEOUT", "120"))
+N8N_HTTP2 = os.getenv("N8N_HTTP2", "false").lower() in ("1", "true", "si", "yes")
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# Target name -> client configuration
+TARGETS: Dict[str, Dict[str, Any]] = {
+    "n8n": {
+        "timeout": N8N_TIMEOUT,
+        "http2": N8N_HTTP2,
+    },
+}
+
+
+class TargetMetrics:
+    """Latency and error counters for a single target"""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+        self.last_status: Optional[int] = None
+        self.last_error: Optional[str] = None
+
+    def record(self, elapsed_ms: float, status: Optional[int] = None, error: Optional[str] = None):
+        self.requests += 1
+        self.total_ms += elapsed_ms
+        self.last_ms = elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        if status is not None:
+            self.last_status = status
+        if error is not None or (status is not None and status >= 500):
+            self.errors += 1
+            self.last_error = error or f"HTTP {status}"
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.requests, 2) if self.requests else 0,
+            "max_ms": round(self.max_ms, 2),
+            "last_ms": round(self.last_ms, 2),
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+        }
+
+
+class HTTPClientRegistry:
+    """
+    Holds one pooled AsyncClient per target.
+    Clients are opened in the app lifespan and closed on shutdown.
+    """
+
+    def __init__(self, targets: Dict[str, Dict[str, Any]]):
+        self.targets = targets
+        self.clients: Dict[str, httpx.AsyncClient] = {}
+        self.metrics: Dict[str, TargetMetrics] = {name: TargetMetrics() for name in targets}
+
+    def _build_client(self, name: str) -> httpx.AsyncClient:
+        config = self.targets[name]
+        limits = httpx.Limits(
+            max_connections=config.get("max_connections", HTTP_MAX_CONNECTIONS),
+            max_keepalive_connections=config.get("max_keepalive", HTTP_MAX_KEEPALIVE),
+            keepalive_expiry=config.get("keepalive_expiry", HTTP_KEEPALIVE_EXPIRY),
+        )
+        timeout = httpx.Timeout(config.get("timeout", 30.0), connect=HTTP_CONNECT_TIMEOUT)
+        http2 = config.get("http2", False)
+        if http2 and not HTTP2_AVAILABLE:
+            print(f"Warning: HTTP/2 requested for '{name}' but 'h2' is not installed, using HTTP/1.1")
+            http2 = False
+        return httpx.AsyncClient(
+            base_url=config.get("base_url", ""),
+            limits=limits,
+            timeout=timeout,
+            http2=http2,
+        )
+
+    async def startup(self):
+        """Open a client for every configured target"""
+        for name in self.targets:
+            if name not in self.clients:
+                self.clients[name] = self._build_client(name)
+
+    async def shutdown(self):
+        """Close all clients and their pooled connections"""
+        for client in self.clients.values():
+            await client.aclose()
+        self.clients.clear()
+
+    def get(self, name: str) -> httpx.AsyncClient:
+        """
+        Get the pooled client for a target.
+        Created on first use if the lifespan did not open it (scripts, tests).
+        """
+        if name not in self.targets:
+            raise KeyError(f"Unknown HTTP target: {name}")
+        client = self.clients.get(name)
+        if client is None or client.is_closed:
+            client = self._build_client(name)
+            self.clients[name] = client
+        return client
+
+    async def request(self, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        """Send a request through the target's client, recording latency and errors"""
+        client = self.get(name)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except Exception as e:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.metrics[name].record(elapsed_ms, error=f"{type(e).__name__}: {e}")
+            metrics.record_http_call(name, elapsed_ms, type(e).__name__)
+            raise
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.metrics[name].record(elapsed_ms, status=response.status_code)
+        metrics.record_http_call(name, elapsed_ms, f"{response.status_code // 100}xx")
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-target configuration and metrics"""
+        return {
+            name: {
+                "base_url": config.get("base_url"),
+                "http2": bool(config.get("http2")) and HTTP2_AVAILABLE,
+                "open": name in self.clients and not self.clients[name].is_closed,
+                **self.metrics[name].as_dict(),
+            }
+            for name, config in self.targets.items()
+        }
+
+
+http_clients = HTTPClientRegistry(TARGETS)
@@ -1,19 +1,60 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
+from fastapi.datastructures import Default
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from contextlib import asynccontextmanager
-from database import engine, Base
-from routers import contracts, payments, facturas, consolidado, reportes, oficinas_oracle, archivo_plano
+from database import engine
+import schema_migrations
+from http_clients import http_clients
+import manager_sync
+import autocomplete
+import export_jobs
+from oracle_database import shutdown_oracle_executor
+from excel_render import shutdown_render_executor
+from fast_json import FastJSONResponse
+from compression import CompressionMiddleware
+from metrics import MetricsMiddleware, render_prometheus
+from query_inspector import QueryInspectorMiddleware
+from routers import contracts, payments, facturas, consolidado, reportes, oficinas_oracle, archivo_plano, sistema, referencias, exportaciones
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: Create tables if they don't exist (useful for dev)
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    # Startup: Apply pending versioned migrations (see migrations/)
+    if schema_migrations.DB_AUTO_MIGRATE:
+        await schema_migrations.run_migrations(engine)
+    # Shared outbound HTTP clients (keep-alive pools per target)
+    await http_clients.startup()
+    # Periodic sync of the Manager (Oracle) mirrors
+    manager_sync.start_periodic_sync()
+    # In-memory typeahead index for oficinas/proveedores
+    await autocomplete.build_all()
+    # Background export workers (large Excel exports)
+    export_jobs.start_workers()
     yield
     # Shutdown
+    await export_jobs.stop_workers()
+    await manager_sync.stop_periodic_sync()
+    await http_clients.shutdown()
+    shutdown_oracle_executor()
+    shutdown_render_executor()
 
-app = FastAPI(title="Supplier Service API", lifespan=lifespan)
+# orjson responses by default. Wrapped in Default() so that routes with a
+# response_model keep FastAPI's own pydantic serialization
+app = FastAPI(
+    title="Supplier Service API",
+    lifespan=lifespan,
+    default_response_class=Default(FastJSONResponse)
+)
+
+# X-Query-* headers and N+1 warnings (only with QUERY_INSPECTOR_ENABLED)
+app.add_middleware(QueryInspectorMiddleware)
+
+# Per-request timings (Server-Timing header and /metrics)
+app.add_middleware(MetricsMiddleware)
+
+# Brotli/gzip for JSON and text bodies (XLSX/PDF are sent as is)
+app.add_middleware(CompressionMiddleware)
 
 # CORS
 app.add_middleware(
@@ -31,10 +72,18 @@ app.include_router(consolidado.router, prefix="/api", tags=["consolidado"])
 app.include_router(reportes.router, prefix="/api", tags=["reportes"])
 app.include_router(oficinas_oracle.router, prefix="/api", tags=["oficinas-oracle"])
 app.include_router(archivo_plano.router, prefix="/api", tags=["archivo-plano"])
+app.include_router(sistema.router, prefix="/api", tags=["sistema"])
+app.include_router(referencias.router, prefix="/api", tags=["referencias"])
+app.include_router(exportaciones.router, prefix="/api", tags=["exportaciones"])
 
 @app.get("/")
 def read_root():
     return {"message": "Supplier Service API is running"}
 
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,565 @@
+"""
+Manager Sync Module
+Keeps local copies of Manager (Oracle) reference tables in Postgres.
+
+Sources:
+- manager_centros_costo <- MANAGER.MNGCCO
+- manager_oficinas      <- MANAGER.MNGDNO (also fills oficinas.codigo_ccosto)
+- manager_vinculados    <- MANAGER.VINCULADO (provider NIT -> name)
+
+Each source is pulled on a schedule and upserted on its trimmed code. The
+last result is kept in sync_watermarks; when the pulled rows hash to the same
+checksum as the last sync nothing is rewritten. Request handlers read the
+local tables, so Oracle is not on the request path.
+
+Usage:
+    python manager_sync.py            # sync every source once
+    python manager_sync.py --force    # rewrite even if the data did not change
+    python manager_sync.py --status   # show the watermarks
+"""
+import asyncio
+import difflib
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+import unicodedata
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from sqlalchemy import and_, or_, delete, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+import models
+import oracle_database
+import reference_data
+import response_cache
+from database import SessionLocal, engine
+
+load_dotenv()
+
+# Minutes between syncs (0 disables the periodic task)
+MANAGER_SYNC_INTERVAL_MIN = float(os.getenv("MANAGER_SYNC_INTERVAL_MIN", "60"))
+# Max seconds to pull one source from Oracle
+MANAGER_SYNC_TIMEOUT = float(os.getenv("MANAGER_SYNC_TIMEOUT", "600"))
+# Sync once when the API starts
+MANAGER_SYNC_ON_STARTUP = os.getenv("MANAGER_SYNC_ON_STARTUP", "true").lower() in ("1", "true", "si", "yes")
+
+UPSERT_CHUNK_SIZE = 500
+
+# Arbitrary key so that only one worker writes a mirror at a time (Postgres)
+SYNC_LOCK_KEY = 20250102
+# Arbitrary key held for a whole sync run, so only one worker reads Oracle (Postgres)
+SYNC_FETCH_LOCK_KEY = 20250103
+
+# Key in AsyncSession.info holding {codigo_busqueda: codigo_ccosto}
+CCOSTO_MEMO_KEY = "manager_ccosto_memo"
+
+
+def extract_codigo_for_oracle(cod_oficina: str) -> str:
+    """
+    Extract digits to search Oracle based on cod_oficina length:
+    - 7 digits -> first 4
+    - 6 digits -> first 3
+    - 5 digits -> first 2
+    - 4 digits -> first 1
+    """
+    cod = cod_oficina.strip()
+    length = len(cod)
+
+    if length >= 7:
+        return cod[:4]
+    elif length == 6:
+        return cod[:3]
+    elif length == 5:
+        return cod[:2]
+    elif length == 4:
+        return cod[:1]
+    else:
+        return cod
+
+
+# --- Local lookups ---
+
+async def mirror_ready(db: AsyncSession, source: str) -> bool:
+    """True once the source has been synced successfully at least once"""
+    watermark = await db.get(models.SyncWatermark, source)
+    return watermark is not None and watermark.last_success_at is not None
+
+
+def _oficina_manager_query():
+    return (
+        select(
+            models.ManagerOficina.codigo,
+            models.ManagerOficina.nombre,
+            models.ManagerOficina.codigo_ccosto,
+            models.ManagerCentroCosto.nombre
+        )
+        .outerjoin(
+            models.ManagerCentroCosto,
+            models.ManagerCentroCosto.codigo == models.ManagerOficina.codigo_ccosto
+        )
+    )
+
+
+def _oficina_manager_dict(row) -> Dict[str, Any]:
+    return {
+        "codigo_oficina": row[0],
+        "nombre_oficina": row[1],
+        "codigo_ccosto": row[2],
+        "nombre_ccosto": row[3]
+    }
+
+
+async def get_oficina_manager(db: AsyncSession, codigo: str) -> Optional[Dict[str, Any]]:
+    """Office + cost center from the local mirror by DNOCODIGO"""
+    result = await db.execute(
+        _oficina_manager_query().filter(models.ManagerOficina.codigo == codigo.strip())
+    )
+    row = result.first()
+    return _oficina_manager_dict(row) if row else None
+
+
+async def get_all_oficinas_manager(db: AsyncSession) -> List[Dict[str, Any]]:
+    """Every office with its cost center from the local mirror"""
+    result = await db.execute(_oficina_manager_query().order_by(models.ManagerOficina.codigo))
+    return [_oficina_manager_dict(row) for row in result.all()]
+
+
+def _fetch_centros_costo_oracle(codigos: List[str]) -> Dict[str, str]:
+    """Blocking: {codigo: ccosto} straight from MNGDNO (runs in the Oracle thread pool)"""
+    ccostos = {}
+    for codigo in codigos:
+        oficina = oracle_database.get_oficina_by_codigo(codigo)
+        ccostos[codigo] = ((oficina or {}).get("codigo_ccosto") or "").strip()
+    return ccostos
+
+
+async def get_centros_costo(db: AsyncSession, cod_oficinas: List[str]) -> Dict[str, str]:
+    """
+    Centros de costo for many cod_oficina: one query on the mirror or, while
+    the mirror has never been synced, straight from Oracle (raises the
+    Oracle error if it cannot be read). Returns {cod_oficina: ccosto}, with
+    an empty string for offices not found. Memoized on the session.
+    """
+    memo = db.info.setdefault(CCOSTO_MEMO_KEY, {})
+    codigos = {cod: extract_codigo_for_oracle(cod) for cod in dict.fromkeys(cod_oficinas) if cod}
+    pendientes = sorted({c for c in codigos.values() if c not in memo})
+    if pendientes:
+        if await mirror_ready(db, "manager_oficinas"):
+            result = await db.execute(
+                select(models.ManagerOficina.codigo, models.ManagerOficina.codigo_ccosto)
+                .filter(models.ManagerOficina.codigo.in_(pendientes))
+            )
+            encontrados: Dict[str, str] = {}
+            for codigo, ccosto in result:
+                encontrados.setdefault(codigo, (ccosto or "").strip())
+        else:
+            encontrados = await oracle_database.run_oracle(_fetch_centros_costo_oracle, pendientes)
+        for codigo in pendientes:
+            memo[codigo] = encontrados.get(codigo, "")
+    return {cod: memo[codigo] for cod, codigo in codigos.items()}
+
+
+async def get_centro_costo(db: AsyncSession, cod_oficina: str) -> str:
+    """Centro de costo for one local cod_oficina (see get_centros_costo)"""
+    return (await get_centros_costo(db, [cod_oficina])).get(cod_oficina, "")
+
+
+async def assign_codigo_ccosto(db: AsyncSession, oficina: models.Oficina):
+    """
+    Set oficina.codigo_ccosto from Manager (call before committing an oficina).
+    If Manager cannot be read it stays empty until the next oficinas sync
+    (refresh_oficinas_ccosto).
+    """
+    oficina.codigo_ccosto = None
+    if oficina.cod_oficina:
+        try:
+            oficina.codigo_ccosto = await get_centro_costo(db, oficina.cod_oficina) or None
+        except Exception as e:
+            print(f"Warning: centro de costo de la oficina {oficina.cod_oficina} no disponible: {e}")
+
+
+async def refresh_oficinas_ccosto(db: AsyncSession) -> int:
+    """
+    Join the mirrored cost centers onto the local oficinas.
+    Returns the number of oficinas updated.
+    """
+    result = await db.execute(select(models.ManagerOficina.codigo, models.ManagerOficina.codigo_ccosto))
+    ccostos = {codigo: ccosto for codigo, ccosto in result.all()}
+
+    result = await db.execute(select(models.Oficina))
+    updated = []
+    for oficina in result.scalars().all():
+        ccosto = ccostos.get(extract_codigo_for_oracle(oficina.cod_oficina)) if oficina.cod_oficina else None
+        if oficina.codigo_ccosto != ccosto:
+            oficina.codigo_ccosto = ccosto
+            updated.append(oficina.id)
+    db.info.pop(CCOSTO_MEMO_KEY, None)
+    await reference_data.record_changes(db, "oficinas", updated)
+    return len(updated)
+
+
+# --- Vinculados (provider NIT -> name) ---
+
+# Max rows ranked in Python for the fuzzy name search
+FUZZY_CANDIDATES = 200
+# Minimum similarity (0-1) for matches that only share the start of a word
+FUZZY_MIN_SCORE = 0.3
+
+
+def normalize_nit(nit: str) -> str:
+    """NIT without check digit, spaces or dots ('890.123.456-7' -> '890123456')"""
+    nit = nit.split('-')[0] if '-' in nit else nit
+    return re.sub(r'[\s.]', '', nit)
+
+
+def normalize_nombre(nombre: Optional[str]) -> str:
+    """Upper case, without accents and with single spaces (for name search)"""
+    if not nombre:
+        return ""
+    sin_tildes = ''.join(
+        c for c in unicodedata.normalize('NFKD', nombre) if not unicodedata.combining(c)
+    )
+    return ' '.join(sin_tildes.upper().split())
+
+
+def _fetch_vinculados() -> List[Dict[str, Any]]:
+    return [
+        {
+            "nit": normalize_nit(row["nit"]),
+            "nombre": row["nombre"],
+            "nombre_normalizado": normalize_nombre(row["nombre"])
+        }
+        for row in oracle_database.fetch_manager_vinculados()
+        if row["nit"]
+    ]
+
+
+async def get_vinculado_by_nit(db: AsyncSession, nit: str) -> Optional[Dict[str, Any]]:
+    """
+    Provider name by NIT.
+    Reads the local mirror (primary key lookup); Oracle is only queried if
+    the mirror has never been synced.
+    """
+    nit_clean = normalize_nit(nit)
+    if await mirror_ready(db, "manager_vinculados"):
+        vinculado = await db.get(models.ManagerVinculado, nit_clean)
+        return {"nit": vinculado.nit, "nombre": vinculado.nombre} if vinculado else None
+    return await oracle_database.run_oracle(oracle_database.get_proveedor_by_nit_oracle, nit_clean)
+
+
+async def search_vinculados(db: AsyncSession, texto: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """
+    Search the mirror by NIT prefix or name.
+    Name prefix matches come first (indexed), then names containing every
+    word of the search ranked by similarity.
+    """
+    consulta = normalize_nombre(texto)
+    if not consulta:
+        return []
+
+    model = models.ManagerVinculado
+    nit_clean = normalize_nit(texto)
+    if nit_clean.isdigit():
+        result = await db.execute(
+            select(model).filter(model.nit.startswith(nit_clean, autoescape=True)).order_by(model.nit).limit(limit)
+        )
+        return [{"nit": v.nit, "nombre": v.nombre, "score": 1.0} for v in result.scalars().all()]
+
+    result = await db.execute(
+        select(model)
+        .filter(model.nombre_normalizado.startswith(consulta, autoescape=True))
+        .order_by(model.nombre_normalizado)
+        .limit(limit)
+    )
+    encontrados = {v.nit: {"nit": v.nit, "nombre": v.nombre, "score": 1.0} for v in result.scalars().all()}
+
+    palabras = consulta.split()
+    # Names containing every word, then (for typos) any word's first letters
+    filtros = [
+        (and_(*[model.nombre_normalizado.contains(p, autoescape=True) for p in palabras]), 0),
+        (or_(*[model.nombre_normalizado.contains(p[:3], autoescape=True) for p in palabras]), FUZZY_MIN_SCORE),
+    ]
+    for filtro, min_score in filtros:
+        if len(encontrados) >= limit:
+            break
+        result = await db.execute(select(model).filter(filtro).limit(FUZZY_CANDIDATES))
+        candidatos = [
+            {
+                "nit": v.nit,
+                "nombre": v.nombre,
+                "score": round(difflib.SequenceMatcher(None, consulta, v.nombre_normalizado).ratio(), 3)
+            }
+            for v in result.scalars().all()
+            if v.nit not in encontrados
+        ]
+        candidatos = [c for c in candidatos if c["score"] >= min_score]
+        candidatos.sort(key=lambda c: c["score"], reverse=True)
+        for candidato in candidatos[:limit - len(encontrados)]:
+            encontrados[candidato["nit"]] = candidato
+
+    return list(encontrados.values())
+
+
+# --- Sync ---
+
+# Source name -> how to pull and store it. Sources are synced in this order.
+SOURCES: Dict[str, Dict[str, Any]] = {
+    "manager_centros_costo": {
+        "fetch": oracle_database.fetch_manager_centros_costo,
+        "model": models.ManagerCentroCosto,
+        "cache_tags": ("manager_oficinas",),
+    },
+    "manager_oficinas": {
+        "fetch": oracle_database.fetch_manager_oficinas,
+        "model": models.ManagerOficina,
+        "after": refresh_oficinas_ccosto,
+        "cache_tags": ("manager_oficinas", "oficinas"),
+    },
+    "manager_vinculados": {
+        "fetch": _fetch_vinculados,
+        "model": models.ManagerVinculado,
+    },
+}
+
+_sync_lock = asyncio.Lock()
+_periodic_task: Optional[asyncio.Task] = None
+
+
+def _checksum(rows: List[Dict[str, Any]]) -> str:
+    payload = json.dumps(rows, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _dialect_insert(model):
+    """INSERT construct with ON CONFLICT support for the configured database"""
+    if engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
+
+
+async def _upsert(db: AsyncSession, model, rows: List[Dict[str, Any]], synced_at: datetime):
+    key = model.__table__.primary_key.columns.keys()[0]
+    for i in range(0, len(rows), UPSERT_CHUNK_SIZE):
+        chunk = [{**row, "synced_at": synced_at} for row in rows[i:i + UPSERT_CHUNK_SIZE]]
+        stmt = _dialect_insert(model).values(chunk)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[key],
+            set_={name: stmt.excluded[name] for name in chunk[0] if name != key}
+        )
+        await db.execute(stmt)
+
+
+async def _save_watermark(db: AsyncSession, source: str, **values):
+    watermark = await db.get(models.SyncWatermark, source)
+    if watermark is None:
+        watermark = models.SyncWatermark(source=source)
+        db.add(watermark)
+    for name, value in values.items():
+        setattr(watermark, name, value)
+
+
+async def _acquire_lock(db: AsyncSession) -> bool:
+    """Transaction-scoped lock so concurrent workers do not write the same mirror"""
+    if engine.dialect.name != 'postgresql':
+        return True
+    result = await db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": SYNC_LOCK_KEY})
+    return bool(result.scalar())
+
+
+async def sync_source(source: str, force: bool = False) -> Dict[str, Any]:
+    """
+    Pull one source from Oracle and upsert it into its mirror table.
+    Rows that disappeared from Oracle are deleted. Unchanged data is skipped
+    unless force=True.
+    """
+    config = SOURCES[source]
+    model = config["model"]
+    key = model.__table__.primary_key.columns.keys()[0]
+    started_at = datetime.now()
+    start = time.perf_counter()
+
+    try:
+        rows = await oracle_database.run_oracle(config["fetch"], timeout=MANAGER_SYNC_TIMEOUT)
+        # Trimmed codes can collide, keep the last one
+        rows = list({row[key]: row for row in rows if row[key]}.values())
+        if not rows:
+            # Keep the current mirror rather than wiping it
+            raise ValueError(f"Oracle no devolvio filas para {source}")
+        checksum = _checksum(rows)
+
+        async with SessionLocal() as db:
+            if not await _acquire_lock(db):
+                return {"source": source, "status": "SKIPPED", "message": "Otra sincronizacion en curso"}
+
+            watermark = await db.get(models.SyncWatermark, source)
+            status = "OK"
+            if not force and watermark is not None and watermark.checksum == checksum:
+                status = "UNCHANGED"
+            else:
+                await _upsert(db, model, rows, started_at)
+                await db.execute(delete(model).where(model.synced_at < started_at))
+                if config.get("after"):
+                    await config["after"](db)
+
+            duration_ms = int((time.perf_counter() - start) * 1000)
+            await _save_watermark(
+                db, source,
+                last_success_at=started_at,
+                last_attempt_at=started_at,
+                checksum=checksum,
+                row_count=len(rows),
+                duration_ms=duration_ms,
+                status=status,
+                error_message=None
+            )
+            await db.commit()
+
+        if status == "OK":
+            response_cache.invalidate(*config.get("cache_tags", ()))
+        print(f"[INFO] Sync {source}: {status}, {len(rows)} filas en {duration_ms} ms")
+        return {"source": source, "status": status, "rows": len(rows), "duration_ms": duration_ms}
+
+    except Exception as e:
+        duration_ms = int((time.perf_counter() - start) * 1000)
+        print(f"Error syncing {source}: {e}")
+        async with SessionLocal() as db:
+            await _save_watermark(
+                db, source,
+                last_attempt_at=started_at,
+                duration_ms=duration_ms,
+                status="ERROR",
+                error_message=str(e)[:2000]
+            )
+            await db.commit()
+        return {"source": source, "status": "ERROR", "error": str(e), "duration_ms": duration_ms}
+
+
+@asynccontextmanager
+async def _fetch_lock():
+    """
+    Session advisory lock held while a worker pulls the sources from Oracle;
+    yields False if another worker holds it. Always True outside Postgres.
+    """
+    if engine.dialect.name != 'postgresql':
+        yield True
+        return
+    async with engine.connect() as conn:
+        # Autocommit: the connection sits idle while Oracle is read
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        result = await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": SYNC_FETCH_LOCK_KEY})
+        acquired = bool(result.scalar())
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SYNC_FETCH_LOCK_KEY})
+
+
+async def _sync_due(source: str) -> bool:
+    """False if any worker attempted the source less than MANAGER_SYNC_INTERVAL_MIN ago"""
+    async with SessionLocal() as db:
+        watermark = await db.get(models.SyncWatermark, source)
+    if watermark is None or watermark.last_attempt_at is None:
+        return True
+    return datetime.now() - watermark.last_attempt_at >= timedelta(minutes=MANAGER_SYNC_INTERVAL_MIN)
+
+
+async def sync_all(force: bool = False, only_due: bool = False) -> List[Dict[str, Any]]:
+    """
+    Sync every source in order (one run at a time per process, one worker at
+    a time across processes: the others skip instead of reading Oracle).
+    With only_due, sources synced by any worker within the interval are skipped.
+    """
+    async with _sync_lock:
+        async with _fetch_lock() as acquired:
+            if not acquired:
+                return [
+                    {"source": source, "status": "SKIPPED", "message": "Otra sincronizacion en curso"}
+                    for source in SOURCES
+                ]
+            results = []
+            for source in SOURCES:
+                if only_due and not await _sync_due(source):
+                    results.append({"source": source, "status": "SKIPPED", "message": "Sincronizada recientemente"})
+                    continue
+                results.append(await sync_source(source, force=force))
+            return results
+
+
+async def get_watermarks(db: AsyncSession) -> List[Dict[str, Any]]:
+    """Sync state for every source"""
+    result = await db.execute(select(models.SyncWatermark))
+    watermarks = {w.source: w for w in result.scalars().all()}
+    estados = []
+    for source in SOURCES:
+        w = watermarks.get(source)
+        estados.append({
+            "source": source,
+            "status": w.status if w else None,
+            "rows": w.row_count if w else 0,
+            "last_success_at": w.last_success_at if w else None,
+            "last_attempt_at": w.last_attempt_at if w else None,
+            "duration_ms": w.duration_ms if w else None,
+            "error_message": w.error_message if w else None,
+        })
+    return estados
+
+
+# --- Periodic task ---
+
+async def _periodic_run():
+    """One scheduled run; errors are logged so the task keeps going"""
+    try:
+        await sync_all(only_due=True)
+    except Exception as e:
+        print(f"Warning: sincronizacion periodica con Manager fallida: {e}")
+
+
+async def _periodic_sync():
+    if MANAGER_SYNC_ON_STARTUP:
+        await _periodic_run()
+    while MANAGER_SYNC_INTERVAL_MIN > 0:
+        await asyncio.sleep(MANAGER_SYNC_INTERVAL_MIN * 60)
+        await _periodic_run()
+
+
+def start_periodic_sync():
+    """Start the background sync task (called from the app lifespan)"""
+    global _periodic_task
+    if _periodic_task is None or _periodic_task.done():
+        _periodic_task = asyncio.create_task(_periodic_sync())
+
+
+async def stop_periodic_sync():
+    """Cancel the background sync task"""
+    global _periodic_task
+    if _periodic_task is not None:
+        _periodic_task.cancel()
+        try:
+            await _periodic_task
+        except asyncio.CancelledError:
+            pass
+        _periodic_task = None
+
+
+async def main():
+    if "--status" in sys.argv:
+        async with SessionLocal() as db:
+            for w in await get_watermarks(db):
+                print(f"{w['source']}: {w['status']} ({w['rows']} filas, ultimo exito {w['last_success_at']})")
+    else:
+        for r in await sync_all(force="--force" in sys.argv):
+            print(r)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,303 @@
+"""
+Metrics Module
+Request timing and hot-path instrumentation, exposed in Prometheus text format.
+
+Recorded:
+- Per-route request latency (route template, method, status)
+- Postgres query count and time per request (SQLAlchemy events in database.py)
+- Oracle call timings (oracle_database.run_oracle)
+- Outbound HTTP timings per target (http_clients)
+- Excel render durations per report (consolidado, archivo_plano, reportes)
+- Background export job durations (export_jobs)
+
+Every response also gets a Server-Timing header with the time spent in
+each component during that request, so it shows up in the browser devtools:
+    Server-Timing: db;dur=12.4;desc="7 queries", oracle;dur=230.1, app;dur=260.9
+
+Histograms are kept in process; each worker exposes its own /metrics.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "si", "yes")
+SERVER_TIMING_ENABLED = os.getenv("SERVER_TIMING_ENABLED", "true").lower() in ("1", "true", "si", "yes")
+
+# Seconds. Covers fast lookups up to long Oracle inserts and big workbooks
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+# Background exports, queue wait included
+JOB_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+# Components reported in Server-Timing, in this order
+TIMING_COMPONENTS = ("db", "oracle", "http", "excel")
+
+_lock = threading.Lock()
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram with labels"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...],
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [bucket counts..., sum, count]
+        self.series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str):
+        with _lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def expose(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} histogram"
+        with _lock:
+            items = [(labels, list(series)) for labels, series in self.series.items()]
+        for labels, series in sorted(items):
+            base = _format_labels(self.label_names, labels)
+            for bound, count in zip(self.buckets, series):
+                le = _format_labels(("le",), (f"{bound:g}",))
+                yield f"{self.name}_bucket{{{_join(base, le)}}} {count}"
+            le = _format_labels(("le",), ("+Inf",))
+            yield f"{self.name}_bucket{{{_join(base, le)}}} {series[-1]}"
+            yield f"{self.name}_sum{_braces(base)} {series[-2]:.6f}"
+            yield f"{self.name}_count{_braces(base)} {series[-1]}"
+
+
+class Counter:
+    """Prometheus-style counter with labels"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.series: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with _lock:
+            self.series[labels] = self.series.get(labels, 0) + amount
+
+    def expose(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help_text}"
+        yield f"# TYPE {self.name} counter"
+        with _lock:
+            items = sorted(self.series.items())
+        for labels, value in items:
+            yield f"{self.name}{_braces(_format_labels(self.label_names, labels))} {value:g}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    return ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+
+
+def _join(*parts: str) -> str:
+    return ",".join(p for p in parts if p)
+
+
+def _braces(labels: str) -> str:
+    return f"{{{labels}}}" if labels else ""
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "API request latency", ("method", "route", "status"))
+REQUEST_DB_QUERIES = Histogram(
+    "http_request_db_queries", "Postgres queries per API request", ("route",), COUNT_BUCKETS)
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds", "Postgres statement latency", ())
+ORACLE_CALL_DURATION = Histogram(
+    "oracle_call_duration_seconds", "Oracle (Manager) call latency", ("outcome",))
+HTTP_CLIENT_DURATION = Histogram(
+    "http_client_request_duration_seconds", "Outbound HTTP request latency", ("target", "outcome"))
+EXCEL_RENDER_DURATION = Histogram(
+    "excel_render_duration_seconds", "Excel workbook render time", ("report",))
+EXPORT_JOB_DURATION = Histogram(
+    "export_job_duration_seconds", "Background export job time from submit to finish", ("tipo", "estado"),
+    JOB_BUCKETS)
+REQUEST_EXCEPTIONS = Counter(
+    "http_request_exceptions_total", "API requests that raised an unhandled exception", ("route",))
+
+REGISTRY = [
+    REQUEST_DURATION,
+    REQUEST_DB_QUERIES,
+    DB_QUERY_DURATION,
+    ORACLE_CALL_DURATION,
+    HTTP_CLIENT_DURATION,
+    EXCEL_RENDER_DURATION,
+    EXPORT_JOB_DURATION,
+    REQUEST_EXCEPTIONS,
+]
+
+
+# --- Per-request timings ---
+
+class RequestTimings:
+    """Time and count per component for the current request"""
+
+    def __init__(self):
+        self.ms: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def add(self, component: str, elapsed_ms: float):
+        self.ms[component] = self.ms.get(component, 0.0) + elapsed_ms
+        self.counts[component] = self.counts.get(component, 0) + 1
+
+    def server_timing(self, total_ms: float) -> str:
+        parts = []
+        for component in TIMING_COMPONENTS:
+            if component in self.counts:
+                count = self.counts[component]
+                desc = f"{count} {'queries' if component == 'db' else 'calls'}"
+                parts.append(f'{component};dur={self.ms[component]:.1f};desc="{desc}"')
+        parts.append(f"app;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+
+_current: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    "request_timings", default=None)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+def _add_to_request(component: str, elapsed_ms: float):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(component, elapsed_ms)
+
+
+def record_db_query(elapsed_ms: float):
+    if not METRICS_ENABLED:
+        return
+    DB_QUERY_DURATION.observe(elapsed_ms / 1000)
+    _add_to_request("db", elapsed_ms)
+
+
+def record_oracle_call(elapsed_ms: float, outcome: str):
+    if not METRICS_ENABLED:
+        return
+    ORACLE_CALL_DURATION.observe(elapsed_ms / 1000, outcome)
+    _add_to_request("oracle", elapsed_ms)
+
+
+def record_http_call(target: str, elapsed_ms: float, outcome: str):
+    if not METRICS_ENABLED:
+        return
+    HTTP_CLIENT_DURATION.observe(elapsed_ms / 1000, target, outcome)
+    _add_to_request("http", elapsed_ms)
+
+
+def record_excel_render(report: str, elapsed_ms: float):
+    if not METRICS_ENABLED:
+        return
+    EXCEL_RENDER_DURATION.observe(elapsed_ms / 1000, report)
+    _add_to_request("excel", elapsed_ms)
+
+
+def record_export_job(tipo: str, estado: str, elapsed_s: float):
+    if not METRICS_ENABLED:
+        return
+    EXPORT_JOB_DURATION.observe(elapsed_s, tipo, estado)
+
+
+@contextmanager
+def excel_render(report: str):
+    """
+    Time an Excel render block:
+        with metrics.excel_render("consolidado"):
+            wb.save(output)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_excel_render(report, (time.perf_counter() - start) * 1000)
+
+
+# --- Middleware ---
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware: times each request, collects the per-component
+    timings and adds the Server-Timing header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        status_holder = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+                if SERVER_TIMING_ENABLED:
+                    total_ms = (time.perf_counter() - start) * 1000
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timings.server_timing(total_ms).encode("latin-1")))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            REQUEST_EXCEPTIONS.inc(route_label(scope))
+            raise
+        finally:
+            _current.reset(token)
+            route = route_label(scope)
+            REQUEST_DURATION.observe(time.perf_counter() - start, scope["method"], route,
+                                     str(status_holder["status"]))
+            REQUEST_DB_QUERIES.observe(timings.counts.get("db", 0), route)
+
+
+def route_label(scope) -> str:
+    """
+    Route template (/api/facturas/{factura_id}), never the raw path, so
+    ids do not create a new series per request.
+    """
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    # FastAPI versions that resolve included routers lazily leave the original
+    # route (without the include_router prefix) in scope["route"]; the
+    # effective route context has the full template
+    effective = (scope.get("fastapi") or {}).get("effective_route_context")
+    path_format = getattr(effective, "path_format", None) or getattr(route, "path_format", route.path)
+    # root_path carries the prefix of a mounted sub-app, path_format is
+    # relative to the app that matched the route
+    return scope.get("root_path", "") + path_format
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,6 @@
+-- Migration: Add IVA and Retefuente settings to contratos
+-- Replaces the old migrate_tax_fields.py script
+
+ALTER TABLE contratos ADD COLUMN IF NOT EXISTS tiene_iva VARCHAR(10) DEFAULT 'no';
+ALTER TABLE contratos ADD COLUMN IF NOT EXISTS tiene_retefuente VARCHAR(10) DEFAULT 'no';
+ALTER TABLE contratos ADD COLUMN IF NOT EXISTS retefuente_pct DECIMAL(5, 2);
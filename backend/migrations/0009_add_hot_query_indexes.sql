@@ -0,0 +1,14 @@
+-- Migration: Indexes for the hot queries
+-- Databases created with create_all never got the indexes from the earlier
+-- migration files, so they are (re)declared here.
+
+-- Joins from facturas to their oficina assignments
+CREATE INDEX IF NOT EXISTS idx_factura_oficinas_factura ON factura_oficinas(factura_id);
+CREATE INDEX IF NOT EXISTS idx_factura_oficinas_oficina ON factura_oficinas(oficina_id);
+CREATE INDEX IF NOT EXISTS idx_factura_oficinas_contrato ON factura_oficinas(contrato_id);
+
+-- Contract auto-detection: proveedor + oficina, ACTIVO first
+CREATE INDEX IF NOT EXISTS idx_contratos_proveedor_oficina_estado ON contratos(proveedor_id, oficina_id, estado);
+
+-- Facturas by proveedor
+CREATE INDEX IF NOT EXISTS idx_facturas_proveedor ON facturas(proveedor_id);
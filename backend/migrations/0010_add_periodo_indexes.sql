@@ -0,0 +1,6 @@
+-- Migration: Indexes for the monthly "pendientes por llegar" anti-join
+-- Facturas are filtered by a fecha_factura range (month start / next month start)
+-- and matched to contracts through factura_oficinas.
+
+CREATE INDEX IF NOT EXISTS idx_facturas_fecha_factura ON facturas(fecha_factura);
+CREATE INDEX IF NOT EXISTS idx_factura_oficinas_contrato_factura ON factura_oficinas(contrato_id, factura_id);
@@ -0,0 +1,32 @@
+-- Migration: Local mirror of Manager (Oracle) offices and cost centers
+-- Filled by manager_sync.py from MANAGER.MNGDNO and MANAGER.MNGCCO so that
+-- cost-center lookups do not query Oracle on the request path.
+
+CREATE TABLE IF NOT EXISTS manager_oficinas (
+    codigo VARCHAR(20) PRIMARY KEY,  -- TRIM(DNOCODIGO)
+    nombre VARCHAR(255),
+    codigo_ccosto VARCHAR(20),       -- TRIM(DNOCCOSTO)
+    synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_manager_oficinas_codigo_ccosto ON manager_oficinas(codigo_ccosto);
+
+CREATE TABLE IF NOT EXISTS manager_centros_costo (
+    codigo VARCHAR(20) PRIMARY KEY,  -- TRIM(CCOCODIGO)
+    nombre VARCHAR(255),
+    synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS sync_watermarks (
+    source VARCHAR(100) PRIMARY KEY,
+    last_success_at TIMESTAMP,
+    last_attempt_at TIMESTAMP,
+    checksum VARCHAR(64),
+    row_count INTEGER DEFAULT 0,
+    duration_ms INTEGER,
+    status VARCHAR(20),
+    error_message TEXT
+);
+
+-- Cost center joined onto the local oficinas
+ALTER TABLE oficinas ADD COLUMN IF NOT EXISTS codigo_ccosto VARCHAR(20);
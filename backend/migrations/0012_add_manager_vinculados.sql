@@ -0,0 +1,13 @@
+-- Migration: Local mirror of MANAGER.VINCULADO for provider NIT lookups
+-- Filled by manager_sync.py. The NIT is stored normalized (digits before the
+-- check digit) so lookups are an exact primary key match.
+
+CREATE TABLE IF NOT EXISTS manager_vinculados (
+    nit VARCHAR(50) PRIMARY KEY,
+    nombre VARCHAR(255),
+    nombre_normalizado VARCHAR(255),  -- upper case, no accents, single spaces
+    synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- varchar_pattern_ops lets LIKE 'PREFIX%' use the index regardless of collation
+CREATE INDEX IF NOT EXISTS idx_manager_vinculados_nombre ON manager_vinculados(nombre_normalizado varchar_pattern_ops);
@@ -0,0 +1,25 @@
+-- Migration: Versioned change log for reference data (proveedores, oficinas, contratos)
+-- Written by the crud functions through reference_data.py. Each entity row keeps
+-- only its latest change; deletes stay as tombstones so delta sync never misses one.
+
+CREATE TABLE IF NOT EXISTS reference_changes (
+    version BIGSERIAL PRIMARY KEY,
+    entity VARCHAR(30) NOT NULL,
+    entity_id INTEGER NOT NULL,
+    operacion VARCHAR(10) NOT NULL,  -- UPSERT, DELETE
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_reference_changes_entity UNIQUE (entity, entity_id)
+);
+
+-- Existing rows start as one change each, so a delta from version 0 is a full copy
+INSERT INTO reference_changes (entity, entity_id, operacion)
+SELECT 'proveedores', id, 'UPSERT' FROM proveedores ORDER BY id
+ON CONFLICT (entity, entity_id) DO NOTHING;
+
+INSERT INTO reference_changes (entity, entity_id, operacion)
+SELECT 'oficinas', id, 'UPSERT' FROM oficinas ORDER BY id
+ON CONFLICT (entity, entity_id) DO NOTHING;
+
+INSERT INTO reference_changes (entity, entity_id, operacion)
+SELECT 'contratos', id, 'UPSERT' FROM contratos ORDER BY id
+ON CONFLICT (entity, entity_id) DO NOTHING;
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, DateTime, Numeric, ForeignKey, Text, UniqueConstraint, func
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Numeric, ForeignKey, Text, UniqueConstraint, Index, func
 from sqlalchemy.orm import relationship
 from database import Base
 
@@ -23,8 +23,15 @@ class Oficina(Base):
     direccion = Column(String(255))
     ciudad = Column(String(100))
     zona = Column(String(100))
+    # Centro de costo from Manager (filled by manager_sync)
+    codigo_ccosto = Column(String(20))
     
     contratos = relationship("Contrato", back_populates="oficina")
+    centro_costo = relationship(
+        "ManagerCentroCosto",
+        primaryjoin="foreign(Oficina.codigo_ccosto) == ManagerCentroCosto.codigo",
+        viewonly=True
+    )
 
 class Contrato(Base):
     __tablename__ = "contratos"
@@ -63,6 +70,11 @@ class Contrato(Base):
     proveedor = relationship("Proveedor", back_populates="contratos")
     oficina = relationship("Oficina", back_populates="contratos")
     pagos = relationship("Pago", back_populates="contrato")
+    
+    __table_args__ = (
+        # Contract auto-detection by proveedor + oficina (see migrations/0009)
+        Index("idx_contratos_proveedor_oficina_estado", "proveedor_id", "oficina_id", "estado"),
+    )
 
 class Pago(Base):
     __tablename__ = "pagos"
@@ -118,6 +130,12 @@ class Factura(Base):
     
     # New: multiple oficinas with individual values
     oficinas_asignadas = relationship("FacturaOficina", back_populates="factura", cascade="all, delete-orphan")
+    
+    __table_args__ = (
+        Index("idx_facturas_proveedor", "proveedor_id"),
+        # Monthly period lookups use a range on fecha_factura (see migrations/0010)
+        Index("idx_facturas_fecha_factura", "fecha_factura"),
+    )
 
 
 class FacturaOficina(Base):
@@ -147,6 +165,13 @@ class FacturaOficina(Base):
     factura = relationship("Factura", back_populates="oficinas_asignadas")
     oficina = relationship("Oficina")
     contrato = relationship("Contrato")
+    
+    __table_args__ = (
+        Index("idx_factura_oficinas_factura", "factura_id"),
+        Index("idx_factura_oficinas_oficina", "oficina_id"),
+        Index("idx_factura_oficinas_contrato", "contrato_id"),
+        Index("idx_factura_oficinas_contrato_factura", "contrato_id", "factura_id"),
+    )
 
 
 class FacturaUpload(Base):
@@ -173,3 +198,84 @@ class FacturaUpload(Base):
     
     # Relationship
     factura = relationship("Factura")
+
+
+# --- Manager (Oracle) mirror tables, filled by manager_sync ---
+
+class ManagerOficina(Base):
+    """Local copy of MANAGER.MNGDNO keyed on the trimmed DNOCODIGO"""
+    __tablename__ = "manager_oficinas"
+    
+    codigo = Column(String(20), primary_key=True)
+    nombre = Column(String(255))
+    codigo_ccosto = Column(String(20), index=True)
+    synced_at = Column(DateTime, server_default=func.now())
+    
+    centro_costo = relationship(
+        "ManagerCentroCosto",
+        primaryjoin="foreign(ManagerOficina.codigo_ccosto) == ManagerCentroCosto.codigo",
+        viewonly=True
+    )
+
+
+class ManagerCentroCosto(Base):
+    """Local copy of MANAGER.MNGCCO keyed on the trimmed CCOCODIGO"""
+    __tablename__ = "manager_centros_costo"
+    
+    codigo = Column(String(20), primary_key=True)
+    nombre = Column(String(255))
+    synced_at = Column(DateTime, server_default=func.now())
+
+
+class ManagerVinculado(Base):
+    """Local copy of MANAGER.VINCULADO keyed on the normalized NIT (no check digit)"""
+    __tablename__ = "manager_vinculados"
+    
+    nit = Column(String(50), primary_key=True)
+    nombre = Column(String(255))
+    nombre_normalizado = Column(String(255))  # Upper case, no accents, single spaces
+    synced_at = Column(DateTime, server_default=func.now())
+    
+    __table_args__ = (
+        # Prefix search on the name (see migrations/0012)
+        Index(
+            "idx_manager_vinculados_nombre", "nombre_normalizado",
+            postgresql_ops={"nombre_normalizado": "varchar_pattern_ops"}
+        ),
+    )
+
+
+class SyncWatermark(Base):
+    """Last sync state per mirrored source"""
+    __tablename__ = "sync_watermarks"
+    
+    source = Column(String(100), primary_key=True)
+    last_success_at = Column(DateTime)
+    last_attempt_at = Column(DateTime)
+    checksum = Column(String(64))  # Hash of the last synced rows, unchanged data is not rewritten
+    row_count = Column(Integer, default=0)
+    duration_ms = Column(Integer)
+    status = Column(String(20))  # OK, UNCHANGED, ERROR
+    error_message = Column(Text)
+
+
+class ReferenceChange(Base):
+    """
+    Change log of the reference data (proveedores, oficinas, contratos).
+    One row per entity row, holding its latest change: the version is bumped
+    on every write and deletes stay as tombstones, so clients can ask for
+    everything changed since the version they hold.
+    """
+    __tablename__ = "reference_changes"
+    
+    version = Column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    entity = Column(String(30), nullable=False)  # proveedores, oficinas, contratos
+    entity_id = Column(Integer, nullable=False)
+    operacion = Column(String(10), nullable=False)  # UPSERT, DELETE
+    changed_at = Column(DateTime, server_default=func.now())
+    
+    __table_args__ = (
+        UniqueConstraint('entity', 'entity_id', name='uq_reference_changes_entity'),
+        # Never reuse a version after its row is replaced
+        {'sqlite_autoincrement': True},
+    )
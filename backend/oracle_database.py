@@ -1,11 +1,21 @@
 """
 Oracle Database Connection Module
 Provides connection to MANAMED Oracle database
+
+oracledb calls are blocking. From async code, run them with run_oracle(),
+which uses a dedicated bounded thread pool and a per-call timeout so a slow
+Oracle query does not stall the event loop.
 """
 import oracledb
+import asyncio
+import functools
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
+import metrics
 
 load_dotenv()
 
@@ -16,6 +26,136 @@ ORACLE_SERVICE = os.getenv("ORACLE_SERVICE", "MANAMED")
 ORACLE_USER = os.getenv("ORACLE_USER", "WMENDEZ")
 ORACLE_PASSWORD = os.getenv("ORACLE_PASSWORD", "Ur-?*QWY5p*z@gnC")
 
+# Max concurrent Oracle calls from the API (size of the dedicated thread pool)
+ORACLE_MAX_WORKERS = int(os.getenv("ORACLE_MAX_WORKERS", "4"))
+# Per round-trip timeout enforced by the driver (0 disables it)
+ORACLE_CALL_TIMEOUT_MS = int(os.getenv("ORACLE_CALL_TIMEOUT_MS", "30000"))
+# Default timeout for a whole run_oracle() call, including the wait for a free worker
+ORACLE_TIMEOUT = float(os.getenv("ORACLE_TIMEOUT", "60"))
+ORACLE_CONNECT_TIMEOUT = float(os.getenv("ORACLE_CONNECT_TIMEOUT", "10"))
+
+
+class OracleTimeoutError(TimeoutError):
+    """An Oracle call did not finish within its timeout"""
+
+
+_executor = ThreadPoolExecutor(max_workers=ORACLE_MAX_WORKERS, thread_name_prefix="oracle")
+
+# Counters for run_oracle() calls
+oracle_stats = {
+    "calls": 0,
+    "in_flight": 0,
+    "timeouts": 0,
+    "errors": 0,
+    "max_ms": 0.0,
+    "total_ms": 0.0,
+}
+
+# Connections opened by the call running in the current worker thread
+_call_state = threading.local()
+
+
+class _OracleCall:
+    """Tracks the connections of one run_oracle() call so it can be cancelled"""
+
+    def __init__(self, started: Optional[asyncio.Future] = None):
+        self.connections = []
+        self.cancelled = False
+        # Resolved on the event loop when a worker picks the call up
+        self.started = started
+
+    def cancel(self):
+        self.cancelled = True
+        for connection in self.connections:
+            try:
+                # Interrupts the round-trip in progress on this connection
+                connection.cancel()
+            except Exception:
+                pass
+
+
+def _run_tracked(call: _OracleCall, func: Callable, args, kwargs):
+    if call.cancelled:
+        # Timed out while waiting for a free worker
+        raise OracleTimeoutError("Llamada a Oracle cancelada antes de iniciar")
+    if call.started is not None:
+        call.started.get_loop().call_soon_threadsafe(_set_started, call.started)
+    _call_state.current = call
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _call_state.current = None
+
+
+def _set_started(started: asyncio.Future):
+    if not started.done():
+        started.set_result(None)
+
+
+async def run_oracle(func: Callable, *args, timeout: Optional[float] = None,
+                     timeout_from_start: bool = False, **kwargs):
+    """
+    Run a blocking oracledb function in the Oracle thread pool.
+    On timeout or cancellation the running statement is cancelled on the
+    server and OracleTimeoutError is raised.
+    By default the timeout includes the wait for a free worker; with
+    timeout_from_start it counts from the moment the call starts running.
+    """
+    timeout = ORACLE_TIMEOUT if timeout is None else timeout
+    loop = asyncio.get_running_loop()
+    call = _OracleCall(loop.create_future() if timeout_from_start else None)
+    future = loop.run_in_executor(_executor, functools.partial(_run_tracked, call, func, args, kwargs))
+    oracle_stats["calls"] += 1
+    oracle_stats["in_flight"] += 1
+    start = time.perf_counter()
+    outcome = "ok"
+    try:
+        if timeout_from_start:
+            await asyncio.wait([future, call.started], return_when=asyncio.FIRST_COMPLETED)
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        call.cancel()
+        oracle_stats["timeouts"] += 1
+        outcome = "timeout"
+        raise OracleTimeoutError(f"Oracle no respondio en {timeout:g} s")
+    except asyncio.CancelledError:
+        call.cancel()
+        # Still queued (timeout_from_start): drop it, nobody awaits the result
+        future.cancel()
+        outcome = "cancelled"
+        raise
+    except Exception:
+        oracle_stats["errors"] += 1
+        outcome = "error"
+        raise
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        oracle_stats["in_flight"] -= 1
+        oracle_stats["total_ms"] += elapsed_ms
+        oracle_stats["max_ms"] = max(oracle_stats["max_ms"], elapsed_ms)
+        metrics.record_oracle_call(elapsed_ms, outcome)
+
+
+def get_oracle_status() -> Dict[str, Any]:
+    """Oracle thread pool settings and call counters"""
+    calls = oracle_stats["calls"]
+    return {
+        "max_workers": ORACLE_MAX_WORKERS,
+        "call_timeout_ms": ORACLE_CALL_TIMEOUT_MS,
+        "default_timeout_s": ORACLE_TIMEOUT,
+        "calls": calls,
+        "in_flight": oracle_stats["in_flight"],
+        "timeouts": oracle_stats["timeouts"],
+        "errors": oracle_stats["errors"],
+        "avg_ms": round(oracle_stats["total_ms"] / calls, 2) if calls else 0,
+        "max_ms": round(oracle_stats["max_ms"], 2),
+    }
+
+
+def shutdown_oracle_executor():
+    """Stop accepting Oracle calls (called on app shutdown)"""
+    _executor.shutdown(wait=False, cancel_futures=True)
+
 
 def get_oracle_connection():
     """
@@ -29,17 +169,90 @@ def get_oracle_connection():
             password=ORACLE_PASSWORD,
             host=ORACLE_HOST,
             port=ORACLE_PORT,
-            service_name=ORACLE_SERVICE
+            service_name=ORACLE_SERVICE,
+            tcp_connect_timeout=ORACLE_CONNECT_TIMEOUT
         )
+        if ORACLE_CALL_TIMEOUT_MS:
+            connection.call_timeout = ORACLE_CALL_TIMEOUT_MS
+        call = getattr(_call_state, "current", None)
+        if call is not None:
+            call.connections.append(connection)
+            if call.cancelled:
+                connection.close()
+                raise OracleTimeoutError("Llamada a Oracle cancelada")
         return connection
     except oracledb.Error as e:
         print(f"Error connecting to Oracle: {e}")
         raise
 
 
+# --- Code lookups that can use the native index ---
+
+# (owner, table, column) -> (data_type, char_length), read once from ALL_TAB_COLUMNS
+_column_widths: Dict[tuple, tuple] = {}
+
+OFICINA_SELECT = """
+    SELECT 
+        d.DNOCODIGO AS CODIGO_OFICINA,
+        d.DNONOMBRE AS NOMBRE_OFICINA,
+        d.DNOCCOSTO AS CODIGO_CCOSTO,
+        c.CCONOMBRE AS NOMBRE_CCOSTO
+    FROM 
+        MANAGER.MNGDNO d
+    LEFT JOIN 
+        MANAGER.MNGCCO c ON d.DNOCCOSTO = c.CCOCODIGO
+"""
+
+# Indexable form: compares the column as stored
+OFICINA_BY_CODIGO_QUERY = OFICINA_SELECT + " WHERE d.DNOCODIGO = :codigo"
+# Fallback form: TRIM on the column prevents index use (full scan)
+OFICINA_BY_CODIGO_TRIM_QUERY = OFICINA_SELECT + " WHERE TRIM(d.DNOCODIGO) = TRIM(:codigo)"
+
+
+def get_column_width(cursor, owner: str, table: str, column: str) -> tuple:
+    """
+    Data type and character width of a column (cached per process).
+    Returns (None, None) if the dictionary view is not readable.
+    """
+    key = (owner, table, column)
+    if key not in _column_widths:
+        cursor.execute("""
+            SELECT DATA_TYPE, CHAR_LENGTH
+            FROM ALL_TAB_COLUMNS
+            WHERE OWNER = :owner AND TABLE_NAME = :table_name AND COLUMN_NAME = :column_name
+        """, {"owner": owner, "table_name": table, "column_name": column})
+        row = cursor.fetchone()
+        _column_widths[key] = (row[0], row[1]) if row else (None, None)
+    return _column_widths[key]
+
+
+def normalize_code_bind(cursor, owner: str, table: str, column: str, value: str) -> str:
+    """
+    Bind value matching how codes are stored, so 'column = :bind' can use the index.
+    CHAR columns are blank-padded to their width; other types are just trimmed.
+    """
+    data_type, width = get_column_width(cursor, owner, table, column)
+    value = value.strip()
+    if data_type in ("CHAR", "NCHAR") and width and len(value) < width:
+        return value.ljust(width)
+    return value
+
+
+def _fetch_code_lookup(cursor, query: str, trim_query: str, bind_name: str,
+                       value: str, owner: str, table: str, column: str):
+    """Run the indexable lookup, falling back to the TRIM form only on a miss"""
+    cursor.execute(query, {bind_name: normalize_code_bind(cursor, owner, table, column, value)})
+    row = cursor.fetchone()
+    if row is None:
+        cursor.execute(trim_query, {bind_name: value})
+        row = cursor.fetchone()
+    return row
+
+
 def get_oficina_by_codigo(codigo: str) -> Optional[Dict[str, Any]]:
     """
     Retrieves office and cost center information by office code.
+    Looks up DNOCODIGO with a padded bind first (index), then with TRIM.
     
     Args:
         codigo: The office code (DNOCODIGO)
@@ -53,22 +266,10 @@ def get_oficina_by_codigo(codigo: str) -> Optional[Dict[str, Any]]:
         connection = get_oracle_connection()
         cursor = connection.cursor()
         
-        query = """
-            SELECT 
-                d.DNOCODIGO AS CODIGO_OFICINA,
-                d.DNONOMBRE AS NOMBRE_OFICINA,
-                d.DNOCCOSTO AS CODIGO_CCOSTO,
-                c.CCONOMBRE AS NOMBRE_CCOSTO
-            FROM 
-                MANAGER.MNGDNO d
-            LEFT JOIN 
-                MANAGER.MNGCCO c ON d.DNOCCOSTO = c.CCOCODIGO
-            WHERE 
-                TRIM(d.DNOCODIGO) = TRIM(:codigo)
-        """
-        
-        cursor.execute(query, {"codigo": codigo})
-        row = cursor.fetchone()
+        row = _fetch_code_lookup(
+            cursor, OFICINA_BY_CODIGO_QUERY, OFICINA_BY_CODIGO_TRIM_QUERY, "codigo",
+            codigo, "MANAGER", "MNGDNO", "DNOCODIGO"
+        )
         
         if row:
             return {
@@ -89,6 +290,73 @@ def get_oficina_by_codigo(codigo: str) -> Optional[Dict[str, Any]]:
             connection.close()
 
 
+def explain_code_lookup(codigo: str, repeticiones: int = 5) -> Dict[str, Any]:
+    """
+    Execution plan and timing of the indexable and TRIM forms of the
+    DNOCODIGO lookup (diagnostic).
+    """
+    connection = None
+    cursor = None
+    try:
+        connection = get_oracle_connection()
+        cursor = connection.cursor()
+        
+        bind_padded = normalize_code_bind(cursor, "MANAGER", "MNGDNO", "DNOCODIGO", codigo)
+        formas = {
+            "indexada": (OFICINA_BY_CODIGO_QUERY, bind_padded),
+            "trim": (OFICINA_BY_CODIGO_TRIM_QUERY, codigo),
+        }
+        data_type, width = get_column_width(cursor, "MANAGER", "MNGDNO", "DNOCODIGO")
+        resultado = {
+            "codigo": codigo,
+            "columna": {"data_type": data_type, "char_length": width},
+            "bind_indexada": bind_padded,
+            "formas": {}
+        }
+        
+        for nombre, (query, bind) in formas.items():
+            forma = {}
+            statement_id = f"FACT_{nombre.upper()}_{int(time.time() * 1000) % 100000000}"
+            try:
+                cursor.execute(f"EXPLAIN PLAN SET STATEMENT_ID = '{statement_id}' FOR {query}", {"codigo": bind})
+                cursor.execute(
+                    "SELECT PLAN_TABLE_OUTPUT FROM TABLE(DBMS_XPLAN.DISPLAY('PLAN_TABLE', :sid, 'TYPICAL'))",
+                    {"sid": statement_id}
+                )
+                forma["plan"] = [row[0] for row in cursor.fetchall()]
+                cursor.execute("DELETE FROM PLAN_TABLE WHERE STATEMENT_ID = :sid", {"sid": statement_id})
+            except oracledb.Error as e:
+                forma["plan_error"] = str(e)
+            
+            tiempos = []
+            filas = 0
+            for _ in range(max(1, repeticiones)):
+                start = time.perf_counter()
+                cursor.execute(query, {"codigo": bind})
+                filas = len(cursor.fetchall())
+                tiempos.append((time.perf_counter() - start) * 1000)
+            forma.update(
+                filas=filas,
+                repeticiones=len(tiempos),
+                min_ms=round(min(tiempos), 2),
+                avg_ms=round(sum(tiempos) / len(tiempos), 2),
+                max_ms=round(max(tiempos), 2)
+            )
+            resultado["formas"][nombre] = forma
+        
+        connection.rollback()
+        return resultado
+        
+    except oracledb.Error as e:
+        print(f"Error executing query: {e}")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+
 def get_all_oficinas() -> List[Dict[str, Any]]:
     """
     Retrieves all offices with their cost center information.
@@ -138,9 +406,14 @@ def get_all_oficinas() -> List[Dict[str, Any]]:
             connection.close()
 
 
+VINCULADO_BY_NIT_QUERY = "SELECT TRIM(VINNOMBRE) FROM MANAGER.VINCULADO WHERE VINCEDULA = :nit"
+VINCULADO_BY_NIT_TRIM_QUERY = "SELECT TRIM(VINNOMBRE) FROM MANAGER.VINCULADO WHERE TRIM(VINCEDULA) = TRIM(:nit)"
+
+
 def get_proveedor_by_nit_oracle(nit: str) -> Optional[Dict[str, Any]]:
     """
     Retrieves provider name from MANAGER.VINCULADO table by NIT (VINCEDULA).
+    Looks up with a padded bind first (index), then with TRIM.
     
     Args:
         nit: The provider's NIT number
@@ -154,17 +427,10 @@ def get_proveedor_by_nit_oracle(nit: str) -> Optional[Dict[str, Any]]:
         connection = get_oracle_connection()
         cursor = connection.cursor()
         
-        query = """
-            SELECT 
-                TRIM(VINNOMBRE)
-            FROM 
-                MANAGER.VINCULADO
-            WHERE 
-                TRIM(VINCEDULA) = TRIM(:nit)
-        """
-        
-        cursor.execute(query, {"nit": nit})
-        row = cursor.fetchone()
+        row = _fetch_code_lookup(
+            cursor, VINCULADO_BY_NIT_QUERY, VINCULADO_BY_NIT_TRIM_QUERY, "nit",
+            nit, "MANAGER", "VINCULADO", "VINCEDULA"
+        )
         
         if row:
             return {
@@ -232,3 +498,82 @@ def get_consecutivo_documento(tipo_documento: str, clase_documento: str = "0000"
             cursor.close()
         if connection:
             connection.close()
+
+
+def _fetch_all(query: str, params: Optional[Dict[str, Any]] = None) -> List[tuple]:
+    """Run a query and return all rows (used by the mirror sync)"""
+    connection = None
+    cursor = None
+    try:
+        connection = get_oracle_connection()
+        cursor = connection.cursor()
+        cursor.arraysize = 1000
+        cursor.execute(query, params or {})
+        return cursor.fetchall()
+        
+    except oracledb.Error as e:
+        print(f"Error executing query: {e}")
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+
+def fetch_manager_oficinas() -> List[Dict[str, Any]]:
+    """
+    Retrieves every office (MANAGER.MNGDNO) with trimmed codes for the local mirror.
+    """
+    rows = _fetch_all("""
+        SELECT 
+            TRIM(DNOCODIGO),
+            TRIM(DNONOMBRE),
+            TRIM(DNOCCOSTO)
+        FROM 
+            MANAGER.MNGDNO
+        WHERE 
+            DNOCODIGO IS NOT NULL
+    """)
+    return [
+        {"codigo": row[0], "nombre": row[1], "codigo_ccosto": row[2]}
+        for row in rows
+    ]
+
+
+def fetch_manager_centros_costo() -> List[Dict[str, Any]]:
+    """
+    Retrieves every cost center (MANAGER.MNGCCO) with trimmed codes for the local mirror.
+    """
+    rows = _fetch_all("""
+        SELECT 
+            TRIM(CCOCODIGO),
+            TRIM(CCONOMBRE)
+        FROM 
+            MANAGER.MNGCCO
+        WHERE 
+            CCOCODIGO IS NOT NULL
+    """)
+    return [
+        {"codigo": row[0], "nombre": row[1]}
+        for row in rows
+    ]
+
+
+def fetch_manager_vinculados() -> List[Dict[str, Any]]:
+    """
+    Retrieves NIT and name of every vinculado (MANAGER.VINCULADO) for the local mirror.
+    """
+    rows = _fetch_all("""
+        SELECT 
+            TRIM(VINCEDULA),
+            TRIM(VINNOMBRE)
+        FROM 
+            MANAGER.VINCULADO
+        WHERE 
+            VINCEDULA IS NOT NULL
+    """)
+    return [
+        {"nit": row[0], "nombre": row[1]}
+        for row in rows
+    ]
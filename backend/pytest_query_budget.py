@@ -0,0 +1,112 @@
+"""
+pytest plugin: query budgets per test and per endpoint.
+
+Enable it from a conftest.py:
+    pytest_plugins = ["pytest_query_budget"]
+or on the command line:
+    pytest -p pytest_query_budget
+
+Budget for a whole test (all statements, any thread):
+    @pytest.mark.query_budget(6)
+    def test_create_factura(client): ...
+
+    @pytest.mark.query_budget(max_queries=10, max_duplicates=0)
+
+Budget per endpoint, checked for every request made during any test:
+    pytest -p pytest_query_budget --query-budgets=query_budgets.json
+with query_budgets.json like:
+    {"GET /api/facturas/{factura_id}": 2, "POST /api/facturas/": 6}
+
+The query_record fixture gives the QueryRecord of the running test, for
+ad-hoc assertions (record.count, record.duplicates, record.requests).
+"""
+import json
+from typing import Dict, List
+
+import pytest
+
+import query_inspector
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("query-budget")
+    group.addoption(
+        "--query-budgets",
+        action="store",
+        default=None,
+        help="JSON file mapping 'METHOD /route/{param}' to the max statements per request",
+    )
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "query_budget(max_queries, max_duplicates=None): fail the test if it runs more SQL statements",
+    )
+    # Statement counting is opt-in for the app; always on under this plugin
+    query_inspector.QUERY_INSPECTOR_ENABLED = True
+    path = config.getoption("--query-budgets")
+    config._endpoint_query_budgets = _load_budgets(path) if path else {}
+
+
+def _load_budgets(path: str) -> Dict[str, int]:
+    with open(path, encoding="utf-8") as f:
+        return {key: int(value) for key, value in json.load(f).items()}
+
+
+@pytest.fixture
+def query_record(request):
+    """QueryRecord of the running test (set up by the plugin)"""
+    return request.node._query_record
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    # Only the test body counts, not the fixtures that seed data.
+    # If the test itself fails, its error propagates from the yield.
+    with query_inspector.recording(record=item._query_record) as record:
+        result = yield
+
+    failures = _check_marker(item, record) + _check_endpoints(item.config, record)
+    if failures:
+        pytest.fail("\n".join(failures), pytrace=False)
+    return result
+
+
+def pytest_runtest_setup(item):
+    # Available to the query_record fixture before the call phase starts
+    item._query_record = query_inspector.QueryRecord(item.nodeid)
+
+
+def _check_marker(item, record: query_inspector.QueryRecord) -> List[str]:
+    marker = item.get_closest_marker("query_budget")
+    if marker is None:
+        return []
+    max_queries = marker.kwargs.get("max_queries", marker.args[0] if marker.args else None)
+    max_duplicates = marker.kwargs.get("max_duplicates")
+
+    failures = []
+    if max_queries is not None and record.count > max_queries:
+        failures.append(f"Query budget exceeded: {record.count} statements (max {max_queries})")
+    if max_duplicates is not None and record.duplicates > max_duplicates:
+        failures.append(f"Repeated statements: {record.duplicates} (max {max_duplicates})")
+    if failures:
+        failures.extend(_describe_repeats(record))
+    return failures
+
+
+def _check_endpoints(config, record: query_inspector.QueryRecord) -> List[str]:
+    budgets = config._endpoint_query_budgets
+    failures = []
+    for request_record in record.requests:
+        budget = budgets.get(request_record.label)
+        if budget is not None and request_record.count > budget:
+            failures.append(
+                f"{request_record.label}: {request_record.count} statements (budget {budget})"
+            )
+            failures.extend(_describe_repeats(request_record))
+    return failures
+
+
+def _describe_repeats(record: query_inspector.QueryRecord) -> List[str]:
+    return [f"    x{n}: {shape[:200]}" for shape, n in record.repeated().items()]
@@ -0,0 +1,168 @@
+"""
+Query Inspector Module
+Opt-in statement counting for development and tests (N+1 detection).
+
+When QUERY_INSPECTOR_ENABLED is set, every Postgres statement is counted
+per request and normalized to its shape (bind values and IN lists
+collapsed). Responses get:
+    X-Query-Count:       statements executed
+    X-Query-Time-Ms:     total statement time
+    X-Query-Duplicates:  statements whose shape already ran in this request
+Shapes repeated QUERY_INSPECTOR_WARN_REPEATS times or more are logged with
+the route, which is how reload loops (create -> get -> get) show up.
+
+Tests use the pytest plugin in pytest_query_budget.py, which records
+the same numbers and fails tests that exceed a query budget.
+"""
+import contextvars
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from metrics import route_label
+
+load_dotenv()
+
+QUERY_INSPECTOR_ENABLED = os.getenv("QUERY_INSPECTOR_ENABLED", "false").lower() in ("1", "true", "si", "yes")
+QUERY_INSPECTOR_WARN_REPEATS = int(os.getenv("QUERY_INSPECTOR_WARN_REPEATS", "3"))
+
+# Bind placeholders of the supported drivers: $1 (asyncpg), ? (sqlite), %(name)s
+_BIND = r"(?:\$\d+|\?|%\(\w+\)s)"
+_IN_LIST = re.compile(rf"\(\s*{_BIND}(?:\s*,\s*{_BIND})*\s*\)")
+_BIND_RE = re.compile(_BIND)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_statement(statement: str) -> str:
+    """Statement shape: whitespace, bind names and IN list lengths collapsed"""
+    shape = _WHITESPACE.sub(" ", statement).strip()
+    shape = _IN_LIST.sub("(?)", shape)
+    return _BIND_RE.sub("?", shape)
+
+
+class QueryRecord:
+    """Statements seen during one request (or one recording block)"""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.count = 0
+        self.total_ms = 0.0
+        self.shapes: Counter = Counter()
+        self.requests: List["QueryRecord"] = []
+
+    def add(self, shape: str, elapsed_ms: float):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.shapes[shape] += 1
+
+    @property
+    def duplicates(self) -> int:
+        """Statements whose shape had already run"""
+        return sum(n - 1 for n in self.shapes.values() if n > 1)
+
+    def repeated(self, min_repeats: int = 2) -> Dict[str, int]:
+        return {shape: n for shape, n in self.shapes.most_common() if n >= min_repeats}
+
+    def as_dict(self) -> Dict:
+        return {
+            "label": self.label,
+            "count": self.count,
+            "total_ms": round(self.total_ms, 2),
+            "duplicates": self.duplicates,
+            "repeated": self.repeated(),
+        }
+
+
+_current: contextvars.ContextVar[Optional[QueryRecord]] = contextvars.ContextVar(
+    "query_inspector_record", default=None)
+
+# Process-wide recorders (the pytest plugin). TestClient runs the app in
+# another thread, so these cannot rely on the request contextvar.
+_recorders: List[QueryRecord] = []
+_recorders_lock = threading.Lock()
+
+
+def record_query(statement: str, elapsed_ms: float):
+    """Called from the after_cursor_execute listener in database.py"""
+    if not QUERY_INSPECTOR_ENABLED:
+        return
+    shape = normalize_statement(statement)
+    record = _current.get()
+    if record is not None:
+        record.add(shape, elapsed_ms)
+    if _recorders:
+        with _recorders_lock:
+            for recorder in _recorders:
+                recorder.add(shape, elapsed_ms)
+
+
+@contextmanager
+def recording(label: str = "", record: Optional[QueryRecord] = None):
+    """
+    Record every statement (any thread) and every request inside the block:
+        with query_inspector.recording() as record:
+            client.get("/api/facturas/1")
+        assert record.count <= 3
+    """
+    record = record if record is not None else QueryRecord(label)
+    with _recorders_lock:
+        _recorders.append(record)
+    try:
+        yield record
+    finally:
+        with _recorders_lock:
+            _recorders.remove(record)
+
+
+def _publish_request(request_record: QueryRecord):
+    with _recorders_lock:
+        for recorder in _recorders:
+            recorder.requests.append(request_record)
+
+
+class QueryInspectorMiddleware:
+    """Pure ASGI middleware adding the X-Query-* headers (no-op unless enabled)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not QUERY_INSPECTOR_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        record = QueryRecord(f"{scope['method']} {scope['path']}")
+        token = _current.set(record)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-query-count", str(record.count).encode()))
+                headers.append((b"x-query-time-ms", f"{record.total_ms:.1f}".encode()))
+                headers.append((b"x-query-duplicates", str(record.duplicates).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            if scope.get("route") is not None:
+                # Budgets are per endpoint: label with the route template
+                record.label = f"{scope['method']} {route_label(scope)}"
+            _publish_request(record)
+            _warn_repeats(record, (time.perf_counter() - start) * 1000)
+
+
+def _warn_repeats(record: QueryRecord, elapsed_ms: float):
+    repeated = record.repeated(QUERY_INSPECTOR_WARN_REPEATS)
+    if not repeated:
+        return
+    print(f"[N+1] {record.label}: {record.count} queries, {record.duplicates} repetidas ({elapsed_ms:.0f} ms)")
+    for shape, n in repeated.items():
+        print(f"    x{n}: {shape[:300]}")
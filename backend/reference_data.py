@@ -0,0 +1,138 @@
+"""
+Reference Data Module
+Versioned reference data (proveedores, oficinas, contratos) for local replicas.
+
+Every crud write to these tables records a change in reference_changes in
+the same transaction. The change's version comes from a sequence, so the
+highest version is the current version of the reference data. Each row
+keeps only its latest change and deletes remain as tombstones, so:
+- /referencias/snapshot returns every row plus the version it reflects
+- /referencias/cambios?since=V returns the rows changed after V and the
+  ids deleted after V
+
+Rows are sent compact: one column list per entity and a list of values
+per row.
+
+On Postgres, writers take a transaction-level advisory lock so versions
+commit in order; otherwise a reader could see version N+1 before N
+commits and skip N forever.
+"""
+from typing import Any, Dict, Iterable, List, Optional
+from sqlalchemy import and_, delete, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+import models
+
+# Arbitrary key for the writers' lock (see schema_migrations / manager_sync)
+REFERENCE_LOCK_KEY = 20250103
+
+UPSERT = "UPSERT"
+DELETE = "DELETE"
+
+# Entity -> (model, columns sent to clients)
+ENTITIES: Dict[str, tuple] = {
+    "proveedores": (models.Proveedor, ("id", "nit", "nombre")),
+    "oficinas": (models.Oficina, (
+        "id", "cod_oficina", "nombre", "tipo_sitio", "dude", "direccion", "ciudad", "zona", "codigo_ccosto",
+    )),
+    "contratos": (models.Contrato, (
+        "id", "proveedor_id", "oficina_id", "num_contrato", "estado", "tipo", "fecha_inicio", "fecha_fin",
+        "valor_mensual", "tiene_iva", "tiene_retefuente", "retefuente_pct",
+    )),
+}
+
+
+async def record_changes(db: AsyncSession, entity: str, ids: Iterable[int], operacion: str = UPSERT):
+    """
+    Log a change for the given rows. Call before db.commit() (after a flush
+    for new rows, so they have an id).
+    """
+    ids = [i for i in dict.fromkeys(ids) if i is not None]
+    if not ids:
+        return
+    if db.bind.dialect.name == 'postgresql':
+        await db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": REFERENCE_LOCK_KEY})
+    await db.execute(
+        delete(models.ReferenceChange)
+        .where(models.ReferenceChange.entity == entity, models.ReferenceChange.entity_id.in_(ids))
+    )
+    db.add_all([models.ReferenceChange(entity=entity, entity_id=i, operacion=operacion) for i in ids])
+
+
+async def record_change(db: AsyncSession, entity: str, entity_id: int, operacion: str = UPSERT):
+    await record_changes(db, entity, [entity_id], operacion)
+
+
+async def current_version(db: AsyncSession) -> int:
+    result = await db.execute(select(func.coalesce(func.max(models.ReferenceChange.version), 0)))
+    return int(result.scalar())
+
+
+def parse_entities(entidades: Optional[str]) -> List[str]:
+    """'oficinas,proveedores' -> list; None means every entity. Raises ValueError on unknown names."""
+    if not entidades:
+        return list(ENTITIES)
+    names = [e.strip() for e in entidades.split(",") if e.strip()]
+    unknown = [e for e in names if e not in ENTITIES]
+    if unknown:
+        raise ValueError(f"Entidades no soportadas: {', '.join(unknown)}")
+    return names
+
+
+async def _rows(db: AsyncSession, entity: str, since: Optional[int] = None,
+                version: Optional[int] = None) -> Dict[str, Any]:
+    """Compact rows of an entity; with since/version only the rows upserted in (since, version]"""
+    model, columns = ENTITIES[entity]
+    query = select(*[getattr(model, c) for c in columns]).order_by(model.id)
+    if since is not None:
+        change = models.ReferenceChange
+        query = query.join(
+            change, and_(change.entity == entity, change.entity_id == model.id)
+        ).filter(change.version > since, change.version <= version, change.operacion == UPSERT)
+    result = await db.execute(query)
+    return {"columns": list(columns), "rows": [list(row) for row in result.all()]}
+
+
+async def snapshot(db: AsyncSession, entities: List[str]) -> Dict[str, Any]:
+    """All rows of the entities and the version they reflect"""
+    # Read the version first: rows changed meanwhile come again in the next delta
+    version = await current_version(db)
+    data = {"version": version}
+    for entity in entities:
+        data[entity] = await _rows(db, entity)
+    return data
+
+
+async def changes_since(db: AsyncSession, since: int, entities: List[str]) -> Dict[str, Any]:
+    """
+    Rows upserted and ids deleted after version `since`.
+    reset=True means the client's version is ahead of the server
+    (restored database): it must reload the snapshot.
+    """
+    version = await current_version(db)
+    data: Dict[str, Any] = {"version": version, "since": since, "reset": since > version, "deleted": {}}
+    for entity in entities:
+        data["deleted"][entity] = []
+
+    if since >= version:
+        for entity in entities:
+            data[entity] = {"columns": list(ENTITIES[entity][1]), "rows": []}
+        return data
+
+    for entity in entities:
+        data[entity] = await _rows(db, entity, since, version)
+
+    result = await db.execute(
+        select(models.ReferenceChange.entity, models.ReferenceChange.entity_id)
+        .filter(
+            models.ReferenceChange.version > since,
+            models.ReferenceChange.version <= version,
+            models.ReferenceChange.operacion == DELETE,
+            models.ReferenceChange.entity.in_(entities)
+        )
+        .order_by(models.ReferenceChange.entity_id)
+    )
+    for entity, entity_id in result.all():
+        data["deleted"][entity].append(entity_id)
+    return data
@@ -0,0 +1,166 @@
+"""
+Response Cache Module
+In-process cache for reference-data GET endpoints (dropdowns, report filters).
+
+Rendered JSON bodies are kept per path + query string for a TTL and tagged
+with the tables they were built from. The crud create/update/delete
+functions invalidate the tags they touch. Every cached response carries an
+ETag (hash of the body), so browsers revalidate with If-None-Match
+and get a 304 when nothing changed.
+
+The cache is per process: with several workers, a write invalidates only
+the worker that handled it and the others catch up within the TTL.
+
+Usage in a route:
+    return await response_cache.respond(request, ("proveedores",), build)
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Set
+from dotenv import load_dotenv
+from fastapi import Request
+from fastapi.responses import Response
+from fast_json import FastJSONResponse
+
+load_dotenv()
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() in ("1", "true", "si", "yes")
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "300"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "512"))
+
+
+class CacheEntry:
+    """A rendered response body with its ETag and tags"""
+
+    def __init__(self, body: bytes, media_type: str, tags: Iterable[str], ttl: float):
+        self.body = body
+        self.media_type = media_type
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.tags = set(tags)
+        self.expires_at = time.monotonic() + ttl
+
+    @property
+    def fresh(self) -> bool:
+        return time.monotonic() < self.expires_at
+
+
+def _opaque_tag(etag: str) -> str:
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    True if the If-None-Match header lists the ETag (or is '*').
+    Uses weak comparison: the compression middleware sends W/"..." for
+    compressed bodies, and that must still match the cached entry.
+    """
+    if not if_none_match:
+        return False
+    candidates = [_opaque_tag(value.strip()) for value in if_none_match.split(',')]
+    return '*' in candidates or _opaque_tag(etag) in candidates
+
+
+class ResponseCache:
+    """LRU of rendered responses with TTL and tag-based invalidation"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES, ttl: float = RESPONSE_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.tag_index: Dict[str, Set[str]] = {}
+        self.stats_counters = {"hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0}
+
+    @staticmethod
+    def key_for(request: Request) -> str:
+        """Cache key: path plus the sorted query string"""
+        query = '&'.join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        return f"{request.url.path}?{query}"
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        if not entry.fresh:
+            self._remove(key)
+            return None
+        self.entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, entry: CacheEntry):
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = entry
+        for tag in entry.tags:
+            self.tag_index.setdefault(tag, set()).add(key)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry.tags:
+            keys = self.tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tag_index[tag]
+
+    def invalidate(self, *tags: str):
+        """Drop every entry built from any of the given tags"""
+        for tag in tags:
+            for key in list(self.tag_index.get(tag, ())):
+                self._remove(key)
+        self.stats_counters["invalidations"] += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.tag_index.clear()
+
+    def _render(self, entry: CacheEntry, request: Request) -> Response:
+        headers = {"ETag": entry.etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            self.stats_counters["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+
+    async def respond(self, request: Request, tags: Iterable[str],
+                      build: Callable[[], Awaitable[Any]], ttl: Optional[float] = None) -> Response:
+        """
+        Serve the cached response for this request, or build, render and cache it.
+        build() returns the data the route would normally return (dicts or
+        pydantic models, rendered with orjson).
+        """
+        key = self.key_for(request)
+        entry = self.get(key) if RESPONSE_CACHE_ENABLED else None
+        if entry is not None:
+            self.stats_counters["hits"] += 1
+            return self._render(entry, request)
+
+        self.stats_counters["misses"] += 1
+        data = await build()
+        rendered = FastJSONResponse(content=data)
+        entry = CacheEntry(rendered.body, rendered.media_type, tags, self.ttl if ttl is None else ttl)
+        if RESPONSE_CACHE_ENABLED:
+            self.set(key, entry)
+        return self._render(entry, request)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": RESPONSE_CACHE_ENABLED,
+            "ttl_s": self.ttl,
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "tags": {tag: len(keys) for tag, keys in self.tag_index.items()},
+            **self.stats_counters,
+        }
+
+
+response_cache = ResponseCache()
+
+
+def invalidate(*tags: str):
+    """Invalidate cached responses for the given tags (called after writes)"""
+    response_cache.invalidate(*tags)
@@ -1,23 +1,46 @@
 """
 Archivo Plano Router - Generate flat file Excel for Manager accounting system
 """
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple
 from decimal import Decimal
 from datetime import date, datetime
+import asyncio
 import io
 import os
-import httpx
+import zipfile
 from openpyxl import Workbook, load_workbook
 from openpyxl.styles import Font, Alignment
 
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db
+import excel_render
+import models
+# Cost centers are read from the local Manager mirror (see manager_sync.py)
+from manager_sync import get_centros_costo
+from oracle_database import get_oracle_connection, get_consecutivo_documento, run_oracle, OracleTimeoutError
+
 router = APIRouter()
 
+# The causacion insert is one Oracle transaction over many rows, allow it more
+# time (counted from the moment the insert starts, not while it waits for a worker)
+ORACLE_INSERT_TIMEOUT = float(os.getenv("ORACLE_INSERT_TIMEOUT", "300"))
+# Causacion inserts running at once, kept below ORACLE_MAX_WORKERS so a
+# batch leaves Oracle workers for the lookups of other requests
+CAUSACION_INSERT_CONCURRENCY = int(os.getenv("CAUSACION_INSERT_CONCURRENCY", "2"))
+
 # Path to template file
 TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), '..', 'Template_archivo_plano', 'template_plano.xlsx')
 
+_insert_slots = asyncio.Semaphore(CAUSACION_INSERT_CONCURRENCY)
+
+# Running batch insert phases, referenced here because they can outlive a
+# cancelled request
+_inserts_en_curso = set()
+
 # --- Schemas ---
 
 class OficinaArchivoPlano(BaseModel):
@@ -47,53 +70,6 @@ class ArchivoPlanoRequest(BaseModel):
 
 # --- Helper Functions ---
 
-def extract_codigo_for_oracle(cod_oficina: str) -> str:
-    """
-    Extract digits to search Oracle based on cod_oficina length:
-    - 7 digits -> first 4
-    - 6 digits -> first 3
-    - 5 digits -> first 2
-    - 4 digits -> first 1
-    """
-    cod = cod_oficina.strip()
-    length = len(cod)
-    
-    if length >= 7:
-        return cod[:4]
-    elif length == 6:
-        return cod[:3]
-    elif length == 5:
-        return cod[:2]
-    elif length == 4:
-        return cod[:1]
-    else:
-        return cod
-
-
-async def get_centro_costo(cod_oficina: str) -> str:
-    """
-    Call Oracle API to get centro de costo for an office.
-    Returns the codigo_ccosto or empty string if not found.
-    """
-    codigo_busqueda = extract_codigo_for_oracle(cod_oficina)
-    
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                f"http://localhost:8000/api/oficinas-oracle/{codigo_busqueda}",
-                timeout=10.0
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("success") and data.get("data"):
-                    return data["data"].get("codigo_ccosto", "").strip()
-    except Exception as e:
-        print(f"Error getting centro costo for {cod_oficina}: {e}")
-    
-    return ""
-
-
 def format_date_for_excel(d: date) -> str:
     """Format date as YYYY/MM/DD for Excel (template has text format)"""
     return d.strftime('%Y/%m/%d')
@@ -208,173 +184,164 @@ def create_flat_file_row(
     ]
 
 
-async def generate_rows_for_oficina(
-    oficina: OficinaArchivoPlano,
-    proveedor_nit: str,
-    fecha: str,
-    numedoc: int,
-    tiene_iva: bool,
-    numero_factura: str,  # For building DETALLE
-    fecha_factura: Optional[date],  # For extracting month
-    starting_row_index: int  # Excel row number to start (2, 3, 4...)
-) -> tuple[List[list], int, dict]:
-    """
-    Generate debit rows (70%/30%) for a single office.
-    
-    The 70%/30% is calculated on (valor / 1.19) if tiene_iva.
-    
-    Returns:
-        tuple: (list of rows, next_row_index, office_info for final rows)
-    """
-    rows = []
-    current_row = starting_row_index
-    
-    # Get centro de costo from Oracle
-    ccosto_raw = await get_centro_costo(oficina.cod_oficina)
-    ccosto = format_value(ccosto_raw) if ccosto_raw else ""
-    
-    # Format values
-    vinculado = format_value(proveedor_nit)
-    destino = format_value(oficina.cod_oficina)
-    
-    # Build DETALLE: FACT {num} SERVICIO DE INTERNET {oficina} MES {mes}
+def factura_detalle(numero_factura: Optional[str], oficina: OficinaArchivoPlano, fecha_factura: Optional[date]) -> str:
+    """DETALLE: FACT {num} SERVICIO DE INTERNET {oficina} MES {mes}"""
     nombre_oficina = oficina.nombre_oficina or oficina.cod_oficina
     mes_factura = get_month_name_spanish(fecha_factura) if fecha_factura else ""
-    detalle = f"FACT {numero_factura} SERVICIO DE INTERNET {nombre_oficina} MES {mes_factura}"
-    
-    valor = float(oficina.valor)
-    
-    # Calculate base value (without IVA if applicable)
-    # If tiene_iva: valor includes IVA, so base = valor / 1.19
-    if tiene_iva:
-        valor_base = round(valor / 1.19, 0)
-        valor_iva = round(valor - valor_base, 0)
-    else:
-        valor_base = valor
-        valor_iva = 0
-    
-    # Split base value 70%/30%
-    valor_70 = round(valor_base * 0.70, 0)
-    valor_30 = round(valor_base * 0.30, 0)
-    
-    # Row 1: Account 61350513 - 70% (VALDEBI)
-    rows.append(create_flat_file_row(
-        row_index=current_row,
-        numedoc=numedoc,
-        fecha=fecha,
-        cuenta=format_value("61350513"),
-        vinculado=vinculado,
-        ccosto=ccosto,
-        destino=destino,
-        valdebi=valor_70,
-        detalle=detalle
-    ))
-    current_row += 1
-    
-    # Row 2: Account 61700360 - 30% (VALDEBI)
-    rows.append(create_flat_file_row(
-        row_index=current_row,
-        numedoc=numedoc,
-        fecha=fecha,
-        cuenta=format_value("61700360"),
-        vinculado=vinculado,
-        ccosto=ccosto,
-        destino=destino,
-        valdebi=valor_30,
-        detalle=detalle
-    ))
-    current_row += 1
-    
-    # Return office info for final rows
-    office_info = {
+    return f"FACT {numero_factura or ''} SERVICIO DE INTERNET {nombre_oficina} MES {mes_factura}"
+
+
+def _asiento(cuenta: str, tipo_movimiento: str, valor: float, ccosto: str, destino: str,
+             detalle: str, base: float = 0) -> dict:
+    return {
+        "cuenta": cuenta,
+        "tipo_movimiento": tipo_movimiento,
+        "debito": valor if tipo_movimiento == "DEBITO" else 0,
+        "credito": valor if tipo_movimiento == "CREDITO" else 0,
         "ccosto": ccosto,
         "destino": destino,
-        "vinculado": vinculado,
-        "valor": valor,
-        "valor_base": valor_base,
-        "valor_iva": valor_iva,
-        "valor_70": valor_70,
-        "valor_30": valor_30,
-        "detalle": detalle  # For summary rows
+        "detalle": detalle,
+        # Base of the IVA row (MCNBASE)
+        "base": base,
     }
-    
-    return rows, current_row, office_info
 
 
-def create_final_summary_rows(
-    total_debitos: float,  # Sum of all 70% + 30% across all offices
-    total_iva: float,      # Total IVA across all offices
+def build_causacion_ledger(
+    factura: FacturaArchivoPlano,
     tiene_iva: bool,
-    porcentaje_retefuente: float,  # 0, 4, or 6
-    total_valor_base: float,    # Sum of valor_base (SIN IVA) for retefuente calculation
-    last_office_info: dict,  # ccosto, destino, vinculado from last office
+    porcentaje_retefuente: float,
+    ccostos: Dict[str, str]
+) -> List[dict]:
+    """
+    Ledger entries of one factura, shared by the flat file, the previews
+    and the Manager insert. ccostos maps cod_oficina -> centro de costo.
+
+    Per office, on the base value (valor / 1.19 if tiene_iva):
+    - Account 61350513: 70% of the base (debit)
+    - Account 61700360: 30% of the base (debit)
+    Then, with the last office's ccosto/destino/detalle:
+    - Account 24081003: IVA total (debit) - if tiene_iva
+    - Account 23652501: Retefuente on the base (credit) - if porcentaje_retefuente > 0
+    - Account 23355002: Balance to pay the proveedor (credit)
+    """
+    asientos = []
+    total_debitos = 0
+    total_iva = 0
+    total_valor_base = 0
+
+    for oficina in factura.oficinas:
+        ccosto = ccostos.get(oficina.cod_oficina) or ""
+        destino = oficina.cod_oficina
+        detalle = factura_detalle(factura.numero_factura, oficina, factura.fecha_factura)
+
+        valor = float(oficina.valor)
+
+        # If tiene_iva: valor includes IVA, so base = valor / 1.19
+        if tiene_iva:
+            valor_base = round(valor / 1.19, 0)
+            valor_iva = round(valor - valor_base, 0)
+        else:
+            valor_base = valor
+            valor_iva = 0
+
+        # Split base value 70%/30%
+        valor_70 = round(valor_base * 0.70, 0)
+        valor_30 = round(valor_base * 0.30, 0)
+
+        asientos.append(_asiento("61350513", "DEBITO", valor_70, ccosto, destino, detalle))
+        asientos.append(_asiento("61700360", "DEBITO", valor_30, ccosto, destino, detalle))
+
+        total_debitos += valor_70 + valor_30
+        total_iva += valor_iva
+        total_valor_base += valor_base
+
+    if not asientos:
+        return asientos
+
+    # Summary rows use the last office
+    last = asientos[-1]
+    ccosto, destino, detalle = last["ccosto"], last["destino"], last["detalle"]
+
+    # IVA row uses "." for DESTINO
+    if tiene_iva and total_iva > 0:
+        asientos.append(_asiento("24081003", "DEBITO", total_iva, ccosto, ".", detalle, base=total_valor_base))
+        total_debitos += total_iva
+
+    # Retefuente - SOBRE VALOR BASE SIN IVA
+    valor_retefuente = round(total_valor_base * (porcentaje_retefuente / 100), 0) if porcentaje_retefuente > 0 else 0
+    if valor_retefuente > 0:
+        asientos.append(_asiento("23652501", "CREDITO", valor_retefuente, ccosto, destino, detalle))
+
+    # Balance: debitos (70% + 30% + IVA) - retefuente, so the document balances
+    asientos.append(_asiento("23355002", "CREDITO", total_debitos - valor_retefuente, ccosto, destino, detalle))
+
+    return asientos
+
+
+def causacion_documentos(
+    facturas: List[FacturaArchivoPlano],
     numedoc: int,
-    fecha: str,
-    detalle: str,
-    starting_row_index: int
-) -> tuple[List[list], int]:
+    tiene_iva: bool,
+    porcentaje_retefuente: float,
+    ccostos: Dict[str, str]
+) -> List[Tuple[int, FacturaArchivoPlano, List[dict]]]:
     """
-    Generate final summary rows: IVA, Retefuente (if applicable), and Total.
-    Uses the last office's ccosto and destino.
+    (NUMEDOC, factura, ledger) per factura with offices. NUMEDOC increments
+    per factura: first factura uses numedoc, next numedoc + 1, etc. Facturas
+    without offices are skipped and take no number.
     """
+    documentos = []
+    for factura in facturas:
+        if not factura.oficinas:
+            continue
+        asientos = build_causacion_ledger(factura, tiene_iva, porcentaje_retefuente, ccostos)
+        documentos.append((numedoc + len(documentos), factura, asientos))
+    return documentos
+
+
+def cod_oficinas(facturas: List[FacturaArchivoPlano]) -> List[str]:
+    return [oficina.cod_oficina for factura in facturas for oficina in factura.oficinas]
+
+
+async def centros_costo_causacion(db: AsyncSession, codigos: List[str], requeridos: bool = True) -> Dict[str, str]:
+    """
+    Centros de costo for a causation (see get_centros_costo). 503 if Manager
+    cannot be read; with requeridos, 422 if an office has none, so no ledger
+    row reaches Manager (insert or flat file) with a blank CCOSTO.
+    """
+    try:
+        ccostos = await get_centros_costo(db, codigos)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"No se pudieron leer los centros de costo de Manager: {e}")
+    if requeridos:
+        faltantes = sorted(cod for cod, ccosto in ccostos.items() if not ccosto)
+        if faltantes:
+            raise HTTPException(
+                status_code=422,
+                detail=f"Oficinas sin centro de costo en Manager: {', '.join(faltantes[:20])}"
+                       + (f" y {len(faltantes) - 20} más" if len(faltantes) > 20 else "")
+            )
+    return ccostos
+
+
+def archivo_plano_rows(documentos, proveedor_nit: str, fecha_str: str) -> List[list]:
+    """Flat file rows for causacion_documentos() output (Excel rows start at 2)"""
     rows = []
-    current_row = starting_row_index
-    
-    ccosto = last_office_info["ccosto"]
-    destino = last_office_info["destino"]
-    vinculado = last_office_info["vinculado"]
-    
-    # Calculate retefuente based on percentage (0%, 4%, or 6%) - SOBRE VALOR BASE SIN IVA
-    valor_retefuente = round(total_valor_base * (porcentaje_retefuente / 100), 0) if porcentaje_retefuente > 0 else 0
-    
-    # Calculate balance: total debitos + IVA - retefuente
-    valor_balance = total_debitos + total_iva - valor_retefuente
-    
-    # Row: Account 24081003 - IVA total (VALDEBI) - only if tiene_iva
-    if tiene_iva and total_iva > 0:
-        rows.append(create_flat_file_row(
-            row_index=current_row,
-            numedoc=numedoc,
-            fecha=fecha,
-            cuenta=format_value("24081003"),
-            vinculado=vinculado,
-            ccosto=ccosto,
-            destino=".",  # IVA row uses "." for DESTINO
-            valdebi=total_iva,
-            detalle=detalle
-        ))
-        current_row += 1
-    
-    # Row: Account 23652501 - Retefuente (VALCRED) - only if porcentaje > 0
-    if porcentaje_retefuente > 0:
-        rows.append(create_flat_file_row(
-            row_index=current_row,
-            numedoc=numedoc,
-            fecha=fecha,
-            cuenta=format_value("23652501"),
-            vinculado=vinculado,
-            ccosto=ccosto,
-            destino=destino,
-            valcred=valor_retefuente,
-            detalle=detalle
-        ))
-        current_row += 1
-    
-    # Row: Account 23355002 - Balance total (VALCRED)
-    rows.append(create_flat_file_row(
-        row_index=current_row,
-        numedoc=numedoc,
-        fecha=fecha,
-        cuenta=format_value("23355002"),
-        vinculado=vinculado,
-        ccosto=ccosto,
-        destino=destino,
-        valcred=valor_balance,
-        detalle=detalle
-    ))
-    current_row += 1
-    
-    return rows, current_row
+    for numedoc, _, asientos in documentos:
+        for asiento in asientos:
+            rows.append(create_flat_file_row(
+                row_index=len(rows) + 2,
+                numedoc=numedoc,
+                fecha=fecha_str,
+                cuenta=format_value(asiento["cuenta"]),
+                vinculado=format_value(proveedor_nit),
+                ccosto=format_value(asiento["ccosto"]),
+                destino=format_value(asiento["destino"]),
+                valdebi=asiento["debito"],
+                valcred=asiento["credito"],
+                detalle=asiento["detalle"]
+            ))
+    return rows
 
 
 # --- Constants: Column Headers ---
@@ -391,89 +358,39 @@ HEADERS = [
 ]
 
 
-# --- Endpoint ---
+# --- Generation ---
 
-@router.post("/archivo-plano/generar")
-async def generar_archivo_plano(request: ArchivoPlanoRequest):
+async def build_archivo_plano_rows(request: ArchivoPlanoRequest, db: AsyncSession) -> List[list]:
     """
-    Generate flat file Excel for Manager accounting system.
-    
-    For each office, generates rows for:
-    - Account 61350513: 70% of value (debit)
-    - Account 61700360: 30% of value (debit)
-    - Account 24081003: IVA 19% (debit) - if tiene_iva
-    - Account 23652501: Retefuente (credit) - if porcentaje_retefuente > 0
-    - Account 23355002: Balance total (credit)
+    Flat file rows for the request (centros de costo resolved from the mirror,
+    ledger described in build_causacion_ledger).
     """
     if not request.facturas:
         raise HTTPException(status_code=400, detail="Debe proporcionar al menos una factura")
     
     # Use today's date if not provided
     fecha_causacion = request.fecha_causacion or date.today()
-    fecha_str = format_date_for_excel(fecha_causacion)
-    
-    # Generate all rows
-    all_rows = []
-    current_row_index = 2  # Excel rows start at 2 (row 1 is headers)
-    
-    # Process each factura separately with incrementing NUMEDOC
-    for factura_index, factura in enumerate(request.facturas):
-        if not factura.oficinas:
-            continue
-        
-        # NUMEDOC increments per factura: first factura uses base, next uses base+1, etc.
-        factura_numedoc = request.numedoc + factura_index
-        
-        # Accumulators for this factura
-        factura_debitos = 0  # Sum of 70% + 30%
-        factura_iva = 0
-        factura_valor_base = 0  # Sum of valor_base (sin IVA) para calcular retefuente
-        last_office_info = None
-        last_detalle = ""  # Store the last detalle for summary rows
-        
-        # Generate rows for each office in this factura
-        for oficina in factura.oficinas:
-            rows, current_row_index, office_info = await generate_rows_for_oficina(
-                oficina=oficina,
-                proveedor_nit=request.proveedor_nit,
-                fecha=fecha_str,
-                numedoc=factura_numedoc,
-                tiene_iva=request.tiene_iva,
-                numero_factura=factura.numero_factura or '',
-                fecha_factura=factura.fecha_factura,
-                starting_row_index=current_row_index
-            )
-            all_rows.extend(rows)
-            
-            # Accumulate totals for this factura
-            factura_debitos += office_info["valor_70"] + office_info["valor_30"]
-            factura_iva += office_info["valor_iva"]
-            factura_valor_base += office_info["valor_base"]  # Usar valor_base para retefuente
-            last_office_info = office_info
-            last_detalle = office_info.get("detalle", "")
-        
-        # Generate IVA and Total rows for THIS factura
-        if last_office_info:
-            summary_rows, current_row_index = create_final_summary_rows(
-                total_debitos=factura_debitos,
-                total_iva=factura_iva,
-                tiene_iva=request.tiene_iva,
-                porcentaje_retefuente=request.porcentaje_retefuente,
-                total_valor_base=factura_valor_base,  # Pasar valor_base para retefuente
-                last_office_info=last_office_info,
-                numedoc=factura_numedoc,
-                fecha=fecha_str,
-                detalle=last_detalle,
-                starting_row_index=current_row_index
-            )
-            all_rows.extend(summary_rows)
     
+    ccostos = await centros_costo_causacion(db, cod_oficinas(request.facturas))
+    documentos = causacion_documentos(
+        request.facturas, request.numedoc, request.tiene_iva, request.porcentaje_retefuente, ccostos
+    )
+    return archivo_plano_rows(documentos, request.proveedor_nit, format_date_for_excel(fecha_causacion))
+
+
+def archivo_plano_filename(request: ArchivoPlanoRequest) -> str:
+    fecha_causacion = request.fecha_causacion or date.today()
+    return f"archivo_plano_{request.proveedor_nit}_{fecha_causacion.strftime('%Y%m%d')}.xlsx"
+
+
+def render_archivo_plano(all_rows: List[list], destination):
+    """
+    Write the rows into the template and save it to destination (runs in the
+    excel_render pool). Raises FileNotFoundError if the template is missing.
+    """
     # Load Excel template (preserves all cell formats)
-    try:
-        wb = load_workbook(TEMPLATE_PATH)
-        ws = wb.active
-    except FileNotFoundError:
-        raise HTTPException(status_code=500, detail="Template file not found")
+    wb = load_workbook(TEMPLATE_PATH)
+    ws = wb.active
     
     # Write data rows (row 1 is headers in template, data starts at row 2)
     for row_idx, row_data in enumerate(all_rows, 2):
@@ -487,85 +404,41 @@ async def generar_archivo_plano(request: ArchivoPlanoRequest):
         for col_idx in range(1, 44):  # 43 columns
             ws.cell(row=row_idx, column=col_idx).value = None
     
-    # Save to buffer
-    buffer = io.BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
+    wb.save(destination)
+
+
+# --- Endpoint ---
+
+@router.post("/archivo-plano/generar")
+async def generar_archivo_plano(request: ArchivoPlanoRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Generate flat file Excel for Manager accounting system (rows described in
+    build_archivo_plano_rows).
+    For large batches use POST /exportaciones/archivo-plano (background job).
+    """
+    all_rows = await build_archivo_plano_rows(request, db)
     
-    # Generate filename
-    filename = f"archivo_plano_{request.proveedor_nit}_{fecha_causacion.strftime('%Y%m%d')}.xlsx"
+    # Render in the excel_render pool (off the event loop)
+    try:
+        path = await excel_render.render_to_file("archivo_plano", render_archivo_plano, all_rows)
+    except FileNotFoundError:
+        raise HTTPException(status_code=500, detail="Template file not found")
+    except excel_render.ExcelRenderBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
     
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    return excel_render.file_response(
+        path,
+        headers={"Content-Disposition": f"attachment; filename={archivo_plano_filename(request)}"}
     )
 
 
 @router.post("/archivo-plano/preview")
-async def preview_archivo_plano(request: ArchivoPlanoRequest):
+async def preview_archivo_plano(request: ArchivoPlanoRequest, db: AsyncSession = Depends(get_db)):
     """
     Preview the flat file data without generating Excel.
     Returns JSON with all rows that would be generated.
     """
-    if not request.facturas:
-        raise HTTPException(status_code=400, detail="Debe proporcionar al menos una factura")
-    
-    fecha_causacion = request.fecha_causacion or date.today()
-    fecha_str = format_date_for_excel(fecha_causacion)
-    
-    all_rows = []
-    current_row_index = 2  # Excel rows start at 2 (row 1 is headers)
-    
-    # Process each factura separately with incrementing NUMEDOC
-    for factura_index, factura in enumerate(request.facturas):
-        if not factura.oficinas:
-            continue
-        
-        # NUMEDOC increments per factura
-        factura_numedoc = request.numedoc + factura_index
-        
-        # Accumulators for this factura
-        factura_debitos = 0
-        factura_iva = 0
-        factura_valor = 0
-        last_office_info = None
-        last_detalle = ""
-        
-        for oficina in factura.oficinas:
-            rows, current_row_index, office_info = await generate_rows_for_oficina(
-                oficina=oficina,
-                proveedor_nit=request.proveedor_nit,
-                fecha=fecha_str,
-                numedoc=factura_numedoc,
-                tiene_iva=request.tiene_iva,
-                numero_factura=factura.numero_factura or '',
-                fecha_factura=factura.fecha_factura,
-                starting_row_index=current_row_index
-            )
-            all_rows.extend(rows)
-            
-            factura_debitos += office_info["valor_70"] + office_info["valor_30"]
-            factura_iva += office_info["valor_iva"]
-            factura_valor += office_info["valor"]
-            last_office_info = office_info
-            last_detalle = office_info.get("detalle", "")
-        
-        # Generate IVA and Total rows for THIS factura
-        if last_office_info:
-            summary_rows, current_row_index = create_final_summary_rows(
-                total_debitos=factura_debitos,
-                total_iva=factura_iva,
-                tiene_iva=request.tiene_iva,
-                porcentaje_retefuente=request.porcentaje_retefuente,
-                total_valor=factura_valor,
-                last_office_info=last_office_info,
-                numedoc=factura_numedoc,
-                fecha=fecha_str,
-                detalle=last_detalle,
-                starting_row_index=current_row_index
-            )
-            all_rows.extend(summary_rows)
+    all_rows = await build_archivo_plano_rows(request, db)
     
     # Convert rows to dict for better readability
     rows_as_dicts = []
@@ -632,7 +505,7 @@ class CausacionManagerPreviewResponse(BaseModel):
 
 
 @router.post("/causacion-manager/preview", response_model=CausacionManagerPreviewResponse)
-async def preview_causacion_manager(request: CausacionManagerPreviewRequest):
+async def preview_causacion_manager(request: CausacionManagerPreviewRequest, db: AsyncSession = Depends(get_db)):
     """
     Preview the causation data that would be sent to Manager.
     Returns a structured response for displaying in a table format.
@@ -645,124 +518,31 @@ async def preview_causacion_manager(request: CausacionManagerPreviewRequest):
     fecha_causacion = request.fecha_causacion or date.today()
     fecha_str = format_date_for_excel(fecha_causacion)
     
+    # Blank centros de costo are shown; the insert refuses them
+    ccostos = await centros_costo_causacion(db, cod_oficinas(request.facturas), requeridos=False)
+    documentos = causacion_documentos(
+        request.facturas, request.numedoc, request.tiene_iva, request.porcentaje_retefuente, ccostos
+    )
+    
     facturas_preview: List[CausacionFacturaPreview] = []
     total_debitos_global = 0
     total_creditos_global = 0
     
-    for factura_index, factura in enumerate(request.facturas):
-        if not factura.oficinas:
-            continue
-        
-        factura_numedoc = request.numedoc + factura_index
-        rows_preview: List[CausacionRowPreview] = []
-        factura_debitos = 0
-        factura_creditos = 0
-        factura_iva = 0
-        factura_valor_base = 0  # Sum of valor_base (sin IVA) para calcular retefuente
-        row_counter = 1
-        
-        # Process each oficina
-        for oficina in factura.oficinas:
-            ccosto_raw = await get_centro_costo(oficina.cod_oficina)
-            ccosto = ccosto_raw if ccosto_raw else ""
-            destino = oficina.cod_oficina
-            nombre_oficina = oficina.nombre_oficina or oficina.cod_oficina
-            mes_factura = get_month_name_spanish(factura.fecha_factura) if factura.fecha_factura else ""
-            detalle = f"FACT {factura.numero_factura or ''} SERVICIO DE INTERNET {nombre_oficina} MES {mes_factura}"
-            
-            valor = float(oficina.valor)
-            
-            # Calculate base value
-            if request.tiene_iva:
-                valor_base = round(valor / 1.19, 0)
-                valor_iva = round(valor - valor_base, 0)
-            else:
-                valor_base = valor
-                valor_iva = 0
-            
-            valor_70 = round(valor_base * 0.70, 0)
-            valor_30 = round(valor_base * 0.30, 0)
-            
-            # Row 1: Account 61350513 - 70% DEBITO
-            rows_preview.append(CausacionRowPreview(
-                row_num=row_counter,
-                cuenta="61350513",
-                tipo_movimiento="DEBITO",
-                ccosto=ccosto,
-                destino=destino,
-                valor=valor_70,
-                detalle=detalle
-            ))
-            row_counter += 1
-            factura_debitos += valor_70
-            
-            # Row 2: Account 61700360 - 30% DEBITO
-            rows_preview.append(CausacionRowPreview(
-                row_num=row_counter,
-                cuenta="61700360",
-                tipo_movimiento="DEBITO",
-                ccosto=ccosto,
-                destino=destino,
-                valor=valor_30,
-                detalle=detalle
-            ))
-            row_counter += 1
-            factura_debitos += valor_30
-            
-            factura_iva += valor_iva
-            factura_valor_base += valor_base  # Acumular valor_base para retefuente
-        
-        # Get last office info for summary rows
-        if factura.oficinas:
-            last_oficina = factura.oficinas[-1]
-            last_ccosto_raw = await get_centro_costo(last_oficina.cod_oficina)
-            last_ccosto = last_ccosto_raw if last_ccosto_raw else ""
-            last_destino = last_oficina.cod_oficina
-            last_nombre = last_oficina.nombre_oficina or last_oficina.cod_oficina
-            last_mes = get_month_name_spanish(factura.fecha_factura) if factura.fecha_factura else ""
-            last_detalle = f"FACT {factura.numero_factura or ''} SERVICIO DE INTERNET {last_nombre} MES {last_mes}"
-        
-        # IVA row (DEBITO)
-        if request.tiene_iva and factura_iva > 0:
-            rows_preview.append(CausacionRowPreview(
-                row_num=row_counter,
-                cuenta="24081003",
-                tipo_movimiento="DEBITO",
-                ccosto=last_ccosto,
-                destino=".",
-                valor=factura_iva,
-                detalle=last_detalle
-            ))
-            row_counter += 1
-            factura_debitos += factura_iva
-        
-        # Retefuente row (CREDITO) - SOBRE VALOR BASE SIN IVA
-        valor_retefuente = round(factura_valor_base * (request.porcentaje_retefuente / 100), 0) if request.porcentaje_retefuente > 0 else 0
-        if valor_retefuente > 0:
-            rows_preview.append(CausacionRowPreview(
-                row_num=row_counter,
-                cuenta="23652501",
-                tipo_movimiento="CREDITO",
-                ccosto=last_ccosto,
-                destino=last_destino,
-                valor=valor_retefuente,
-                detalle=last_detalle
-            ))
-            row_counter += 1
-            factura_creditos += valor_retefuente
-        
-        # Balance row (CREDITO) - Total to pay supplier
-        valor_balance = factura_debitos - factura_creditos
-        rows_preview.append(CausacionRowPreview(
-            row_num=row_counter,
-            cuenta="23355002",
-            tipo_movimiento="CREDITO",
-            ccosto=last_ccosto,
-            destino=last_destino,
-            valor=valor_balance,
-            detalle=last_detalle
-        ))
-        factura_creditos += valor_balance
+    for factura_index, (factura_numedoc, factura, asientos) in enumerate(documentos):
+        rows_preview = [
+            CausacionRowPreview(
+                row_num=row_num,
+                cuenta=asiento["cuenta"],
+                tipo_movimiento=asiento["tipo_movimiento"],
+                ccosto=asiento["ccosto"],
+                destino=asiento["destino"],
+                valor=asiento["debito"] or asiento["credito"],
+                detalle=asiento["detalle"]
+            )
+            for row_num, asiento in enumerate(asientos, start=1)
+        ]
+        factura_debitos = sum(asiento["debito"] for asiento in asientos)
+        factura_creditos = sum(asiento["credito"] for asiento in asientos)
         
         facturas_preview.append(CausacionFacturaPreview(
             numero_factura=factura.numero_factura or f"Factura {factura_index + 1}",
@@ -775,7 +555,7 @@ async def preview_causacion_manager(request: CausacionManagerPreviewRequest):
         total_debitos_global += factura_debitos
         total_creditos_global += factura_creditos
     
-    numedoc_final = request.numedoc + len([f for f in request.facturas if f.oficinas]) - 1
+    numedoc_final = request.numedoc + len(documentos) - 1
     
     return CausacionManagerPreviewResponse(
         success=True,
@@ -818,314 +598,162 @@ class CausacionInsertResponse(BaseModel):
     error: Optional[str] = None
 
 
+MNGDOC_INSERT = """
+    INSERT INTO MANAGER.MNGDOC (
+        DOCEMPRESA, DOCCLASE, DOCVINKEY, DOCTIPO, DOCNUMERO,
+        DOCSUCURS, DOCFECHA, DOCVINCULA, DOCSUCVIN, DOCCCOSTO,
+        DOCDESTINO, DOCLOTE, DOCVENDE, DOCZONA, DOCCOBRA,
+        DOCRESPALD, DOCPOSTFEC, DOCNEWUSER, DOCNEWFEC, DOCMODUSER,
+        DOCMODFEC, DOCPLAZOD, DOCESTADO, DOCRESPAL2, DOCNIMPRE,
+        DOCCODEU_1, DOCCODEU_2, DOCFORPAGO, DOCTARIFA, DOCBOD1E,
+        DOCBOD2S, DOCINTERES, DOCFECHA2, DOCPRODUCT, DOCCANTI,
+        DOCUNIMED, DOCRESPAL3, DOCNOTA2, DOCDETALLE
+    ) VALUES (
+        '101', '0000', '.', 'DC07', :numedoc,
+        '.', TO_DATE(:fecha, 'YYYY-MM-DD'), :nit, '.', :ccosto,
+        :destino, '.', '.', '.', '.',
+        :numedoc, TO_DATE(:fecha, 'YYYY-MM-DD'), 'WEBAPP', SYSDATE, 'WEBAPP',
+        SYSDATE, 0, 'a', 0, 0,
+        '.', '.', '.', 1, '.',
+        '.', 0, TO_DATE(:fecha, 'YYYY-MM-DD'), '.', 0,
+        '.', ' ', NULL, :detalle
+    )
+"""
+
+# One statement for every ledger row: the IVA row carries MCNTASA 19 and
+# MCNBASE, the balance row MCNSALDOCR
+MNGMCN_INSERT = """
+    INSERT INTO MANAGER.MNGMCN (
+        MCNEMPRESA, MCNCLASE, MCNVINKEY, MCNTIPODOC, MCNNUMEDOC, MCNREG, MCNFECHA,
+        MCNCLACRU1, MCNTIPCRU1, MCNNUMCRU1, MCNCUOCRU1, MCNSUCURS, MCNCUENTA, MCNVINCULA,
+        MCNSUCVIN, MCNCCOSTO, MCNDESTINO, MCNVENDE, MCNCOBRA, MCNZONA, MCNFECINI, MCNPLAZO,
+        MCNVALDEBI, MCNVALCRED, MCNTASA, MCNBASE, MCNCLACRU2, MCNTIPCRU2, MCNNUMCRU2, MCNCUOCRU2,
+        MCNSALDODB, MCNSALDOCR, MCNNEWUSER, MCNNEWFEC, MCNMODUSER, MCNMODFEC, MCNBODEGA,
+        MCNPROPADR, MCNPRODUCT, MCNCANTI_O, MCNUNI_O, MCNPARCI_O, MCNCANTID, MCNUNIDAD,
+        MCNPRECIOB, MCNFACTOR, MCNDCTO1, MCNDCTO2, MCNDCTO3, MCNDCTO4, MCNIMPOCON, MCNPRCOSVT,
+        MCNIVATIPO, MCNIVAPORC, MNCNIVAINC, MCNCOSTORE, MCNDIMEORI, MCNINDINV, MCNLOTEPRO,
+        MCNPRECIOX, MCNREF1, MCNREF2, MCNESTADO, MCNDETALLE, MCNFTE, MCNTPREG
+    ) VALUES (
+        '101', '0000', '.', 'DC07', :numedoc, :reg, TO_DATE(:fecha, 'YYYY-MM-DD'),
+        '0000', 'DC07', :numedoc, 0, '.', :cuenta, :nit,
+        '.', :ccosto, :destino, '.', '.', '.', TO_DATE(:fecha, 'YYYY-MM-DD'), 0,
+        :valdebi, :valcred, :tasa, :base, ' ', ' ', 0, 0,
+        0, :saldocr, 'WEBAPP', SYSDATE, 'WEBAPP', SYSDATE, '.',
+        '.', '.', 0, '.', 0, 0, '.',
+        0, 1, 0, 0, 0, 0, 0, 0,
+        '.', 0, 0, 0, 0, '.', '.',
+        0, '.', '.', 'a', :detalle, '.', 1
+    )
+"""
+
+
+def causacion_oracle_params(documentos, proveedor_nit: str, fecha_str: str) -> Tuple[List[dict], List[dict]]:
+    """
+    Bind rows for MNGDOC (one per factura) and MNGMCN (one per ledger entry).
+    Centros de costo must be resolved (see centros_costo_causacion).
+    """
+    mngdoc = []
+    mngmcn = []
+    for numedoc, factura, asientos in documentos:
+        # Header uses the first office
+        first_oficina = factura.oficinas[0]
+        mngdoc.append({
+            'numedoc': numedoc,
+            'fecha': fecha_str,
+            'nit': proveedor_nit,
+            'ccosto': asientos[0]["ccosto"],
+            'destino': first_oficina.cod_oficina,
+            'detalle': factura_detalle(factura.numero_factura, first_oficina, factura.fecha_factura)[:2000]
+        })
+        for reg, asiento in enumerate(asientos, start=1):
+            mngmcn.append({
+                'numedoc': numedoc,
+                'reg': reg,
+                'fecha': fecha_str,
+                'cuenta': asiento["cuenta"],
+                'nit': proveedor_nit,
+                'ccosto': asiento["ccosto"],
+                'destino': asiento["destino"],
+                'valdebi': asiento["debito"],
+                'valcred': asiento["credito"],
+                'tasa': 19 if asiento["cuenta"] == "24081003" else 0,
+                'base': asiento["base"],
+                'saldocr': asiento["credito"] if asiento["cuenta"] == "23355002" else 0,
+                'detalle': asiento["detalle"][:4000]
+            })
+    return mngdoc, mngmcn
+
+
+def _insertar_causacion_oracle(mngdoc: List[dict], mngmcn: List[dict]) -> Tuple[int, int]:
+    """
+    Insert the MNGDOC/MNGMCN rows of one proveedor in one Oracle transaction
+    (array DML: one round trip per table). Blocking: runs in the Oracle
+    thread pool (see run_oracle).
+
+    Returns:
+        tuple: (registros MNGDOC, registros MNGMCN)
+    """
+    connection = None
+    cursor = None
+
+    try:
+        connection = get_oracle_connection()
+        cursor = connection.cursor()
+        cursor.executemany(MNGDOC_INSERT, mngdoc)
+        cursor.executemany(MNGMCN_INSERT, mngmcn)
+
+        # Commit all changes
+        connection.commit()
+        return len(mngdoc), len(mngmcn)
+
+    except Exception:
+        # Rollback on error
+        if connection:
+            connection.rollback()
+        raise
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+
+async def insertar_causacion(mngdoc: List[dict], mngmcn: List[dict]) -> Tuple[int, int]:
+    """Run _insertar_causacion_oracle, at most CAUSACION_INSERT_CONCURRENCY at a time"""
+    async with _insert_slots:
+        return await run_oracle(
+            _insertar_causacion_oracle, mngdoc, mngmcn, timeout=ORACLE_INSERT_TIMEOUT, timeout_from_start=True
+        )
+
+
 @router.post("/causacion-manager/insertar", response_model=CausacionInsertResponse)
-async def insertar_causacion_manager(request: CausacionInsertRequest):
+async def insertar_causacion_manager(request: CausacionInsertRequest, db: AsyncSession = Depends(get_db)):
     """
     Insert causation data into Manager ERP.
-    
+
     This endpoint inserts:
     1. One record per factura into MNGDOC (header)
-    2. Multiple records per factura into MNGMCN (details)
-    
+    2. Multiple records per factura into MNGMCN (details, see build_causacion_ledger)
+
     The insert is done in a transaction - if any insert fails, all are rolled back.
     """
-    import sys
-    sys.path.append('..')
-    from oracle_database import get_oracle_connection
-    
     if not request.facturas:
         raise HTTPException(status_code=400, detail="Debe proporcionar al menos una factura")
-    
+
     fecha_causacion = request.fecha_causacion or date.today()
-    fecha_str = fecha_causacion.strftime('%Y-%m-%d')
-    
-    connection = None
-    cursor = None
-    total_mngdoc = 0
-    total_mngmcn = 0
-    
+
+    # Cost centers come from the mirror, before the Oracle work starts
+    ccostos = await centros_costo_causacion(db, cod_oficinas(request.facturas))
+    documentos = causacion_documentos(
+        request.facturas, request.numedoc, request.tiene_iva, request.porcentaje_retefuente, ccostos
+    )
+    mngdoc, mngmcn = causacion_oracle_params(documentos, request.proveedor_nit, fecha_causacion.strftime('%Y-%m-%d'))
+
     try:
-        connection = get_oracle_connection()
-        cursor = connection.cursor()
-        
-        for factura_index, factura in enumerate(request.facturas):
-            if not factura.oficinas:
-                continue
-            
-            factura_numedoc = request.numedoc + factura_index
-            
-            # Get first office info for the header
-            first_oficina = factura.oficinas[0]
-            ccosto_raw = await get_centro_costo(first_oficina.cod_oficina)
-            ccosto = ccosto_raw if ccosto_raw else "."
-            destino = first_oficina.cod_oficina
-            
-            # Build detalle for header
-            nombre_oficina = first_oficina.nombre_oficina or first_oficina.cod_oficina
-            mes_factura = get_month_name_spanish(factura.fecha_factura) if factura.fecha_factura else ""
-            detalle = f"FACT {factura.numero_factura or ''} SERVICIO DE INTERNET {nombre_oficina} MES {mes_factura}"
-            
-            # === INSERT INTO MNGDOC (Header) ===
-            cursor.execute("""
-                INSERT INTO MANAGER.MNGDOC (
-                    DOCEMPRESA, DOCCLASE, DOCVINKEY, DOCTIPO, DOCNUMERO,
-                    DOCSUCURS, DOCFECHA, DOCVINCULA, DOCSUCVIN, DOCCCOSTO,
-                    DOCDESTINO, DOCLOTE, DOCVENDE, DOCZONA, DOCCOBRA,
-                    DOCRESPALD, DOCPOSTFEC, DOCNEWUSER, DOCNEWFEC, DOCMODUSER,
-                    DOCMODFEC, DOCPLAZOD, DOCESTADO, DOCRESPAL2, DOCNIMPRE,
-                    DOCCODEU_1, DOCCODEU_2, DOCFORPAGO, DOCTARIFA, DOCBOD1E,
-                    DOCBOD2S, DOCINTERES, DOCFECHA2, DOCPRODUCT, DOCCANTI,
-                    DOCUNIMED, DOCRESPAL3, DOCNOTA2, DOCDETALLE
-                ) VALUES (
-                    '101', '0000', '.', 'DC07', :numedoc,
-                    '.', TO_DATE(:fecha, 'YYYY-MM-DD'), :nit, '.', :ccosto,
-                    :destino, '.', '.', '.', '.',
-                    :numedoc, TO_DATE(:fecha, 'YYYY-MM-DD'), 'WEBAPP', SYSDATE, 'WEBAPP',
-                    SYSDATE, 0, 'a', 0, 0,
-                    '.', '.', '.', 1, '.',
-                    '.', 0, TO_DATE(:fecha, 'YYYY-MM-DD'), '.', 0,
-                    '.', ' ', NULL, :detalle
-                )
-            """, {
-                'numedoc': factura_numedoc,
-                'fecha': fecha_str,
-                'nit': request.proveedor_nit,
-                'ccosto': ccosto,
-                'destino': destino,
-                'detalle': detalle[:2000]  # Max 2000 chars
-            })
-            total_mngdoc += 1
-            
-            # === Process each oficina for MNGMCN (Details) ===
-            reg_counter = 0
-            factura_valor_base = 0
-            factura_iva = 0
-            
-            for oficina in factura.oficinas:
-                ccosto_raw = await get_centro_costo(oficina.cod_oficina)
-                ccosto = ccosto_raw if ccosto_raw else "."
-                destino = oficina.cod_oficina
-                nombre_oficina = oficina.nombre_oficina or oficina.cod_oficina
-                mes_factura = get_month_name_spanish(factura.fecha_factura) if factura.fecha_factura else ""
-                detalle = f"FACT {factura.numero_factura or ''} SERVICIO DE INTERNET {nombre_oficina} MES {mes_factura}"
-                
-                valor = float(oficina.valor)
-                
-                # Calculate base value
-                if request.tiene_iva:
-                    valor_base = round(valor / 1.19, 0)
-                    valor_iva = round(valor - valor_base, 0)
-                else:
-                    valor_base = valor
-                    valor_iva = 0
-                
-                valor_70 = round(valor_base * 0.70, 0)
-                valor_30 = round(valor_base * 0.30, 0)
-                
-                factura_valor_base += valor_base
-                factura_iva += valor_iva
-                
-                # Row 1: Account 61350513 - 70% DEBITO
-                reg_counter += 1
-                cursor.execute("""
-                    INSERT INTO MANAGER.MNGMCN (
-                        MCNEMPRESA, MCNCLASE, MCNVINKEY, MCNTIPODOC, MCNNUMEDOC, MCNREG, MCNFECHA,
-                        MCNCLACRU1, MCNTIPCRU1, MCNNUMCRU1, MCNCUOCRU1, MCNSUCURS, MCNCUENTA, MCNVINCULA,
-                        MCNSUCVIN, MCNCCOSTO, MCNDESTINO, MCNVENDE, MCNCOBRA, MCNZONA, MCNFECINI, MCNPLAZO,
-                        MCNVALDEBI, MCNVALCRED, MCNTASA, MCNBASE, MCNCLACRU2, MCNTIPCRU2, MCNNUMCRU2, MCNCUOCRU2,
-                        MCNSALDODB, MCNSALDOCR, MCNNEWUSER, MCNNEWFEC, MCNMODUSER, MCNMODFEC, MCNBODEGA,
-                        MCNPROPADR, MCNPRODUCT, MCNCANTI_O, MCNUNI_O, MCNPARCI_O, MCNCANTID, MCNUNIDAD,
-                        MCNPRECIOB, MCNFACTOR, MCNDCTO1, MCNDCTO2, MCNDCTO3, MCNDCTO4, MCNIMPOCON, MCNPRCOSVT,
-                        MCNIVATIPO, MCNIVAPORC, MNCNIVAINC, MCNCOSTORE, MCNDIMEORI, MCNINDINV, MCNLOTEPRO,
-                        MCNPRECIOX, MCNREF1, MCNREF2, MCNESTADO, MCNDETALLE, MCNFTE, MCNTPREG
-                    ) VALUES (
-                        '101', '0000', '.', 'DC07', :numedoc, :reg, TO_DATE(:fecha, 'YYYY-MM-DD'),
-                        '0000', 'DC07', :numedoc, 0, '.', '61350513', :nit,
-                        '.', :ccosto, :destino, '.', '.', '.', TO_DATE(:fecha, 'YYYY-MM-DD'), 0,
-                        :valdebi, 0, 0, 0, ' ', ' ', 0, 0,
-                        0, 0, 'WEBAPP', SYSDATE, 'WEBAPP', SYSDATE, '.',
-                        '.', '.', 0, '.', 0, 0, '.',
-                        0, 1, 0, 0, 0, 0, 0, 0,
-                        '.', 0, 0, 0, 0, '.', '.',
-                        0, '.', '.', 'a', :detalle, '.', 1
-                    )
-                """, {
-                    'numedoc': factura_numedoc,
-                    'reg': reg_counter,
-                    'fecha': fecha_str,
-                    'nit': request.proveedor_nit,
-                    'ccosto': ccosto,
-                    'destino': destino,
-                    'valdebi': valor_70,
-                    'detalle': detalle[:4000]
-                })
-                total_mngmcn += 1
-                
-                # Row 2: Account 61700360 - 30% DEBITO
-                reg_counter += 1
-                cursor.execute("""
-                    INSERT INTO MANAGER.MNGMCN (
-                        MCNEMPRESA, MCNCLASE, MCNVINKEY, MCNTIPODOC, MCNNUMEDOC, MCNREG, MCNFECHA,
-                        MCNCLACRU1, MCNTIPCRU1, MCNNUMCRU1, MCNCUOCRU1, MCNSUCURS, MCNCUENTA, MCNVINCULA,
-                        MCNSUCVIN, MCNCCOSTO, MCNDESTINO, MCNVENDE, MCNCOBRA, MCNZONA, MCNFECINI, MCNPLAZO,
-                        MCNVALDEBI, MCNVALCRED, MCNTASA, MCNBASE, MCNCLACRU2, MCNTIPCRU2, MCNNUMCRU2, MCNCUOCRU2,
-                        MCNSALDODB, MCNSALDOCR, MCNNEWUSER, MCNNEWFEC, MCNMODUSER, MCNMODFEC, MCNBODEGA,
-                        MCNPROPADR, MCNPRODUCT, MCNCANTI_O, MCNUNI_O, MCNPARCI_O, MCNCANTID, MCNUNIDAD,
-                        MCNPRECIOB, MCNFACTOR, MCNDCTO1, MCNDCTO2, MCNDCTO3, MCNDCTO4, MCNIMPOCON, MCNPRCOSVT,
-                        MCNIVATIPO, MCNIVAPORC, MNCNIVAINC, MCNCOSTORE, MCNDIMEORI, MCNINDINV, MCNLOTEPRO,
-                        MCNPRECIOX, MCNREF1, MCNREF2, MCNESTADO, MCNDETALLE, MCNFTE, MCNTPREG
-                    ) VALUES (
-                        '101', '0000', '.', 'DC07', :numedoc, :reg, TO_DATE(:fecha, 'YYYY-MM-DD'),
-                        '0000', 'DC07', :numedoc, 0, '.', '61700360', :nit,
-                        '.', :ccosto, :destino, '.', '.', '.', TO_DATE(:fecha, 'YYYY-MM-DD'), 0,
-                        :valdebi, 0, 0, 0, ' ', ' ', 0, 0,
-                        0, 0, 'WEBAPP', SYSDATE, 'WEBAPP', SYSDATE, '.',
-                        '.', '.', 0, '.', 0, 0, '.',
-                        0, 1, 0, 0, 0, 0, 0, 0,
-                        '.', 0, 0, 0, 0, '.', '.',
-                        0, '.', '.', 'a', :detalle, '.', 1
-                    )
-                """, {
-                    'numedoc': factura_numedoc,
-                    'reg': reg_counter,
-                    'fecha': fecha_str,
-                    'nit': request.proveedor_nit,
-                    'ccosto': ccosto,
-                    'destino': destino,
-                    'valdebi': valor_30,
-                    'detalle': detalle[:4000]
-                })
-                total_mngmcn += 1
-            
-            # Get last office info for summary rows
-            last_oficina = factura.oficinas[-1]
-            last_ccosto_raw = await get_centro_costo(last_oficina.cod_oficina)
-            last_ccosto = last_ccosto_raw if last_ccosto_raw else "."
-            last_destino = last_oficina.cod_oficina
-            last_nombre = last_oficina.nombre_oficina or last_oficina.cod_oficina
-            last_mes = get_month_name_spanish(factura.fecha_factura) if factura.fecha_factura else ""
-            last_detalle = f"FACT {factura.numero_factura or ''} SERVICIO DE INTERNET {last_nombre} MES {last_mes}"
-            
-            # Row: IVA (DEBITO) - Account 24081003
-            if request.tiene_iva and factura_iva > 0:
-                reg_counter += 1
-                cursor.execute("""
-                    INSERT INTO MANAGER.MNGMCN (
-                        MCNEMPRESA, MCNCLASE, MCNVINKEY, MCNTIPODOC, MCNNUMEDOC, MCNREG, MCNFECHA,
-                        MCNCLACRU1, MCNTIPCRU1, MCNNUMCRU1, MCNCUOCRU1, MCNSUCURS, MCNCUENTA, MCNVINCULA,
-                        MCNSUCVIN, MCNCCOSTO, MCNDESTINO, MCNVENDE, MCNCOBRA, MCNZONA, MCNFECINI, MCNPLAZO,
-                        MCNVALDEBI, MCNVALCRED, MCNTASA, MCNBASE, MCNCLACRU2, MCNTIPCRU2, MCNNUMCRU2, MCNCUOCRU2,
-                        MCNSALDODB, MCNSALDOCR, MCNNEWUSER, MCNNEWFEC, MCNMODUSER, MCNMODFEC, MCNBODEGA,
-                        MCNPROPADR, MCNPRODUCT, MCNCANTI_O, MCNUNI_O, MCNPARCI_O, MCNCANTID, MCNUNIDAD,
-                        MCNPRECIOB, MCNFACTOR, MCNDCTO1, MCNDCTO2, MCNDCTO3, MCNDCTO4, MCNIMPOCON, MCNPRCOSVT,
-                        MCNIVATIPO, MCNIVAPORC, MNCNIVAINC, MCNCOSTORE, MCNDIMEORI, MCNINDINV, MCNLOTEPRO,
-                        MCNPRECIOX, MCNREF1, MCNREF2, MCNESTADO, MCNDETALLE, MCNFTE, MCNTPREG
-                    ) VALUES (
-                        '101', '0000', '.', 'DC07', :numedoc, :reg, TO_DATE(:fecha, 'YYYY-MM-DD'),
-                        '0000', 'DC07', :numedoc, 0, '.', '24081003', :nit,
-                        '.', :ccosto, '.', '.', '.', '.', TO_DATE(:fecha, 'YYYY-MM-DD'), 0,
-                        :valdebi, 0, 19, :base, ' ', ' ', 0, 0,
-                        0, 0, 'WEBAPP', SYSDATE, 'WEBAPP', SYSDATE, '.',
-                        '.', '.', 0, '.', 0, 0, '.',
-                        0, 1, 0, 0, 0, 0, 0, 0,
-                        '.', 0, 0, 0, 0, '.', '.',
-                        0, '.', '.', 'a', :detalle, '.', 1
-                    )
-                """, {
-                    'numedoc': factura_numedoc,
-                    'reg': reg_counter,
-                    'fecha': fecha_str,
-                    'nit': request.proveedor_nit,
-                    'ccosto': last_ccosto,
-                    'valdebi': factura_iva,
-                    'base': factura_valor_base,
-                    'detalle': last_detalle[:4000]
-                })
-                total_mngmcn += 1
-            
-            # Row: Retefuente (CREDITO) - Account 23652501
-            valor_retefuente = round(factura_valor_base * (request.porcentaje_retefuente / 100), 0) if request.porcentaje_retefuente > 0 else 0
-            if valor_retefuente > 0:
-                reg_counter += 1
-                cursor.execute("""
-                    INSERT INTO MANAGER.MNGMCN (
-                        MCNEMPRESA, MCNCLASE, MCNVINKEY, MCNTIPODOC, MCNNUMEDOC, MCNREG, MCNFECHA,
-                        MCNCLACRU1, MCNTIPCRU1, MCNNUMCRU1, MCNCUOCRU1, MCNSUCURS, MCNCUENTA, MCNVINCULA,
-                        MCNSUCVIN, MCNCCOSTO, MCNDESTINO, MCNVENDE, MCNCOBRA, MCNZONA, MCNFECINI, MCNPLAZO,
-                        MCNVALDEBI, MCNVALCRED, MCNTASA, MCNBASE, MCNCLACRU2, MCNTIPCRU2, MCNNUMCRU2, MCNCUOCRU2,
-                        MCNSALDODB, MCNSALDOCR, MCNNEWUSER, MCNNEWFEC, MCNMODUSER, MCNMODFEC, MCNBODEGA,
-                        MCNPROPADR, MCNPRODUCT, MCNCANTI_O, MCNUNI_O, MCNPARCI_O, MCNCANTID, MCNUNIDAD,
-                        MCNPRECIOB, MCNFACTOR, MCNDCTO1, MCNDCTO2, MCNDCTO3, MCNDCTO4, MCNIMPOCON, MCNPRCOSVT,
-                        MCNIVATIPO, MCNIVAPORC, MNCNIVAINC, MCNCOSTORE, MCNDIMEORI, MCNINDINV, MCNLOTEPRO,
-                        MCNPRECIOX, MCNREF1, MCNREF2, MCNESTADO, MCNDETALLE, MCNFTE, MCNTPREG
-                    ) VALUES (
-                        '101', '0000', '.', 'DC07', :numedoc, :reg, TO_DATE(:fecha, 'YYYY-MM-DD'),
-                        '0000', 'DC07', :numedoc, 0, '.', '23652501', :nit,
-                        '.', :ccosto, :destino, '.', '.', '.', TO_DATE(:fecha, 'YYYY-MM-DD'), 0,
-                        0, :valcred, 0, 0, ' ', ' ', 0, 0,
-                        0, 0, 'WEBAPP', SYSDATE, 'WEBAPP', SYSDATE, '.',
-                        '.', '.', 0, '.', 0, 0, '.',
-                        0, 1, 0, 0, 0, 0, 0, 0,
-                        '.', 0, 0, 0, 0, '.', '.',
-                        0, '.', '.', 'a', :detalle, '.', 1
-                    )
-                """, {
-                    'numedoc': factura_numedoc,
-                    'reg': reg_counter,
-                    'fecha': fecha_str,
-                    'nit': request.proveedor_nit,
-                    'ccosto': last_ccosto,
-                    'destino': last_destino,
-                    'valcred': valor_retefuente,
-                    'detalle': last_detalle[:4000]
-                })
-                total_mngmcn += 1
-            
-            # Row: Balance (CREDITO) - Account 23355002
-            total_debitos = factura_valor_base + factura_iva
-            valor_balance = total_debitos - valor_retefuente
-            
-            reg_counter += 1
-            cursor.execute("""
-                INSERT INTO MANAGER.MNGMCN (
-                    MCNEMPRESA, MCNCLASE, MCNVINKEY, MCNTIPODOC, MCNNUMEDOC, MCNREG, MCNFECHA,
-                    MCNCLACRU1, MCNTIPCRU1, MCNNUMCRU1, MCNCUOCRU1, MCNSUCURS, MCNCUENTA, MCNVINCULA,
-                    MCNSUCVIN, MCNCCOSTO, MCNDESTINO, MCNVENDE, MCNCOBRA, MCNZONA, MCNFECINI, MCNPLAZO,
-                    MCNVALDEBI, MCNVALCRED, MCNTASA, MCNBASE, MCNCLACRU2, MCNTIPCRU2, MCNNUMCRU2, MCNCUOCRU2,
-                    MCNSALDODB, MCNSALDOCR, MCNNEWUSER, MCNNEWFEC, MCNMODUSER, MCNMODFEC, MCNBODEGA,
-                    MCNPROPADR, MCNPRODUCT, MCNCANTI_O, MCNUNI_O, MCNPARCI_O, MCNCANTID, MCNUNIDAD,
-                    MCNPRECIOB, MCNFACTOR, MCNDCTO1, MCNDCTO2, MCNDCTO3, MCNDCTO4, MCNIMPOCON, MCNPRCOSVT,
-                    MCNIVATIPO, MCNIVAPORC, MNCNIVAINC, MCNCOSTORE, MCNDIMEORI, MCNINDINV, MCNLOTEPRO,
-                    MCNPRECIOX, MCNREF1, MCNREF2, MCNESTADO, MCNDETALLE, MCNFTE, MCNTPREG
-                ) VALUES (
-                    '101', '0000', '.', 'DC07', :numedoc, :reg, TO_DATE(:fecha, 'YYYY-MM-DD'),
-                    '0000', 'DC07', :numedoc, 0, '.', '23355002', :nit,
-                    '.', :ccosto, :destino, '.', '.', '.', TO_DATE(:fecha, 'YYYY-MM-DD'), 0,
-                    0, :valcred, 0, 0, ' ', ' ', 0, 0,
-                    0, :saldocr, 'WEBAPP', SYSDATE, 'WEBAPP', SYSDATE, '.',
-                    '.', '.', 0, '.', 0, 0, '.',
-                    0, 1, 0, 0, 0, 0, 0, 0,
-                    '.', 0, 0, 0, 0, '.', '.',
-                    0, '.', '.', 'a', :detalle, '.', 1
-                )
-            """, {
-                'numedoc': factura_numedoc,
-                'reg': reg_counter,
-                'fecha': fecha_str,
-                'nit': request.proveedor_nit,
-                'ccosto': last_ccosto,
-                'destino': last_destino,
-                'valcred': valor_balance,
-                'saldocr': valor_balance,
-                'detalle': last_detalle[:4000]
-            })
-            total_mngmcn += 1
-        
-        # Commit all changes
-        connection.commit()
-        
-        numedoc_final = request.numedoc + len(request.facturas) - 1
-        
+        total_mngdoc, total_mngmcn = await insertar_causacion(mngdoc, mngmcn)
+
+        numedoc_final = request.numedoc + len(documentos) - 1
+
         return CausacionInsertResponse(
             success=True,
             message=f"Causación insertada exitosamente. NUMEDOC: {request.numedoc} - {numedoc_final}",
@@ -1134,11 +762,8 @@ async def insertar_causacion_manager(request: CausacionInsertRequest):
             total_registros_mngdoc=total_mngdoc,
             total_registros_mngmcn=total_mngmcn
         )
-        
+
     except Exception as e:
-        # Rollback on error
-        if connection:
-            connection.rollback()
         return CausacionInsertResponse(
             success=False,
             message="Error al insertar causación",
@@ -1148,25 +773,499 @@ async def insertar_causacion_manager(request: CausacionInsertRequest):
             total_registros_mngmcn=0,
             error=str(e)
         )
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 
-# --- Diagnostic Endpoint: Inspect MNGMCN table structure ---
+# --- Batch causation (many proveedores) ---
 
-@router.get("/mngmcn/estructura")
-async def get_mngmcn_estructura():
+class CausacionLoteProveedor(BaseModel):
+    """Facturas of one proveedor in a batch causation"""
+    proveedor_nit: str
+    proveedor_nombre: Optional[str] = None
+    tiene_iva: bool = True
+    porcentaje_retefuente: float = 0
+    facturas: List[FacturaArchivoPlano]
+
+
+class CausacionLoteRequest(BaseModel):
     """
-    Diagnostic endpoint to get the structure of MANAGER.MNGMCN table.
-    Returns column names, data types, and sample data.
+    Causation of many proveedores at once: the given proveedores or, when
+    empty, the stored facturas in factura_ids or with fecha_factura in
+    [fecha_desde, fecha_hasta] (offices, values and contract tax settings
+    read from Postgres).
+    """
+    proveedores: List[CausacionLoteProveedor] = []
+    factura_ids: List[int] = []
+    fecha_desde: Optional[date] = None
+    fecha_hasta: Optional[date] = None
+    estado: Optional[str] = None
+    fecha_causacion: Optional[date] = None
+    # Required with insertar. Without insertar it defaults to the next DC07
+    # consecutivo in Manager (a preview: the number is not reserved)
+    numedoc_inicial: Optional[int] = None
+    insertar: bool = True  # False: only compute the result (and the ZIP)
+    incluir_archivos: bool = False  # Answer with a ZIP: one flat file per proveedor + resumen.json (only with insertar=False)
+
+
+class CausacionLoteProveedorResultado(BaseModel):
+    proveedor_nit: str
+    proveedor_nombre: Optional[str]
+    numedoc_inicial: int
+    numedoc_final: int
+    total_facturas: int
+    total_debitos: float
+    total_creditos: float
+    insertado: bool
+    total_registros_mngdoc: int
+    total_registros_mngmcn: int
+    error: Optional[str] = None
+
+
+class CausacionLoteResponse(BaseModel):
+    success: bool
+    message: str
+    fecha_causacion: str
+    numedoc_inicial: int
+    numedoc_final: int
+    total_proveedores: int
+    proveedores_ok: int
+    proveedores_error: int
+    total_facturas: int
+    total_registros_mngdoc: int
+    total_registros_mngmcn: int
+    total_debitos: float
+    total_creditos: float
+    proveedores: List[CausacionLoteProveedorResultado]
+
+
+def _contrato_impuestos(tiene_iva: Optional[str], tiene_retefuente: Optional[str], retefuente_pct) -> Tuple[bool, float]:
+    """(tiene_iva, porcentaje_retefuente) from the contract's "si"/"no" flags"""
+    porcentaje = float(retefuente_pct) if tiene_retefuente == "si" and retefuente_pct else 0
+    return tiene_iva == "si", porcentaje
+
+
+async def load_causacion_proveedores(
+    db: AsyncSession,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    estado: Optional[str] = None,
+    factura_ids: Optional[List[int]] = None,
+    tiene_iva: Optional[bool] = None,
+    porcentaje_retefuente: Optional[float] = None
+) -> Tuple[List[CausacionLoteProveedor], List[str]]:
+    """
+    Facturas (by id or by fecha_factura period) grouped by proveedor, in one
+    joined query over the office assignments, contracts and offices. Only
+    assignments with cod_oficina and valor are used.
+
+    Tax settings come from the contracts of the proveedor's assignments, or
+    from tiene_iva / porcentaje_retefuente when given. Returns the
+    proveedores and the proveedores whose setting cannot be decided (their
+    contracts disagree or an assignment has no contract); callers refuse
+    the causation when that list is not empty.
+    """
+    query = (
+        select(
+            models.Factura.id,
+            models.Factura.numero_factura,
+            models.Factura.fecha_factura,
+            models.Proveedor.id,
+            models.Proveedor.nit,
+            models.Proveedor.nombre,
+            models.Oficina.cod_oficina,
+            models.Oficina.nombre,
+            models.FacturaOficina.valor,
+            models.Contrato.id,
+            models.Contrato.tiene_iva,
+            models.Contrato.tiene_retefuente,
+            models.Contrato.retefuente_pct
+        )
+        .select_from(models.FacturaOficina)
+        .join(models.Factura, models.FacturaOficina.factura_id == models.Factura.id)
+        .join(models.Proveedor, models.Factura.proveedor_id == models.Proveedor.id)
+        .join(models.Oficina, models.FacturaOficina.oficina_id == models.Oficina.id)
+        .outerjoin(models.Contrato, models.FacturaOficina.contrato_id == models.Contrato.id)
+    )
+    if factura_ids:
+        query = query.where(models.Factura.id.in_(factura_ids))
+    if fecha_desde:
+        query = query.where(models.Factura.fecha_factura >= fecha_desde)
+    if fecha_hasta:
+        query = query.where(models.Factura.fecha_factura <= fecha_hasta)
+    if estado:
+        query = query.where(models.Factura.estado == estado)
+    query = query.order_by(models.Proveedor.nombre, models.Proveedor.id, models.Factura.id, models.FacturaOficina.id)
+
+    proveedores: Dict[int, CausacionLoteProveedor] = {}
+    facturas: Dict[int, FacturaArchivoPlano] = {}
+    # proveedor_id -> {(tiene_iva, porcentaje_retefuente)} of its contracts / assignments without contract
+    impuestos: Dict[int, set] = {}
+    sin_contrato: Dict[int, int] = {}
+    for (factura_id, numero_factura, fecha_factura, proveedor_id, nit, nombre_proveedor, cod_oficina,
+         nombre_oficina, valor, contrato_id, contrato_iva, contrato_retefuente, retefuente_pct) in await db.execute(query):
+        if not cod_oficina or not valor:
+            continue
+        proveedor = proveedores.get(proveedor_id)
+        if proveedor is None:
+            proveedor = proveedores[proveedor_id] = CausacionLoteProveedor(
+                proveedor_nit=nit, proveedor_nombre=nombre_proveedor, facturas=[]
+            )
+            impuestos[proveedor_id] = set()
+        if contrato_id is None:
+            sin_contrato[proveedor_id] = sin_contrato.get(proveedor_id, 0) + 1
+        else:
+            impuestos[proveedor_id].add(_contrato_impuestos(contrato_iva, contrato_retefuente, retefuente_pct))
+        factura = facturas.get(factura_id)
+        if factura is None:
+            factura = facturas[factura_id] = FacturaArchivoPlano(
+                numero_factura=numero_factura, fecha_factura=fecha_factura, oficinas=[]
+            )
+            proveedor.facturas.append(factura)
+        factura.oficinas.append(OficinaArchivoPlano(
+            cod_oficina=cod_oficina, valor=valor, nombre_oficina=nombre_oficina or cod_oficina
+        ))
+
+    problemas = []
+    for proveedor_id, proveedor in proveedores.items():
+        nombre = proveedor.proveedor_nombre or proveedor.proveedor_nit
+        ivas = {iva for iva, _ in impuestos[proveedor_id]}
+        porcentajes = {pct for _, pct in impuestos[proveedor_id]}
+        sin = sin_contrato.get(proveedor_id, 0)
+        motivos = []
+        if sin and (tiene_iva is None or porcentaje_retefuente is None):
+            motivos.append(f"{sin} oficina(s) sin contrato")
+        if tiene_iva is not None:
+            proveedor.tiene_iva = tiene_iva
+        elif len(ivas) > 1:
+            motivos.append("contratos con y sin IVA")
+        elif ivas:
+            proveedor.tiene_iva = ivas.pop()
+        if porcentaje_retefuente is not None:
+            proveedor.porcentaje_retefuente = porcentaje_retefuente
+        elif len(porcentajes) > 1:
+            motivos.append("contratos con distinta retefuente (" + ", ".join(f"{p:g}%" for p in sorted(porcentajes)) + ")")
+        elif porcentajes:
+            proveedor.porcentaje_retefuente = porcentajes.pop()
+        if motivos:
+            problemas.append(f"{nombre}: {', '.join(motivos)}")
+    return list(proveedores.values()), problemas
+
+
+def _siguiente_numedoc() -> int:
+    """Next DC07 NUMEDOC in Manager (blocking, Oracle thread pool)"""
+    consecutivo = get_consecutivo_documento("DC07")
+    return (consecutivo["consecutivo_actual"] if consecutivo else 0) + 1
+
+
+async def siguiente_numedoc_manager() -> int:
+    """Next DC07 NUMEDOC in Manager (502 if Manager cannot be read)"""
+    try:
+        return await run_oracle(_siguiente_numedoc)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"No se pudo leer el consecutivo DC07 de Manager: {e}")
+
+
+def causacion_lotes(
+    proveedores: List[CausacionLoteProveedor],
+    numedoc_inicial: int,
+    ccostos: Dict[str, str]
+) -> List[Tuple[CausacionLoteProveedor, int, list]]:
+    """
+    (proveedor, first NUMEDOC, causacion_documentos) per proveedor with
+    documents. Blocks are contiguous and in the order of proveedores;
+    proveedores without documents take no numbers.
+    """
+    lotes = []
+    siguiente = numedoc_inicial
+    for proveedor in proveedores:
+        documentos = causacion_documentos(
+            proveedor.facturas, siguiente, proveedor.tiene_iva, proveedor.porcentaje_retefuente, ccostos
+        )
+        if documentos:
+            lotes.append((proveedor, siguiente, documentos))
+            siguiente += len(documentos)
+    return lotes
+
+
+async def _insertar_lotes(lotes, resultados: List[CausacionLoteProveedorResultado], fecha_oracle: str):
+    """Insert every proveedor of a batch (one transaction each) and fill in its resultado"""
+    inserts = [
+        insertar_causacion(*causacion_oracle_params(documentos, proveedor.proveedor_nit, fecha_oracle))
+        for proveedor, _, documentos in lotes
+    ]
+    for resultado, outcome in zip(resultados, await asyncio.gather(*inserts, return_exceptions=True)):
+        if isinstance(outcome, BaseException):
+            resultado.error = str(outcome)
+        else:
+            resultado.insertado = True
+            resultado.total_registros_mngdoc, resultado.total_registros_mngmcn = outcome
+
+
+def _log_lote_sin_respuesta(resultados: List[CausacionLoteProveedorResultado]):
+    """The client left before the batch finished: the NUMEDOC report goes to the log"""
+    for r in resultados:
+        estado = "insertado" if r.insertado else f"error: {r.error}"
+        print(f"Warning: causación lote sin respuesta al cliente - {r.proveedor_nit} "
+              f"NUMEDOC {r.numedoc_inicial}-{r.numedoc_final} {estado}")
+
+
+def render_causacion_zip(archivos: List[Tuple[str, List[list]]], resumen: str, destination):
+    """
+    ZIP with one flat file per proveedor plus resumen.json (runs in the
+    excel_render pool). Raises FileNotFoundError if the template is missing.
     """
-    import sys
-    sys.path.append('..')
-    from oracle_database import get_oracle_connection
+    with zipfile.ZipFile(destination, "w", zipfile.ZIP_DEFLATED) as zf:
+        for filename, rows in archivos:
+            buffer = io.BytesIO()
+            render_archivo_plano(rows, buffer)
+            zf.writestr(filename, buffer.getvalue())
+        zf.writestr("resumen.json", resumen)
+
+
+@router.post("/causacion-manager/lote", response_model=CausacionLoteResponse)
+async def causacion_manager_lote(request: CausacionLoteRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Month-end causation for many proveedores in one call.
+
+    - Centros de costo of every office are resolved in one query
+    - Each proveedor gets a contiguous NUMEDOC block, in order, starting at
+      numedoc_inicial. Inserts need it explicitly: reading the DC07
+      consecutivo reserves nothing, two batches started together would get
+      the same numbers. Run with insertar=False first to get the proposal.
+    - Each proveedor is inserted in its own Oracle transaction (array DML),
+      CAUSACION_INSERT_CONCURRENCY at a time. A failed proveedor is rolled
+      back alone and reported, its NUMEDOC block stays unused. Once started
+      the inserts run to the end even if the client disconnects.
+
+    With incluir_archivos the answer is a ZIP with the flat file of each
+    proveedor and resumen.json (the JSON response). It is refused together
+    with insertar: the ZIP render can still fail (busy pool, missing
+    template) after Manager committed, losing the NUMEDOC report. Download
+    the files first with insertar=False and then insert with the same
+    numedoc_inicial.
+    """
+    if request.insertar and request.incluir_archivos:
+        raise HTTPException(
+            status_code=400,
+            detail="incluir_archivos solo se permite con insertar=false: descargue los archivos primero "
+                   "y luego inserte con el mismo numedoc_inicial"
+        )
+    if request.insertar and request.numedoc_inicial is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Para insertar indique numedoc_inicial: calcule la causación con insertar=false "
+                   "y confirme el NUMEDOC propuesto"
+        )
+
+    proveedores = [p for p in request.proveedores if p.facturas]
+    if not request.proveedores:
+        if not (request.factura_ids or request.fecha_desde or request.fecha_hasta):
+            raise HTTPException(
+                status_code=400,
+                detail="Debe proporcionar proveedores, factura_ids o un periodo (fecha_desde/fecha_hasta)"
+            )
+        proveedores, problemas = await load_causacion_proveedores(
+            db, request.fecha_desde, request.fecha_hasta, request.estado, request.factura_ids
+        )
+        if problemas:
+            raise HTTPException(
+                status_code=422,
+                detail="No se pueden determinar los impuestos desde los contratos: " + "; ".join(problemas)
+                       + ". Corrija los contratos o envíe esos proveedores en 'proveedores' con sus impuestos"
+            )
+    if not proveedores:
+        raise HTTPException(status_code=404, detail="No hay facturas con oficinas asignadas para causar")
+
+    fecha_causacion = request.fecha_causacion or date.today()
+
+    # Every ledger needs only the cost centers: resolve them all at once
+    ccostos = await centros_costo_causacion(db, [cod for p in proveedores for cod in cod_oficinas(p.facturas)])
+
+    if request.numedoc_inicial is not None:
+        numedoc_inicial = request.numedoc_inicial
+    else:
+        numedoc_inicial = await siguiente_numedoc_manager()
+
+    # NUMEDOC blocks and ledgers per proveedor
+    lotes = causacion_lotes(proveedores, numedoc_inicial, ccostos)
+
+    resultados = [
+        CausacionLoteProveedorResultado(
+            proveedor_nit=proveedor.proveedor_nit,
+            proveedor_nombre=proveedor.proveedor_nombre,
+            numedoc_inicial=bloque,
+            numedoc_final=bloque + len(documentos) - 1,
+            total_facturas=len(documentos),
+            total_debitos=sum(a["debito"] for _, _, asientos in documentos for a in asientos),
+            total_creditos=sum(a["credito"] for _, _, asientos in documentos for a in asientos),
+            insertado=False,
+            total_registros_mngdoc=0,
+            total_registros_mngmcn=0
+        )
+        for proveedor, bloque, documentos in lotes
+    ]
+
+    if request.insertar:
+        # Shielded: a client that disconnects must not cancel inserts half way,
+        # the task runs to the end and the report is logged instead
+        task = asyncio.ensure_future(_insertar_lotes(lotes, resultados, fecha_causacion.strftime('%Y-%m-%d')))
+        _inserts_en_curso.add(task)
+        task.add_done_callback(_inserts_en_curso.discard)
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            task.add_done_callback(lambda _: _log_lote_sin_respuesta(resultados))
+            raise
+
+    errores = sum(1 for r in resultados if r.error)
+    numedoc_final = numedoc_inicial + sum(len(documentos) for _, _, documentos in lotes) - 1
+    if not request.insertar:
+        message = f"Causación calculada (sin insertar). NUMEDOC: {numedoc_inicial} - {numedoc_final}"
+    elif errores:
+        message = f"Causación insertada con errores en {errores} de {len(resultados)} proveedores"
+    else:
+        message = f"Causación insertada exitosamente. NUMEDOC: {numedoc_inicial} - {numedoc_final}"
+
+    response = CausacionLoteResponse(
+        success=errores == 0,
+        message=message,
+        fecha_causacion=format_date_for_excel(fecha_causacion),
+        numedoc_inicial=numedoc_inicial,
+        numedoc_final=numedoc_final,
+        total_proveedores=len(resultados),
+        proveedores_ok=len(resultados) - errores,
+        proveedores_error=errores,
+        total_facturas=sum(r.total_facturas for r in resultados),
+        total_registros_mngdoc=sum(r.total_registros_mngdoc for r in resultados),
+        total_registros_mngmcn=sum(r.total_registros_mngmcn for r in resultados),
+        total_debitos=sum(r.total_debitos for r in resultados),
+        total_creditos=sum(r.total_creditos for r in resultados),
+        proveedores=resultados
+    )
+
+    if not request.incluir_archivos:
+        return response
+
+    fecha_str = format_date_for_excel(fecha_causacion)
+    archivos = [
+        (
+            f"archivo_plano_{proveedor.proveedor_nit}_{fecha_causacion.strftime('%Y%m%d')}.xlsx",
+            archivo_plano_rows(documentos, proveedor.proveedor_nit, fecha_str)
+        )
+        for proveedor, _, documentos in lotes
+    ]
+    try:
+        path = await excel_render.render_to_file(
+            "causacion_lote", render_causacion_zip, archivos, response.model_dump_json(indent=2), suffix=".zip"
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=500, detail="Template file not found")
+    except excel_render.ExcelRenderBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+
+    return excel_render.file_response(
+        path,
+        headers={"Content-Disposition": f"attachment; filename=causacion_{fecha_causacion.strftime('%Y%m%d')}.zip"},
+        media_type="application/zip"
+    )
+
+
+# --- Causation from stored facturas ---
+
+class CausacionFacturasRequest(BaseModel):
+    """
+    Causation of stored facturas by id: offices, values and tax settings
+    (from the linked contracts) are read from Postgres.
+    """
+    factura_ids: List[int]
+    fecha_causacion: Optional[date] = None
+    numedoc: Optional[int] = None  # Required to insert; the preview defaults it to the next DC07 consecutivo
+    # Override the contract tax settings (None: use the contracts, 422 if they
+    # disagree or an office has no contract)
+    tiene_iva: Optional[bool] = None
+    porcentaje_retefuente: Optional[float] = None
+
+
+async def _causacion_facturas(request: CausacionFacturasRequest, db: AsyncSession) -> Tuple[CausacionLoteProveedor, int]:
+    """The single proveedor of the selected facturas and the NUMEDOC to start at (raises 400/404/422/502)"""
+    if not request.factura_ids:
+        raise HTTPException(status_code=400, detail="Debe proporcionar al menos una factura")
+    
+    proveedores, problemas = await load_causacion_proveedores(
+        db, factura_ids=request.factura_ids,
+        tiene_iva=request.tiene_iva, porcentaje_retefuente=request.porcentaje_retefuente
+    )
+    if not proveedores:
+        raise HTTPException(status_code=404, detail="Las facturas seleccionadas no tienen oficinas asignadas con código y valor")
+    if len(proveedores) > 1:
+        raise HTTPException(
+            status_code=400,
+            detail="Todas las facturas seleccionadas deben ser del mismo proveedor (para varios use /causacion-manager/lote)"
+        )
+    if problemas:
+        raise HTTPException(
+            status_code=422,
+            detail="No se pueden determinar los impuestos desde los contratos: " + "; ".join(problemas)
+                   + ". Indique tiene_iva y porcentaje_retefuente"
+        )
+    
+    proveedor = proveedores[0]
     
+    numedoc = request.numedoc if request.numedoc is not None else await siguiente_numedoc_manager()
+    return proveedor, numedoc
+
+
+@router.post("/causacion-manager/facturas/preview", response_model=CausacionManagerPreviewResponse)
+async def preview_causacion_facturas(request: CausacionFacturasRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Same as /causacion-manager/preview, built from factura_ids only.
+    Does NOT insert anything into Manager.
+    """
+    proveedor, numedoc = await _causacion_facturas(request, db)
+    return await preview_causacion_manager(
+        CausacionManagerPreviewRequest(
+            proveedor_nit=proveedor.proveedor_nit,
+            proveedor_nombre=proveedor.proveedor_nombre,
+            fecha_causacion=request.fecha_causacion,
+            tiene_iva=proveedor.tiene_iva,
+            porcentaje_retefuente=proveedor.porcentaje_retefuente,
+            facturas=proveedor.facturas,
+            numedoc=numedoc
+        ),
+        db
+    )
+
+
+@router.post("/causacion-manager/facturas/insertar", response_model=CausacionInsertResponse)
+async def insertar_causacion_facturas(request: CausacionFacturasRequest, db: AsyncSession = Depends(get_db)):
+    """
+    Same as /causacion-manager/insertar, built from factura_ids only.
+    numedoc is required (the one returned by the preview, so both match):
+    the DC07 consecutivo is not reserved when it is read.
+    """
+    if request.numedoc is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Para insertar indique numedoc: use el NUMEDOC propuesto por la vista previa"
+        )
+    proveedor, numedoc = await _causacion_facturas(request, db)
+    return await insertar_causacion_manager(
+        CausacionInsertRequest(
+            proveedor_nit=proveedor.proveedor_nit,
+            proveedor_nombre=proveedor.proveedor_nombre,
+            fecha_causacion=request.fecha_causacion,
+            tiene_iva=proveedor.tiene_iva,
+            porcentaje_retefuente=proveedor.porcentaje_retefuente,
+            facturas=proveedor.facturas,
+            numedoc=numedoc
+        ),
+        db
+    )
+
+
+# --- Diagnostic Endpoint: Inspect MNGMCN table structure ---
+
+def _get_mngmcn_estructura():
+    """Blocking part of /mngmcn/estructura (runs in the Oracle thread pool)"""
     connection = None
     cursor = None
     try:
@@ -1252,16 +1351,23 @@ async def get_mngmcn_estructura():
             connection.close()
 
 
-@router.get("/mngdoc/estructura")
-async def get_mngdoc_estructura():
+@router.get("/mngmcn/estructura")
+async def get_mngmcn_estructura():
     """
-    Diagnostic endpoint to get the structure of MANAGER.MNGDOC table
-    and its relationship with MNGMCN.
+    Diagnostic endpoint to get the structure of MANAGER.MNGMCN table.
+    Returns column names, data types, and sample data.
     """
-    import sys
-    sys.path.append('..')
-    from oracle_database import get_oracle_connection
-    
+    try:
+        return await run_oracle(_get_mngmcn_estructura)
+    except OracleTimeoutError as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
+
+
+def _get_mngdoc_estructura():
+    """Blocking part of /mngdoc/estructura (runs in the Oracle thread pool)"""
     connection = None
     cursor = None
     try:
@@ -1374,3 +1480,17 @@ async def get_mngdoc_estructura():
         if connection:
             connection.close()
 
+
+@router.get("/mngdoc/estructura")
+async def get_mngdoc_estructura():
+    """
+    Diagnostic endpoint to get the structure of MANAGER.MNGDOC table
+    and its relationship with MNGMCN.
+    """
+    try:
+        return await run_oracle(_get_mngdoc_estructura)
+    except OracleTimeoutError as e:
+        return {
+            "success": False,
+            "error": str(e)
+        }
@@ -2,20 +2,19 @@
 Consolidado Router - Generate consolidated Excel reports from selected invoices
 """
 from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
-from typing import List
+from sqlalchemy import select, func, case, cast, literal, or_, Date, Float
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from typing import List, Optional
 from pydantic import BaseModel
 import openpyxl
 from openpyxl.drawing.image import Image
-from io import BytesIO
 from datetime import datetime
 import os
 from urllib.parse import quote
 
 from database import get_db
+import excel_render
 import models
 
 router = APIRouter()
@@ -28,113 +27,226 @@ MESES_ES = {
 
 
 class ConsolidadoRequest(BaseModel):
-    factura_ids: List[int]
+    """
+    Facturas to include: explicit ids, or (when factura_ids is empty)
+    every factura matching the filters. Dates filter on created_at
+    (fecha de recibido), like the facturas list.
+    """
+    factura_ids: Optional[List[int]] = None
+    fecha_desde: Optional[str] = None
+    fecha_hasta: Optional[str] = None
+    proveedor_id: Optional[int] = None
+    oficina_id: Optional[int] = None
+    estado: Optional[str] = None
 
 
-@router.post("/consolidado/generar")
-async def generar_consolidado(
-    request: ConsolidadoRequest,
-    db: AsyncSession = Depends(get_db)
-):
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Paths
+BASE_PATH = os.path.join(os.path.dirname(__file__), '..', 'Template_consolidado')
+TEMPLATE_PATH = os.path.join(BASE_PATH, 'template_relacion_facturas.xlsx')
+IMAGE_PATH = os.path.join(BASE_PATH, 'la fortuna.jpg')
+
+
+def validate_consolidado_request(request: ConsolidadoRequest):
+    """Raise 400 unless the request selects facturas by id or by at least one filter"""
+    filtros = (request.fecha_desde, request.fecha_hasta, request.proveedor_id, request.oficina_id, request.estado)
+    if not request.factura_ids and not any(filtros):
+        raise HTTPException(status_code=400, detail="No se seleccionaron facturas")
+    for fecha in (request.fecha_desde, request.fecha_hasta):
+        if fecha:
+            try:
+                datetime.strptime(fecha, '%Y-%m-%d')
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Fecha invalida: {fecha}. Use YYYY-MM-DD")
+
+
+def _filter_facturas(query, request: ConsolidadoRequest):
+    """Restrict a query over Factura to the request's ids or filters"""
+    if request.factura_ids:
+        return query.where(models.Factura.id.in_(request.factura_ids))
+    if request.estado:
+        query = query.where(models.Factura.estado == request.estado)
+    if request.proveedor_id:
+        query = query.where(models.Factura.proveedor_id == request.proveedor_id)
+    if request.oficina_id:
+        # Legacy oficina_id or any assignment to the oficina
+        asignada = (
+            select(models.FacturaOficina.id)
+            .where(
+                models.FacturaOficina.factura_id == models.Factura.id,
+                models.FacturaOficina.oficina_id == request.oficina_id
+            )
+            .exists()
+        )
+        query = query.where(or_(models.Factura.oficina_id == request.oficina_id, asignada))
+    if request.fecha_desde:
+        query = query.where(models.Factura.created_at >= datetime.strptime(request.fecha_desde, '%Y-%m-%d'))
+    if request.fecha_hasta:
+        fecha_hasta_dt = datetime.strptime(request.fecha_hasta, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
+        query = query.where(models.Factura.created_at <= fecha_hasta_dt)
+    return query
+
+
+def _oficinas_text(dialect: str):
     """
-    Generate a consolidated Excel file from selected invoices.
-    Uses the template and populates the 'info' sheet with invoice data.
-    Re-inserts the logo image after modification.
+    "cod, nombre, cod, nombre, ..." per factura, oficinas in assignment order.
+    Subquery (factura_id, oficinas).
     """
-    if not request.factura_ids:
-        raise HTTPException(status_code=400, detail="No se seleccionaron facturas")
-    
-    # Fetch selected facturas with proveedor and oficinas relationships
-    result = await db.execute(
-        select(models.Factura)
-        .options(
-            selectinload(models.Factura.proveedor),
-            selectinload(models.Factura.oficinas_asignadas)
-            .selectinload(models.FacturaOficina.oficina)
+    oficina_text = (
+        func.coalesce(models.Oficina.cod_oficina, '') + ', ' + func.coalesce(models.Oficina.nombre, '')
+    )
+    if dialect == 'postgresql':
+        return (
+            select(
+                models.FacturaOficina.factura_id,
+                func.string_agg(oficina_text, aggregate_order_by(literal(', '), models.FacturaOficina.id))
+                .label("oficinas")
+            )
+            .join(models.Oficina, models.FacturaOficina.oficina_id == models.Oficina.id)
+            .group_by(models.FacturaOficina.factura_id)
+            .subquery()
         )
-        .where(models.Factura.id.in_(request.factura_ids))
+    # SQLite (local runs): group_concat keeps the order of an ordered subquery
+    ordered = (
+        select(models.FacturaOficina.factura_id, oficina_text.label("texto"))
+        .join(models.Oficina, models.FacturaOficina.oficina_id == models.Oficina.id)
+        .order_by(models.FacturaOficina.factura_id, models.FacturaOficina.id)
+        .subquery()
     )
-    facturas = result.scalars().all()
-    
-    if not facturas:
+    return (
+        select(ordered.c.factura_id, func.group_concat(ordered.c.texto, ', ').label("oficinas"))
+        .group_by(ordered.c.factura_id)
+        .subquery()
+    )
+
+
+async def load_consolidado_rows(db: AsyncSession, request: ConsolidadoRequest) -> List[tuple]:
+    """
+    Rows for the 'info' sheet in one query (raises 400/404):
+    (fecha factura, numero, proveedor + oficinas, valor, fecha recibido)
+    """
+    validate_consolidado_request(request)
+    dialect = db.bind.dialect.name
+    oficinas = _oficinas_text(dialect)
+    proveedor_nombre = func.coalesce(models.Proveedor.nombre, '')
+    # Fecha Recibido is the date the factura was registered (created_at)
+    if dialect == 'postgresql':
+        fecha_recibido = cast(models.Factura.created_at, Date)
+    else:
+        fecha_recibido = func.date(models.Factura.created_at, type_=Date)
+
+    query = (
+        select(
+            models.Factura.fecha_factura,
+            func.coalesce(models.Factura.numero_factura, ''),
+            # Format: Proveedor, codigo1, oficina1, codigo2, oficina2, ...
+            case(
+                (oficinas.c.oficinas.is_(None), proveedor_nombre),
+                else_=proveedor_nombre + ', ' + oficinas.c.oficinas
+            ),
+            cast(func.coalesce(models.Factura.valor, 0), Float),
+            func.coalesce(fecha_recibido, models.Factura.fecha_factura, type_=Date)
+        )
+        .select_from(models.Factura)
+        .outerjoin(models.Proveedor, models.Factura.proveedor_id == models.Proveedor.id)
+        .outerjoin(oficinas, oficinas.c.factura_id == models.Factura.id)
+    )
+
+    result = await db.execute(_filter_facturas(query, request).order_by(models.Factura.id))
+    rows = [tuple(row) for row in result]
+
+    if not rows:
         raise HTTPException(status_code=404, detail="No se encontraron las facturas seleccionadas")
-    
-    # Paths
-    base_path = os.path.join(os.path.dirname(__file__), '..', 'Template_consolidado')
-    template_path = os.path.join(base_path, 'template_relacion_facturas.xlsx')
-    image_path = os.path.join(base_path, 'la fortuna.jpg')
-    
-    try:
-        wb = openpyxl.load_workbook(template_path)
-    except FileNotFoundError:
-        raise HTTPException(status_code=500, detail="Template no encontrado")
+
+    return rows
+
+
+def consolidado_filename() -> str:
+    """Filename with current date"""
+    now = datetime.now()
+    dia = str(now.day).zfill(2)
+    mes = MESES_ES[now.month]
+    anio = now.year
+    return f"{dia}-{mes}-{anio}-FO-GFI-02RelaciondeFacturasEntregadasV.2.xlsx"
+
+
+def render_consolidado(rows: List[tuple], destination):
+    """
+    Fill the template with load_consolidado_rows() and save it to destination
+    (runs in the excel_render pool). Raises FileNotFoundError if the
+    template is missing.
+    """
+    wb = openpyxl.load_workbook(TEMPLATE_PATH)
     
     # Get the data sheet (info sheet) - only modify this sheet
     info_sheet = wb['info']
     
     # Populate with factura data starting at row 2
-    for idx, factura in enumerate(facturas, start=2):
+    for idx, (fecha_factura, numero_factura, proveedor_text, valor, fecha_recibido) in enumerate(rows, start=2):
         # Column A: Fecha de Factura
-        info_sheet[f'A{idx}'] = factura.fecha_factura
-        
+        info_sheet[f'A{idx}'] = fecha_factura
         # Column F: Numero Factura
-        info_sheet[f'F{idx}'] = factura.numero_factura or ''
-        
+        info_sheet[f'F{idx}'] = numero_factura
         # Column L: Proveedor + Oficinas
-        # Format: Proveedor, codigo1, oficina1, codigo2, oficina2, ...
-        proveedor_nombre = factura.proveedor.nombre if factura.proveedor else ''
-        oficinas_info = []
-        for oa in (factura.oficinas_asignadas or []):
-            if oa.oficina:
-                cod = oa.oficina.cod_oficina or ''
-                nombre = oa.oficina.nombre or ''
-                oficinas_info.append(f"{cod}, {nombre}")
-        
-        if oficinas_info:
-            proveedor_text = f"{proveedor_nombre}, {', '.join(oficinas_info)}"
-        else:
-            proveedor_text = proveedor_nombre
-        
         info_sheet[f'L{idx}'] = proveedor_text
-        
         # Column U: Valor
-        info_sheet[f'U{idx}'] = float(factura.valor) if factura.valor else 0
-        
-        # Column Z: Fecha Recibido (using created_at)
-        info_sheet[f'Z{idx}'] = factura.created_at.date() if factura.created_at else factura.fecha_factura
+        info_sheet[f'U{idx}'] = valor
+        # Column Z: Fecha Recibido
+        info_sheet[f'Z{idx}'] = fecha_recibido
     
     # Re-insert the logo image in F-GFI-2 sheet (it gets lost due to openpyxl limitations)
-    if os.path.exists(image_path):
+    if os.path.exists(IMAGE_PATH):
         main_sheet = wb['F-GFI-2']
-        img = Image(image_path)
+        img = Image(IMAGE_PATH)
         # Adjust size if needed (width, height in pixels)
         img.width = 150
         img.height = 80
         # Insert at cell A1 (top-left corner)
         main_sheet.add_image(img, 'A1')
     
-    # Generate filename with current date
-    now = datetime.now()
-    dia = str(now.day).zfill(2)
-    mes = MESES_ES[now.month]
-    anio = now.year
-    filename = f"{dia}-{mes}-{anio}-FO-GFI-02RelaciondeFacturasEntregadasV.2.xlsx"
+    wb.save(destination)
+
+
+@router.post("/consolidado/contar")
+async def contar_consolidado(request: ConsolidadoRequest, db: AsyncSession = Depends(get_db)):
+    """Number of facturas a consolidado with this request would include (raises 400)"""
+    validate_consolidado_request(request)
+    query = _filter_facturas(select(func.count(models.Factura.id)), request)
+    total = (await db.execute(query)).scalar() or 0
+    return {"success": True, "total": total}
+
+
+@router.post("/consolidado/generar")
+async def generar_consolidado(
+    request: ConsolidadoRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Generate a consolidated Excel file from selected invoices (factura_ids)
+    or from every invoice matching the filters.
+    Uses the template and populates the 'info' sheet with invoice data.
+    Re-inserts the logo image after modification.
+    For large selections use POST /exportaciones/consolidado (background job).
+    """
+    rows = await load_consolidado_rows(db, request)
     
-    # Save to BytesIO
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
+    # Render in the excel_render pool (off the event loop)
+    try:
+        path = await excel_render.render_to_file("consolidado", render_consolidado, rows)
+    except FileNotFoundError:
+        raise HTTPException(status_code=500, detail="Template no encontrado")
+    except excel_render.ExcelRenderBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
     
     # URL-encode filename for Content-Disposition header
-    encoded_filename = quote(filename)
+    encoded_filename = quote(consolidado_filename())
     
     # Return as downloadable file with proper headers
-    return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    return excel_render.file_response(
+        path,
         headers={
             "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}",
             "Access-Control-Expose-Headers": "Content-Disposition"
         }
     )
-
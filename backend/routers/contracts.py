@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File
 from fastapi.responses import FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import schemas, crud
+import manager_sync
+import autocomplete
+from response_cache import response_cache
 from database import get_db
 import os
 import re
@@ -127,20 +130,24 @@ async def delete_contract_pdf(contrato_id: int, db: AsyncSession = Depends(get_d
 
 # --- Helpers for Providers/Offices ---
 @router.get("/proveedores/", response_model=List[schemas.Proveedor])
-async def read_proveedores(skip: int = 0, limit: int = 100, search: Optional[str] = None, db: AsyncSession = Depends(get_db)):
-    return await crud.get_proveedores(db, skip=skip, limit=limit, search=search)
+async def read_proveedores(request: Request, skip: int = 0, limit: int = 100, search: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+    """
+    List providers. Cached (see response_cache), invalidated on provider changes.
+    """
+    async def build():
+        proveedores = await crud.get_proveedores(db, skip=skip, limit=limit, search=search)
+        return [schemas.Proveedor.model_validate(p) for p in proveedores]
+    return await response_cache.respond(request, ("proveedores",), build)
 
 @router.get("/proveedores/buscar-oracle/{nit}")
 async def buscar_proveedor_oracle(nit: str, db: AsyncSession = Depends(get_db)):
     """
-    Busca un proveedor por NIT en Oracle MANAGER.VINCULADO.
+    Busca un proveedor por NIT en MANAGER.VINCULADO (copia local sincronizada).
     Retorna el nombre si existe, o error si no se encuentra.
     También verifica si ya existe en la base de datos local.
     """
-    from oracle_database import get_proveedor_by_nit_oracle
-    
     # Limpiar el NIT - remover guión y dígito verificador si existe
-    nit_clean = nit.split('-')[0].strip() if '-' in nit else nit.strip()
+    nit_clean = manager_sync.normalize_nit(nit.strip())
     
     # Verificar si ya existe en la base de datos local
     existing = await crud.get_proveedor_by_nit(db, nit_clean)
@@ -154,9 +161,9 @@ async def buscar_proveedor_oracle(nit: str, db: AsyncSession = Depends(get_db)):
             "message": "Este proveedor ya existe en la base de datos local"
         }
     
-    # Buscar en Oracle
+    # Buscar en VINCULADO
     try:
-        oracle_result = get_proveedor_by_nit_oracle(nit_clean)
+        oracle_result = await manager_sync.get_vinculado_by_nit(db, nit_clean)
         
         if oracle_result:
             return {
@@ -179,15 +186,41 @@ async def buscar_proveedor_oracle(nit: str, db: AsyncSession = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error consultando Oracle: {str(e)}")
 
+@router.get("/proveedores/buscar-vinculado")
+async def buscar_vinculado(q: str, limit: int = 20, db: AsyncSession = Depends(get_db)):
+    """
+    Busca vinculados de Manager por prefijo de NIT o por nombre (prefijo y aproximado).
+    Usa la copia local de MANAGER.VINCULADO.
+    """
+    resultados = await manager_sync.search_vinculados(db, q, limit=min(limit, 100))
+    return {
+        "total": len(resultados),
+        "data": resultados
+    }
+
+@router.get("/autocomplete/{entity}")
+async def autocomplete_search(entity: str, q: str = "", limit: int = 10, db: AsyncSession = Depends(get_db)):
+    """
+    Typeahead para los selectores de oficinas y proveedores.
+    - oficinas: busca por cod_oficina, nombre y ciudad
+    - proveedores: busca por NIT y nombre
+    Responde desde el indice en memoria (no consulta la base salvo al reconstruirlo).
+    """
+    if entity not in autocomplete.INDEXES:
+        raise HTTPException(status_code=404, detail=f"Entidad no soportada: {entity}")
+    resultados = await autocomplete.search(db, entity, q, limit=max(1, min(limit, autocomplete.AUTOCOMPLETE_MAX_LIMIT)))
+    return {
+        "total": len(resultados),
+        "data": resultados
+    }
+
 @router.post("/proveedores/", response_model=schemas.Proveedor)
 async def create_proveedor(proveedor: schemas.ProveedorCreate, db: AsyncSession = Depends(get_db)):
     """
-    Crea un proveedor. Si solo viene el NIT, consulta Oracle para obtener el nombre.
+    Crea un proveedor. Si solo viene el NIT, busca el nombre en MANAGER.VINCULADO.
     """
-    from oracle_database import get_proveedor_by_nit_oracle
-    
     # Limpiar el NIT
-    nit_clean = proveedor.nit.split('-')[0].strip() if '-' in proveedor.nit else proveedor.nit.strip()
+    nit_clean = manager_sync.normalize_nit(proveedor.nit.strip())
     
     # Verificar si ya existe
     db_prov = await crud.get_proveedor_by_nit(db, nit=nit_clean)
@@ -197,7 +230,7 @@ async def create_proveedor(proveedor: schemas.ProveedorCreate, db: AsyncSession
     # Si no viene el nombre o viene vacío, buscarlo en Oracle
     nombre = proveedor.nombre
     if not nombre or nombre.strip() == "" or nombre == "PENDING_ORACLE_LOOKUP":
-        oracle_result = get_proveedor_by_nit_oracle(nit_clean)
+        oracle_result = await manager_sync.get_vinculado_by_nit(db, nit_clean)
         if oracle_result:
             nombre = oracle_result["nombre"]
         else:
@@ -211,11 +244,15 @@ async def create_proveedor(proveedor: schemas.ProveedorCreate, db: AsyncSession
     return await crud.create_proveedor(db, proveedor_data)
 
 @router.get("/oficinas/", response_model=List[schemas.Oficina])
-async def read_oficinas(skip: int = 0, limit: int = 100, search: Optional[str] = None, db: AsyncSession = Depends(get_db)):
+async def read_oficinas(request: Request, skip: int = 0, limit: int = 100, search: Optional[str] = None, db: AsyncSession = Depends(get_db)):
     """
     Search offices by code, name, city, zone, or address.
+    Cached (see response_cache), invalidated on office changes.
     """
-    return await crud.get_oficinas(db, skip=skip, limit=limit, search=search)
+    async def build():
+        oficinas = await crud.get_oficinas(db, skip=skip, limit=limit, search=search)
+        return [schemas.Oficina.model_validate(o) for o in oficinas]
+    return await response_cache.respond(request, ("oficinas",), build)
 
 @router.post("/oficinas/", response_model=schemas.Oficina)
 async def create_oficina(oficina: schemas.OficinaCreate, db: AsyncSession = Depends(get_db)):
@@ -0,0 +1,127 @@
+"""
+Exportaciones Router - Background export jobs (see export_jobs.py)
+
+Submit an export, poll its status and download the file when it is ready:
+    POST /exportaciones/reportes        -> 202 {"job": {...}}
+    GET  /exportaciones/{job_id}        -> estado, progreso, mensaje
+    GET  /exportaciones/{job_id}/descarga (supports Range)
+"""
+import functools
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import export_jobs
+from routers import archivo_plano, consolidado, reportes
+
+router = APIRouter()
+
+
+class ReporteExportRequest(BaseModel):
+    """Same filters as GET /reportes/export"""
+    proveedor_id: Optional[int] = None
+    oficina_id: Optional[int] = None
+    fecha_desde: Optional[date] = None
+    fecha_hasta: Optional[date] = None
+    año: Optional[int] = None
+    mes: Optional[int] = None
+    tipo: Optional[str] = None
+    estado: Optional[str] = None
+    ciudad: Optional[str] = None
+
+
+def _job_response(job: export_jobs.ExportJob):
+    data = job.to_dict()
+    data.pop("artifact", None)
+    if job.estado == export_jobs.COMPLETADO:
+        data["descarga_url"] = f"/api/exportaciones/{job.id}/descarga"
+    return data
+
+
+def _submit(tipo: str, build):
+    try:
+        job = export_jobs.submit(tipo, build)
+    except export_jobs.ExportQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "60"})
+    return {"success": True, "job": _job_response(job)}
+
+
+@router.post("/exportaciones/reportes", status_code=202)
+async def submit_reporte_export(request: ReporteExportRequest):
+    """Queue the contracts report (GET /reportes/export) as a background job"""
+    if not reportes.EXCEL_AVAILABLE:
+        raise HTTPException(status_code=500, detail="openpyxl no esta instalado")
+
+    async def build(db: AsyncSession, job: export_jobs.ExportJob):
+        data, months = await reportes.get_report_data(db, **request.model_dump())
+        job.set_progress(40, f"{len(data)} contratos consultados")
+        return functools.partial(reportes.save_excel_report, data, months), reportes.report_filename()
+
+    return _submit("reportes", build)
+
+
+@router.post("/exportaciones/consolidado", status_code=202)
+async def submit_consolidado_export(request: consolidado.ConsolidadoRequest):
+    """Queue the consolidado (POST /consolidado/generar) as a background job"""
+    consolidado.validate_consolidado_request(request)
+
+    async def build(db: AsyncSession, job: export_jobs.ExportJob):
+        rows = await consolidado.load_consolidado_rows(db, request)
+        job.set_progress(40, f"{len(rows)} facturas consultadas")
+        return functools.partial(consolidado.render_consolidado, rows), consolidado.consolidado_filename()
+
+    return _submit("consolidado", build)
+
+
+@router.post("/exportaciones/archivo-plano", status_code=202)
+async def submit_archivo_plano_export(request: archivo_plano.ArchivoPlanoRequest):
+    """Queue the archivo plano (POST /archivo-plano/generar) as a background job"""
+    if not request.facturas:
+        raise HTTPException(status_code=400, detail="Debe proporcionar al menos una factura")
+
+    async def build(db: AsyncSession, job: export_jobs.ExportJob):
+        rows = await archivo_plano.build_archivo_plano_rows(request, db)
+        job.set_progress(40, f"{len(rows)} filas generadas")
+        return functools.partial(archivo_plano.render_archivo_plano, rows), archivo_plano.archivo_plano_filename(request)
+
+    return _submit("archivo_plano", build)
+
+
+@router.get("/exportaciones")
+async def list_exports():
+    """Exports accepted by this API process and the queue status"""
+    return {
+        "success": True,
+        "cola": export_jobs.queue_status(),
+        "jobs": [_job_response(job) for job in export_jobs.list_jobs()]
+    }
+
+
+@router.get("/exportaciones/{job_id}")
+async def get_export(job_id: str):
+    """Status and progress of an export"""
+    job = export_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Exportacion no encontrada o expirada")
+    return {"success": True, "job": _job_response(job)}
+
+
+@router.get("/exportaciones/{job_id}/descarga")
+async def download_export(job_id: str):
+    """Download a finished export (Range requests supported for resumable downloads)"""
+    job = export_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Exportacion no encontrada o expirada")
+    if job.estado == export_jobs.ERROR:
+        raise HTTPException(status_code=409, detail=f"La exportacion fallo: {job.error}")
+    if job.estado != export_jobs.COMPLETADO:
+        raise HTTPException(status_code=409, detail=f"La exportacion aun no termina ({job.progreso}%)")
+    return FileResponse(
+        job.path,
+        media_type=job.media_type,
+        filename=job.filename,
+        headers={"Access-Control-Expose-Headers": "Content-Disposition"}
+    )
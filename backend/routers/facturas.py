@@ -19,7 +19,11 @@ import os
 import httpx
 import uuid
 import schemas, crud
-from database import get_db
+import manager_sync
+from database import get_db, SessionLocal
+from http_clients import http_clients
+from fast_json import orm_response
+import tabular_export
 
 router = APIRouter()
 
@@ -166,6 +170,13 @@ async def create_factura_con_oficinas(
         if request.proveedor_nit:
             proveedor = await crud.get_proveedor_by_nit(db, request.proveedor_nit)
             
+            proveedor_nombre = request.proveedor_nombre
+            if not proveedor and not proveedor_nombre:
+                # Name from the local MANAGER.VINCULADO mirror
+                vinculado = await manager_sync.get_vinculado_by_nit(db, request.proveedor_nit)
+                if vinculado:
+                    proveedor_nombre = vinculado["nombre"]
+            
             if proveedor:
                 proveedor_id = proveedor.id
                 progress["proveedor_encontrado"] = True
@@ -175,14 +186,14 @@ async def create_factura_con_oficinas(
                     "nombre": proveedor.nombre,
                     "existia": True
                 }
-            elif request.proveedor_nombre:
+            elif proveedor_nombre:
                 # Create new proveedor
                 try:
                     proveedor = await crud.create_proveedor(
                         db, 
                         schemas.ProveedorCreate(
                             nit=request.proveedor_nit,
-                            nombre=request.proveedor_nombre
+                            nombre=proveedor_nombre
                         )
                     )
                     proveedor_id = proveedor.id
@@ -415,13 +426,43 @@ async def list_facturas(
     - fecha_hasta: Filter invoices until this date
     - solo_pendientes: Only show facturas without assigned contrato
     """
-    return await crud.get_facturas(
+    facturas = await crud.get_facturas(
         db, skip=skip, limit=limit, search=search, 
         estado=estado, proveedor_id=proveedor_id, 
         solo_pendientes=solo_pendientes,
         fecha_desde=fecha_desde, fecha_hasta=fecha_hasta,
         oficina_id=oficina_id
     )
+    # Rows come from crud with relationships loaded: no need to validate them again
+    return orm_response(facturas, schemas.Factura)
+
+
+@router.get("/facturas/export")
+async def export_facturas(
+    formato: str = Query("csv", alias="format", description="csv o parquet"),
+    estado: Optional[str] = None,
+    proveedor_id: Optional[int] = None,
+    oficina_id: Optional[int] = Query(None, description="Filtrar por oficina asignada"),
+    fecha_desde: Optional[str] = Query(None, description="Fecha desde (YYYY-MM-DD)"),
+    fecha_hasta: Optional[str] = Query(None, description="Fecha hasta (YYYY-MM-DD)")
+):
+    """
+    Raw factura export for BI tools, one row per oficina assignment.
+    Streamed from a server-side cursor as CSV or Parquet.
+    """
+    tabular_export.check_format(formato)
+
+    async def batches():
+        # Own session: it is used while the response streams
+        async with SessionLocal() as db:
+            async for rows in crud.stream_facturas_export(
+                db, estado=estado, proveedor_id=proveedor_id, oficina_id=oficina_id,
+                fecha_desde=fecha_desde, fecha_hasta=fecha_hasta
+            ):
+                yield rows
+
+    basename = f"facturas_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    return tabular_export.streaming_response(formato, crud.FACTURA_EXPORT_COLUMNS, batches(), basename)
 
 
 @router.get("/facturas/{factura_id}", response_model=schemas.Factura)
@@ -703,8 +744,7 @@ async def resumen_facturas(db: AsyncSession = Depends(get_db)):
     
     # Calculate missing invoices for this month
     today = datetime.now()
-    missing_contracts = await crud.get_contratos_pendientes_por_llegar(db, today.year, today.month)
-    pendientes_por_llegar = len(missing_contracts)
+    pendientes_por_llegar = await crud.count_contratos_pendientes_por_llegar(db, today.year, today.month)
     
     return {
         "total": len(todas),
@@ -724,6 +764,58 @@ async def list_missing_contracts(db: AsyncSession = Depends(get_db)):
     return await crud.get_contratos_pendientes_por_llegar(db, today.year, today.month)
 
 
+def _parse_periodo(value: str, campo: str):
+    """Parse a YYYY-MM period into (year, month)"""
+    try:
+        year, month = (int(p) for p in value.split('-'))
+        # The month and the next one must be valid dates (1 <= year <= 9999)
+        date(year, month, 1)
+        date(year + month // 12, month % 12 + 1, 1)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Periodo invalido en '{campo}', use YYYY-MM")
+    return year, month
+
+
+@router.get("/facturas/stats/contratos-pendientes/matriz")
+async def matriz_contratos_pendientes(
+    desde: str = Query(..., description="Primer mes (YYYY-MM)"),
+    hasta: str = Query(..., description="Ultimo mes (YYYY-MM)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Missing-invoice matrix for a range of months.
+    Returns one entry per active contract with the months (YYYY-MM) it has no invoice for.
+    """
+    inicio = _parse_periodo(desde, "desde")
+    fin = _parse_periodo(hasta, "hasta")
+    if inicio > fin:
+        raise HTTPException(status_code=400, detail="'desde' debe ser anterior o igual a 'hasta'")
+    if (fin[0] - inicio[0]) * 12 + fin[1] - inicio[1] >= 36:
+        raise HTTPException(status_code=400, detail="El rango maximo es de 36 meses")
+    
+    rows = await crud.get_matriz_pendientes_por_llegar(db, inicio, fin)
+    
+    contratos = {}
+    for contrato_id, num_contrato, proveedor, cod_oficina, oficina, anio, mes in rows:
+        item = contratos.setdefault(contrato_id, {
+            "contrato_id": contrato_id,
+            "num_contrato": num_contrato,
+            "proveedor": proveedor,
+            "cod_oficina": cod_oficina,
+            "oficina": oficina,
+            "meses_pendientes": []
+        })
+        item["meses_pendientes"].append(f"{anio:04d}-{mes:02d}")
+    
+    return {
+        "desde": f"{inicio[0]:04d}-{inicio[1]:02d}",
+        "hasta": f"{fin[0]:04d}-{fin[1]:02d}",
+        "total_contratos": len(contratos),
+        "total_pendientes": len(rows),
+        "contratos": list(contratos.values())
+    }
+
+
 # --- Manual Invoice Upload ---
 
 @router.post("/facturas/upload")
@@ -790,20 +882,19 @@ async def upload_factura(
         
         # Notify webhook
         try:
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                webhook_data = {
-                    "event": "invoice_uploaded",
-                    "file_path": file_path,
-                    "file_url": url_factura,
-                    "filename": safe_filename,
-                    "original_filename": file.filename,
-                    "uploaded_at": datetime.now().isoformat(),
-                    "proveedor_nit": proveedor_nit,
-                    "numero_factura": numero_factura
-                }
-                
-                response = await client.post(WEBHOOK_URL, json=webhook_data)
-                webhook_status = response.status_code
+            webhook_data = {
+                "event": "invoice_uploaded",
+                "file_path": file_path,
+                "file_url": url_factura,
+                "filename": safe_filename,
+                "original_filename": file.filename,
+                "uploaded_at": datetime.now().isoformat(),
+                "proveedor_nit": proveedor_nit,
+                "numero_factura": numero_factura
+            }
+            
+            response = await http_clients.request("n8n", "POST", WEBHOOK_URL, json=webhook_data, timeout=30.0)
+            webhook_status = response.status_code
                 
         except Exception as e:
             # Don't fail the upload if webhook fails, just log it
@@ -924,61 +1015,60 @@ async def upload_factura_pdf(
     
     # Call webhook and WAIT for n8n response (timeout 120 seconds for OCR processing)
     try:
-        async with httpx.AsyncClient(timeout=120.0) as client:
-            webhook_data = {
-                "event": "invoice_uploaded",
-                "file_path": file_path,
-                "file_url": url_factura,
-                "filename": safe_filename,
-                "original_filename": file.filename,
-                "uploaded_at": datetime.now().isoformat()
-            }
-            
-            response = await client.post(WEBHOOK_URL, json=webhook_data)
-            
-            # Check if n8n responded successfully
-            if response.status_code in [200, 201, 202]:
-                try:
-                    n8n_result = response.json()
-                    
-                    # n8n returned success
-                    if n8n_result.get("success"):
-                        return {
-                            "ok": True,
-                            "message": "Factura procesada correctamente",
-                            "file_url": url_factura,
-                            "filename": safe_filename,
-                            "factura_id": n8n_result.get("factura_id"),
-                            "factura": n8n_result.get("factura"),
-                            "n8n_response": n8n_result
-                        }
-                    else:
-                        # n8n returned an error
-                        return {
-                            "ok": False,
-                            "message": n8n_result.get("error", "Error procesando factura en n8n"),
-                            "file_url": url_factura,
-                            "filename": safe_filename,
-                            "n8n_response": n8n_result
-                        }
-                except Exception as json_error:
-                    # n8n responded but not with valid JSON
+        webhook_data = {
+            "event": "invoice_uploaded",
+            "file_path": file_path,
+            "file_url": url_factura,
+            "filename": safe_filename,
+            "original_filename": file.filename,
+            "uploaded_at": datetime.now().isoformat()
+        }
+        
+        response = await http_clients.request("n8n", "POST", WEBHOOK_URL, json=webhook_data)
+        
+        # Check if n8n responded successfully
+        if response.status_code in [200, 201, 202]:
+            try:
+                n8n_result = response.json()
+                
+                # n8n returned success
+                if n8n_result.get("success"):
                     return {
                         "ok": True,
-                        "message": "Archivo procesado (respuesta no JSON)",
+                        "message": "Factura procesada correctamente",
                         "file_url": url_factura,
                         "filename": safe_filename,
-                        "raw_response": response.text[:500]
+                        "factura_id": n8n_result.get("factura_id"),
+                        "factura": n8n_result.get("factura"),
+                        "n8n_response": n8n_result
                     }
-            else:
-                # n8n returned error status
+                else:
+                    # n8n returned an error
+                    return {
+                        "ok": False,
+                        "message": n8n_result.get("error", "Error procesando factura en n8n"),
+                        "file_url": url_factura,
+                        "filename": safe_filename,
+                        "n8n_response": n8n_result
+                    }
+            except Exception as json_error:
+                # n8n responded but not with valid JSON
                 return {
-                    "ok": False,
-                    "message": f"Error en n8n: HTTP {response.status_code}",
+                    "ok": True,
+                    "message": "Archivo procesado (respuesta no JSON)",
                     "file_url": url_factura,
-                    "filename": safe_filename
+                    "filename": safe_filename,
+                    "raw_response": response.text[:500]
                 }
-            
+        else:
+            # n8n returned error status
+            return {
+                "ok": False,
+                "message": f"Error en n8n: HTTP {response.status_code}",
+                "file_url": url_factura,
+                "filename": safe_filename
+            }
+        
     except httpx.TimeoutException:
         return {
             "ok": False,
@@ -2,14 +2,21 @@
 Oracle Offices Router
 Endpoints for querying offices from Oracle MANAMED database
 """
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional, Any, Dict
 import oracledb
 
 import sys
 sys.path.append('..')
-from oracle_database import get_oficina_by_codigo, get_all_oficinas, get_oracle_connection, get_consecutivo_documento
+from oracle_database import (
+    get_oficina_by_codigo, get_all_oficinas, get_oracle_connection, get_consecutivo_documento,
+    run_oracle, OracleTimeoutError, normalize_code_bind, explain_code_lookup
+)
+from database import get_db
+import manager_sync
+from response_cache import response_cache
 
 router = APIRouter()
 
@@ -39,11 +46,19 @@ class OficinasOracleListResponse(BaseModel):
 
 # ============== ENDPOINTS DE DIAGNÓSTICO ==============
 
-@router.get("/oracle-test-connection")
-async def test_oracle_connection():
-    """
-    Test Oracle database connection and return diagnostic info.
-    """
+async def _run_diagnostic(func, *args):
+    """Run a diagnostic query off the event loop, reporting timeouts like Oracle errors"""
+    try:
+        return await run_oracle(func, *args)
+    except OracleTimeoutError as e:
+        return {
+            "success": False,
+            "message": f"Error: {str(e)}"
+        }
+
+
+def _test_oracle_connection():
+    """Blocking part of /oracle-test-connection (runs in the Oracle thread pool)"""
     connection = None
     cursor = None
     try:
@@ -82,11 +97,16 @@ async def test_oracle_connection():
             connection.close()
 
 
-@router.get("/oracle-list-schemas")
-async def list_oracle_schemas():
+@router.get("/oracle-test-connection")
+async def test_oracle_connection():
     """
-    List all schemas/users accessible to the current user.
+    Test Oracle database connection and return diagnostic info.
     """
+    return await _run_diagnostic(_test_oracle_connection)
+
+
+def _list_oracle_schemas():
+    """Blocking part of /oracle-list-schemas (runs in the Oracle thread pool)"""
     connection = None
     cursor = None
     try:
@@ -119,12 +139,16 @@ async def list_oracle_schemas():
             connection.close()
 
 
-@router.get("/oracle-list-tables")
-async def list_oracle_tables(schema: Optional[str] = None):
+@router.get("/oracle-list-schemas")
+async def list_oracle_schemas():
     """
-    List tables accessible to the current user.
-    Optionally filter by schema.
+    List all schemas/users accessible to the current user.
     """
+    return await _run_diagnostic(_list_oracle_schemas)
+
+
+def _list_oracle_tables(schema: Optional[str] = None):
+    """Blocking part of /oracle-list-tables (runs in the Oracle thread pool)"""
     connection = None
     cursor = None
     try:
@@ -169,11 +193,17 @@ async def list_oracle_tables(schema: Optional[str] = None):
             connection.close()
 
 
-@router.get("/oracle-search-table/{table_name}")
-async def search_oracle_table(table_name: str):
+@router.get("/oracle-list-tables")
+async def list_oracle_tables(schema: Optional[str] = None):
     """
-    Search for a specific table across all accessible schemas.
+    List tables accessible to the current user.
+    Optionally filter by schema.
     """
+    return await _run_diagnostic(_list_oracle_tables, schema)
+
+
+def _search_oracle_table(table_name: str):
+    """Blocking part of /oracle-search-table (runs in the Oracle thread pool)"""
     connection = None
     cursor = None
     try:
@@ -208,12 +238,16 @@ async def search_oracle_table(table_name: str):
             connection.close()
 
 
-@router.get("/oracle-debug-oficina/{codigo}")
-async def debug_oficina_search(codigo: str):
+@router.get("/oracle-search-table/{table_name}")
+async def search_oracle_table(table_name: str):
     """
-    Debug endpoint to understand why a code might not be found.
-    Shows exact comparison results.
+    Search for a specific table across all accessible schemas.
     """
+    return await _run_diagnostic(_search_oracle_table, table_name)
+
+
+def _debug_oficina_search(codigo: str):
+    """Blocking part of /oracle-debug-oficina (runs in the Oracle thread pool)"""
     connection = None
     cursor = None
     try:
@@ -242,6 +276,12 @@ async def debug_oficina_search(codigo: str):
         """, {"codigo": codigo})
         results["exact_match"] = cursor.fetchone()[0]
         
+        # Método 1b: Bind normalizado al ancho de la columna (usa el índice)
+        cursor.execute("""
+            SELECT COUNT(*) FROM MANAGER.MNGDNO WHERE DNOCODIGO = :codigo
+        """, {"codigo": normalize_code_bind(cursor, "MANAGER", "MNGDNO", "DNOCODIGO", codigo)})
+        results["padded_match"] = cursor.fetchone()[0]
+        
         # Método 2: Con TRIM
         cursor.execute("""
             SELECT COUNT(*) FROM MANAGER.MNGDNO WHERE TRIM(DNOCODIGO) = TRIM(:codigo)
@@ -283,12 +323,44 @@ async def debug_oficina_search(codigo: str):
             connection.close()
 
 
+@router.get("/oracle-debug-oficina/{codigo}")
+async def debug_oficina_search(codigo: str):
+    """
+    Debug endpoint to understand why a code might not be found.
+    Shows exact comparison results.
+    """
+    return await _run_diagnostic(_debug_oficina_search, codigo)
+
+
+def _explain_oficina_lookup(codigo: str, repeticiones: int):
+    """Blocking part of /oracle-plan-oficina (runs in the Oracle thread pool)"""
+    try:
+        return {"success": True, **explain_code_lookup(codigo, repeticiones)}
+    except oracledb.Error as e:
+        return {
+            "success": False,
+            "message": f"Error: {str(e)}"
+        }
+
+
+@router.get("/oracle-plan-oficina/{codigo}")
+async def explain_oficina_lookup(codigo: str, repeticiones: int = 5):
+    """
+    Compare the DNOCODIGO lookup forms used by get_oficina_by_codigo.
+    Returns the execution plan (DBMS_XPLAN) and timing of the indexable
+    form (bind padded to the column width) and the TRIM form.
+    """
+    return await _run_diagnostic(_explain_oficina_lookup, codigo, min(max(repeticiones, 1), 50))
+
+
 # ============== ENDPOINTS PRINCIPALES ==============
 
 @router.get("/oficinas-oracle/{codigo}", response_model=OficinaOracleResponse)
-async def get_oficina_oracle(codigo: str):
+async def get_oficina_oracle(request: Request, codigo: str, db: AsyncSession = Depends(get_db)):
     """
-    Get office information from Oracle database by code.
+    Get office information by code.
+    Served from the local Manager mirror; Oracle is only queried if the
+    mirror has never been synced. Cached (see response_cache).
     
     Args:
         codigo: Office code (DNOCODIGO) to search for
@@ -296,62 +368,115 @@ async def get_oficina_oracle(codigo: str):
     Returns:
         Office information including name and cost center details
     """
-    try:
-        result = get_oficina_by_codigo(codigo)
+    async def build():
+        try:
+            if await manager_sync.mirror_ready(db, "manager_oficinas"):
+                result = await manager_sync.get_oficina_manager(db, codigo)
+            else:
+                result = await run_oracle(get_oficina_by_codigo, codigo)
         
-        if result:
-            return OficinaOracleResponse(
-                success=True,
-                data=OficinaOracle(**result),
-                message="Oficina encontrada"
+            if result:
+                return OficinaOracleResponse(
+                    success=True,
+                    data=OficinaOracle(**result),
+                    message="Oficina encontrada"
+                )
+            else:
+                return OficinaOracleResponse(
+                    success=False,
+                    data=None,
+                    message=f"No se encontró oficina con código: {codigo}"
+                )
+            
+        except OracleTimeoutError as e:
+            raise HTTPException(
+                status_code=504,
+                detail=f"Tiempo de espera agotado consultando Oracle: {str(e)}"
             )
-        else:
-            return OficinaOracleResponse(
-                success=False,
-                data=None,
-                message=f"No se encontró oficina con código: {codigo}"
+        except oracledb.Error as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error de conexión con Oracle: {str(e)}"
             )
-            
-    except oracledb.Error as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error de conexión con Oracle: {str(e)}"
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error interno: {str(e)}"
-        )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error interno: {str(e)}"
+            )
+    
+    return await response_cache.respond(request, ("manager_oficinas",), build)
 
 
 @router.get("/oficinas-oracle", response_model=OficinasOracleListResponse)
-async def get_all_oficinas_oracle():
+async def get_all_oficinas_oracle(request: Request, db: AsyncSession = Depends(get_db)):
     """
-    Get all offices from Oracle database.
+    Get all offices.
+    Served from the local Manager mirror; Oracle is only queried if the
+    mirror has never been synced. Cached (see response_cache).
     
     Returns:
         List of all offices with their cost center information
     """
-    try:
-        results = get_all_oficinas()
+    async def build():
+        try:
+            if await manager_sync.mirror_ready(db, "manager_oficinas"):
+                results = await manager_sync.get_all_oficinas_manager(db)
+            else:
+                results = await run_oracle(get_all_oficinas)
         
-        return OficinasOracleListResponse(
-            success=True,
-            data=[OficinaOracle(**r) for r in results],
-            total=len(results),
-            message=f"Se encontraron {len(results)} oficinas"
-        )
+            return OficinasOracleListResponse(
+                success=True,
+                data=[OficinaOracle(**r) for r in results],
+                total=len(results),
+                message=f"Se encontraron {len(results)} oficinas"
+            )
             
-    except oracledb.Error as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error de conexión con Oracle: {str(e)}"
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error interno: {str(e)}"
-        )
+        except OracleTimeoutError as e:
+            raise HTTPException(
+                status_code=504,
+                detail=f"Tiempo de espera agotado consultando Oracle: {str(e)}"
+            )
+        except oracledb.Error as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error de conexión con Oracle: {str(e)}"
+            )
+        except Exception as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Error interno: {str(e)}"
+            )
+    
+    return await response_cache.respond(request, ("manager_oficinas",), build)
+
+
+# ============== SINCRONIZACION MANAGER ==============
+
+@router.get("/manager-sync/estado")
+async def get_manager_sync_estado(db: AsyncSession = Depends(get_db)):
+    """
+    Sync state of the local Manager mirrors (last success, rows, errors).
+    """
+    return {
+        "success": True,
+        "intervalo_minutos": manager_sync.MANAGER_SYNC_INTERVAL_MIN,
+        "fuentes": await manager_sync.get_watermarks(db)
+    }
+
+
+@router.post("/manager-sync")
+async def run_manager_sync(force: bool = False):
+    """
+    Sync the Manager mirrors from Oracle now.
+    
+    Args:
+        force: Rewrite the mirror even if the Oracle data did not change
+    """
+    results = await manager_sync.sync_all(force=force)
+    return {
+        "success": all(r["status"] != "ERROR" for r in results),
+        "resultados": results
+    }
 
 
 # ============== ENDPOINT CONSECUTIVO DOCUMENTO ==============
@@ -388,7 +513,7 @@ async def get_consecutivo_doc(tipo_documento: str, clase_documento: str = "0000"
         GET /api/consecutivo-documento/DC07?clase_documento=0000
     """
     try:
-        result = get_consecutivo_documento(tipo_documento, clase_documento)
+        result = await run_oracle(get_consecutivo_documento, tipo_documento, clase_documento)
         
         if result:
             return ConsecutivoDocumentoResponse(
@@ -403,6 +528,11 @@ async def get_consecutivo_doc(tipo_documento: str, clase_documento: str = "0000"
                 message=f"No se encontró documento con tipo: {tipo_documento} y clase: {clase_documento}"
             )
             
+    except OracleTimeoutError as e:
+        raise HTTPException(
+            status_code=504,
+            detail=f"Tiempo de espera agotado consultando Oracle: {str(e)}"
+        )
     except oracledb.Error as e:
         raise HTTPException(
             status_code=500,
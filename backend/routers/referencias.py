@@ -0,0 +1,60 @@
+"""
+Referencias Router - Versioned reference data (proveedores, oficinas, contratos)
+
+Clients keep a local copy: they load /referencias/snapshot once and then
+ask /referencias/cambios?since=<version> for what changed.
+"""
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_db
+from fast_json import FastJSONResponse
+import reference_data
+import response_cache
+
+router = APIRouter()
+
+
+def _entities(entidades: Optional[str]):
+    try:
+        return reference_data.parse_entities(entidades)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/referencias/version")
+async def get_reference_version(db: AsyncSession = Depends(get_db)):
+    """Current version of the reference data"""
+    return {"version": await reference_data.current_version(db)}
+
+
+@router.get("/referencias/snapshot")
+async def get_reference_snapshot(
+    request: Request,
+    entidades: Optional[str] = Query(None, description="Entidades separadas por coma (por defecto todas)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Every row of the requested entities plus the version they reflect.
+    Rows come as {columns, rows}. Answers 304 while the version has not changed.
+    """
+    entities = _entities(entidades)
+    version = await reference_data.current_version(db)
+    headers = {"ETag": f'"ref-{version}-{",".join(entities)}"', "Cache-Control": "private, no-cache"}
+    if response_cache.etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(await reference_data.snapshot(db, entities), headers=headers)
+
+
+@router.get("/referencias/cambios")
+async def get_reference_changes(
+    since: int = Query(..., ge=0, description="Version que tiene el cliente"),
+    entidades: Optional[str] = Query(None, description="Entidades separadas por coma (por defecto todas)"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Rows changed and ids deleted after version `since`.
+    If reset is true the client must reload the snapshot.
+    """
+    return await reference_data.changes_since(db, since, _entities(entidades))
@@ -1,19 +1,22 @@
-from fastapi import APIRouter, Depends, Query
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from sqlalchemy import and_, extract, or_, cast, Date
-from typing import Optional, List
+from sqlalchemy import and_, extract, func, or_, cast, Date
+from typing import AsyncIterator, Optional, List
 from datetime import datetime, date, timedelta
-from io import BytesIO
 import models
-from database import get_db
+from database import get_db, SessionLocal
+import excel_render
+import tabular_export
+from response_cache import response_cache
+from fast_json import FastJSONResponse
 
 # Try to import openpyxl for Excel generation
 try:
     from openpyxl import Workbook
-    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
     from openpyxl.utils import get_column_letter
     EXCEL_AVAILABLE = True
 except ImportError:
@@ -28,24 +31,36 @@ MESES = {
     9: 'Septiembre', 10: 'Octubre', 11: 'Noviembre', 12: 'Diciembre'
 }
 
+# Preview page size (default / max)
+PREVIEW_PAGE_SIZE = 50
+PREVIEW_MAX_PAGE_SIZE = 500
 
-async def get_report_data(
-    db: AsyncSession,
-    proveedor_id: Optional[int] = None,
-    oficina_id: Optional[int] = None,
+# Rows per server-side cursor batch in CSV/Parquet exports
+EXPORT_STREAM_BATCH = 1000
+
+# CSV/Parquet columns before the month columns (name, type)
+REPORT_STATIC_COLUMNS = [
+    ('nit_proveedor', 'str'),
+    ('nombre_proveedor', 'str'),
+    ('cod_oficina', 'str'),
+    ('nombre_oficina', 'str'),
+    ('direccion', 'str'),
+    ('ciudad', 'str'),
+    ('tipo', 'str'),
+    ('num_contrato', 'str'),
+    ('tipo_plan', 'str'),
+    ('tipo_canal', 'str'),
+    ('valor_mensual', 'float'),
+]
+
+
+def get_report_months(
     fecha_desde: Optional[date] = None,
     fecha_hasta: Optional[date] = None,
     año: Optional[int] = None,
-    mes: Optional[int] = None,
-    tipo: Optional[str] = None,
-    estado: Optional[str] = None,
-    ciudad: Optional[str] = None
+    mes: Optional[int] = None
 ):
-    """
-    Get report data with all contracts and their invoice values from FacturaOficina.
-    Returns data structured for Excel export with dynamic month columns.
-    """
-    # Determine date range for columns FIRST
+    """Date range of the report and the (year, month) columns it covers"""
     if fecha_desde and fecha_hasta:
         start_date = fecha_desde
         end_date = fecha_hasta
@@ -77,17 +92,17 @@ async def get_report_data(
         else:
             current = date(current.year, current.month + 1, 1)
     
-    # Build query for contracts with relationships
-    query = (
-        select(models.Contrato)
-        .options(
-            selectinload(models.Contrato.proveedor),
-            selectinload(models.Contrato.oficina)
-        )
-        .outerjoin(models.Oficina)
-    )
-    
-    # Apply filters
+    return start_date, end_date, months
+
+
+def contract_filters(
+    proveedor_id: Optional[int] = None,
+    oficina_id: Optional[int] = None,
+    tipo: Optional[str] = None,
+    estado: Optional[str] = None,
+    ciudad: Optional[str] = None
+):
+    """Filters on Contrato (outer joined to Oficina for ciudad)"""
     filters = []
     
     if proveedor_id:
@@ -105,27 +120,38 @@ async def get_report_data(
     if ciudad:
         filters.append(models.Oficina.ciudad.ilike(f"%{ciudad}%"))
     
-    if filters:
-        query = query.filter(and_(*filters))
-    
-    result = await db.execute(query.order_by(models.Contrato.id))
-    contratos = result.scalars().all()
-    
-    # Get all FacturaOficina entries with their facturas for the date range
-    # This gets all invoice assignments to offices within the date range
-    factura_oficina_query = (
-        select(models.FacturaOficina)
-        .options(
-            selectinload(models.FacturaOficina.factura),
-            selectinload(models.FacturaOficina.oficina),
-            selectinload(models.FacturaOficina.contrato)
+    return filters
+
+
+async def get_valores_por_contrato(
+    db: AsyncSession,
+    start_date: date,
+    end_date: date,
+    proveedor_id: Optional[int] = None,
+    oficina_id: Optional[int] = None,
+    ciudad: Optional[str] = None,
+    contratos: Optional[List[models.Contrato]] = None
+):
+    """
+    Invoice values per (proveedor_id, oficina_id) and month in the date range:
+    {(proveedor_id, oficina_id): {'YYYY-MM': {'valor', 'fecha'}}}.
+    With contratos, only the assignments of those contracts' proveedores and
+    oficinas are read (one report page).
+    """
+    # Plain columns: the ORM objects and their relationships are not needed
+    query = (
+        select(
+            models.Factura.proveedor_id,
+            models.FacturaOficina.oficina_id,
+            models.Factura.fecha_factura,
+            models.Factura.created_at,
+            models.FacturaOficina.valor
         )
+        .select_from(models.FacturaOficina)
         .join(models.Factura)
-        .outerjoin(models.Oficina, models.FacturaOficina.oficina_id == models.Oficina.id)
     )
     
     # Apply date filter - use fecha_factura or created_at if fecha_factura is NULL
-    # Get the effective date (fecha_factura or created_at date)
     fo_filters = [
         or_(
             and_(
@@ -141,7 +167,7 @@ async def get_report_data(
         )
     ]
     
-    # Apply same filters to FacturaOficina query
+    # Apply same filters as the contract query
     if proveedor_id:
         fo_filters.append(models.Factura.proveedor_id == proveedor_id)
     
@@ -149,211 +175,364 @@ async def get_report_data(
         fo_filters.append(models.FacturaOficina.oficina_id == oficina_id)
     
     if ciudad:
+        query = query.outerjoin(models.Oficina, models.FacturaOficina.oficina_id == models.Oficina.id)
         fo_filters.append(models.Oficina.ciudad.ilike(f"%{ciudad}%"))
     
-    factura_oficina_query = factura_oficina_query.filter(and_(*fo_filters))
+    if contratos is not None:
+        if not contratos:
+            return {}
+        proveedor_ids = {c.proveedor_id for c in contratos}
+        oficina_ids = {c.oficina_id for c in contratos if c.oficina_id is not None}
+        fo_filters.append(models.Factura.proveedor_id.in_(proveedor_ids))
+        oficina_filter = models.FacturaOficina.oficina_id.in_(oficina_ids)
+        if len(oficina_ids) < len(contratos) and any(c.oficina_id is None for c in contratos):
+            oficina_filter = or_(oficina_filter, models.FacturaOficina.oficina_id.is_(None))
+        fo_filters.append(oficina_filter)
     
-    fo_result = await db.execute(factura_oficina_query)
-    factura_oficinas = fo_result.scalars().all()
+    result = await db.execute(query.filter(and_(*fo_filters)))
     
-    # Create a lookup: (proveedor_id, oficina_id) -> {month_key: {valor, fecha}}
-    # This groups all invoice values by proveedor+oficina+month
+    # Group all invoice values by proveedor+oficina+month
     valores_por_contrato = {}
-    for fo in factura_oficinas:
-        if fo.factura:
-            # Use fecha_factura if available, otherwise use created_at
-            if fo.factura.fecha_factura:
-                factura_fecha = fo.factura.fecha_factura
-            elif fo.factura.created_at:
-                factura_fecha = fo.factura.created_at.date() if hasattr(fo.factura.created_at, 'date') else fo.factura.created_at
-            else:
-                continue  # Skip if no date available
-            
-            proveedor_id_fo = fo.factura.proveedor_id
-            oficina_id_fo = fo.oficina_id
-            
-            key = (proveedor_id_fo, oficina_id_fo)
-            month_key = f"{factura_fecha.year}-{factura_fecha.month:02d}"
-            
-            if key not in valores_por_contrato:
-                valores_por_contrato[key] = {}
-            
-            if month_key not in valores_por_contrato[key]:
-                valores_por_contrato[key][month_key] = {'valor': 0, 'fecha': None, 'facturas': []}
-            
-            valor_fo = float(fo.valor) if fo.valor else 0
-            valores_por_contrato[key][month_key]['valor'] += valor_fo
-            valores_por_contrato[key][month_key]['fecha'] = factura_fecha.isoformat() if hasattr(factura_fecha, 'isoformat') else str(factura_fecha)
-            if fo.factura.numero_factura:
-                valores_por_contrato[key][month_key]['facturas'].append(fo.factura.numero_factura)
-    
-    # Process data - now using the lookup
-    report_data = []
-    for contrato in contratos:
-        row = {
-            'nit_proveedor': contrato.proveedor.nit if contrato.proveedor else '',
-            'nombre_proveedor': contrato.proveedor.nombre if contrato.proveedor else '',
-            'cod_oficina': contrato.oficina.cod_oficina if contrato.oficina else '',
-            'nombre_oficina': contrato.oficina.nombre if contrato.oficina else '',
-            'direccion': contrato.oficina.direccion if contrato.oficina else '',
-            'ciudad': contrato.oficina.ciudad if contrato.oficina else '',
-            'tipo': contrato.tipo or '',
-            'num_contrato': contrato.num_contrato or '',
-            'tipo_plan': contrato.tipo_plan or '',
-            'tipo_canal': contrato.tipo_canal or '',
-            'valor_mensual': float(contrato.valor_mensual) if contrato.valor_mensual else 0,
-            'pagos': {}
-        }
+    for proveedor_id_fo, oficina_id_fo, fecha_factura, created_at, valor in result.all():
+        # Use fecha_factura if available, otherwise use created_at
+        if fecha_factura:
+            factura_fecha = fecha_factura
+        elif created_at:
+            factura_fecha = created_at.date() if hasattr(created_at, 'date') else created_at
+        else:
+            continue  # Skip if no date available
         
-        # Get invoice values for this contrato's proveedor+oficina combination
-        key = (contrato.proveedor_id, contrato.oficina_id)
-        if key in valores_por_contrato:
-            row['pagos'] = {
-                mk: {'valor': v['valor'], 'fecha': v['fecha']} 
-                for mk, v in valores_por_contrato[key].items()
-            }
+        key = (proveedor_id_fo, oficina_id_fo)
+        month_key = f"{factura_fecha.year}-{factura_fecha.month:02d}"
         
+        meses_contrato = valores_por_contrato.setdefault(key, {})
+        if month_key not in meses_contrato:
+            meses_contrato[month_key] = {'valor': 0, 'fecha': None}
+        
+        meses_contrato[month_key]['valor'] += float(valor) if valor else 0
+        meses_contrato[month_key]['fecha'] = factura_fecha.isoformat() if hasattr(factura_fecha, 'isoformat') else str(factura_fecha)
+    
+    return valores_por_contrato
+
 
-        report_data.append(row)
+def build_report_row(contrato: models.Contrato, valores_por_contrato: dict) -> dict:
+    """Report row of a contract with its monthly invoice values"""
+    row = {
+        'nit_proveedor': contrato.proveedor.nit if contrato.proveedor else '',
+        'nombre_proveedor': contrato.proveedor.nombre if contrato.proveedor else '',
+        'cod_oficina': contrato.oficina.cod_oficina if contrato.oficina else '',
+        'nombre_oficina': contrato.oficina.nombre if contrato.oficina else '',
+        'direccion': contrato.oficina.direccion if contrato.oficina else '',
+        'ciudad': contrato.oficina.ciudad if contrato.oficina else '',
+        'tipo': contrato.tipo or '',
+        'num_contrato': contrato.num_contrato or '',
+        'tipo_plan': contrato.tipo_plan or '',
+        'tipo_canal': contrato.tipo_canal or '',
+        'valor_mensual': float(contrato.valor_mensual) if contrato.valor_mensual else 0,
+        'pagos': {}
+    }
+    
+    # Get invoice values for this contrato's proveedor+oficina combination
+    key = (contrato.proveedor_id, contrato.oficina_id)
+    if key in valores_por_contrato:
+        row['pagos'] = {
+            mk: {'valor': v['valor'], 'fecha': v['fecha']}
+            for mk, v in valores_por_contrato[key].items()
+        }
+    
+    return row
+
+
+def _contracts_query(filters):
+    query = (
+        select(models.Contrato)
+        .options(
+            selectinload(models.Contrato.proveedor),
+            selectinload(models.Contrato.oficina)
+        )
+        .outerjoin(models.Oficina)
+    )
+    if filters:
+        query = query.filter(and_(*filters))
+    return query.order_by(models.Contrato.id)
+
+
+async def get_report_data(
+    db: AsyncSession,
+    proveedor_id: Optional[int] = None,
+    oficina_id: Optional[int] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    año: Optional[int] = None,
+    mes: Optional[int] = None,
+    tipo: Optional[str] = None,
+    estado: Optional[str] = None,
+    ciudad: Optional[str] = None
+):
+    """
+    Get report data with all contracts and their invoice values from FacturaOficina.
+    Returns data structured for Excel export with dynamic month columns.
+    """
+    start_date, end_date, months = get_report_months(fecha_desde, fecha_hasta, año, mes)
+    
+    filters = contract_filters(proveedor_id, oficina_id, tipo, estado, ciudad)
+    result = await db.execute(_contracts_query(filters))
+    contratos = result.scalars().all()
+    
+    valores_por_contrato = await get_valores_por_contrato(
+        db, start_date, end_date, proveedor_id, oficina_id, ciudad
+    )
+    
+    report_data = [build_report_row(contrato, valores_por_contrato) for contrato in contratos]
     
     return report_data, months
 
 
-def create_excel_report(data: List[dict], months: List[tuple], titulo: str = "Reporte de Contratos"):
-    """Create Excel workbook with report data"""
-    if not EXCEL_AVAILABLE:
-        raise ImportError("openpyxl is not installed. Run: pip install openpyxl")
+async def get_report_page(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 50,
+    proveedor_id: Optional[int] = None,
+    oficina_id: Optional[int] = None,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
+    año: Optional[int] = None,
+    mes: Optional[int] = None,
+    tipo: Optional[str] = None,
+    estado: Optional[str] = None,
+    ciudad: Optional[str] = None
+):
+    """
+    One page of the report (contracts ordered by id) and the total number of
+    contracts. Invoice values are read only for the contracts on the page.
+    """
+    start_date, end_date, months = get_report_months(fecha_desde, fecha_hasta, año, mes)
+    filters = contract_filters(proveedor_id, oficina_id, tipo, estado, ciudad)
+    
+    count_query = select(func.count(models.Contrato.id))
+    if ciudad:
+        count_query = count_query.outerjoin(models.Oficina)
+    if filters:
+        count_query = count_query.filter(and_(*filters))
+    total = (await db.execute(count_query)).scalar() or 0
     
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Reporte"
+    contratos = []
+    if skip < total:
+        result = await db.execute(_contracts_query(filters).offset(skip).limit(limit))
+        contratos = result.scalars().all()
     
-    # Styles
-    header_font = Font(bold=True, color="FFFFFF", size=11)
-    header_fill = PatternFill(start_color="2563EB", end_color="2563EB", fill_type="solid")
-    header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
+    valores_por_contrato = await get_valores_por_contrato(
+        db, start_date, end_date, proveedor_id, oficina_id, ciudad, contratos=contratos
+    )
     
-    month_header_fill = PatternFill(start_color="10B981", end_color="10B981", fill_type="solid")
-    date_header_fill = PatternFill(start_color="F59E0B", end_color="F59E0B", fill_type="solid")
+    report_data = [build_report_row(contrato, valores_por_contrato) for contrato in contratos]
     
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
+    return report_data, months, total
+
+
+def report_columns(months: List[tuple]):
+    """Tabular export columns: static ones, then valor_YYYY_MM / fecha_YYYY_MM per month"""
+    columns = list(REPORT_STATIC_COLUMNS)
+    for year, month in months:
+        columns.append((f"valor_{year}_{month:02d}", 'float'))
+        columns.append((f"fecha_{year}_{month:02d}", 'date'))
+    return columns
+
+
+async def stream_report_rows(
+    months: List[tuple],
+    start_date: date,
+    end_date: date,
+    proveedor_id: Optional[int] = None,
+    oficina_id: Optional[int] = None,
+    tipo: Optional[str] = None,
+    estado: Optional[str] = None,
+    ciudad: Optional[str] = None,
+    batch_size: int = EXPORT_STREAM_BATCH
+) -> AsyncIterator[List[tuple]]:
+    """
+    Report rows (report_columns order) in batches, read from a server-side
+    cursor. Only the monthly totals per proveedor+oficina are kept in memory.
+    Uses its own session: it runs while the response is being streamed.
+    """
+    month_keys = [f"{year}-{month:02d}" for year, month in months]
+    filters = contract_filters(proveedor_id, oficina_id, tipo, estado, ciudad)
+    query = (
+        select(
+            models.Contrato.proveedor_id,
+            models.Contrato.oficina_id,
+            models.Proveedor.nit,
+            models.Proveedor.nombre,
+            models.Oficina.cod_oficina,
+            models.Oficina.nombre,
+            models.Oficina.direccion,
+            models.Oficina.ciudad,
+            models.Contrato.tipo,
+            models.Contrato.num_contrato,
+            models.Contrato.tipo_plan,
+            models.Contrato.tipo_canal,
+            models.Contrato.valor_mensual
+        )
+        .select_from(models.Contrato)
+        .outerjoin(models.Proveedor, models.Contrato.proveedor_id == models.Proveedor.id)
+        .outerjoin(models.Oficina, models.Contrato.oficina_id == models.Oficina.id)
+        .order_by(models.Contrato.id)
+        .execution_options(yield_per=batch_size)
     )
+    if filters:
+        query = query.filter(and_(*filters))
     
-    currency_font = Font(bold=True)
-    
-    # Static headers
-    static_headers = [
-        'NIT Proveedor',
-        'Nombre Proveedor',
-        'Código Oficina',
-        'Nombre Oficina',
-        'Dirección',
-        'Ciudad',
-        'Tipo',
-        'Número Contrato',
-        'Tipo Plan',
-        'Tipo Canal',
-        'Valor Mensual'
+    async with SessionLocal() as db:
+        valores_por_contrato = await get_valores_por_contrato(
+            db, start_date, end_date, proveedor_id, oficina_id, ciudad
+        )
+        result = await db.stream(query)
+        async for partition in result.partitions():
+            rows = []
+            for proveedor_id_c, oficina_id_c, *campos, valor_mensual in partition:
+                row = [campo or '' for campo in campos]
+                row.append(float(valor_mensual) if valor_mensual else 0)
+                pagos = valores_por_contrato.get((proveedor_id_c, oficina_id_c), {})
+                for month_key in month_keys:
+                    pago = pagos.get(month_key)
+                    row.append(pago['valor'] if pago else None)
+                    row.append(pago['fecha'] if pago else None)
+                rows.append(tuple(row))
+            yield rows
+
+
+# Static report columns: (header, row key)
+STATIC_HEADERS = [
+    ('NIT Proveedor', 'nit_proveedor'),
+    ('Nombre Proveedor', 'nombre_proveedor'),
+    ('Código Oficina', 'cod_oficina'),
+    ('Nombre Oficina', 'nombre_oficina'),
+    ('Dirección', 'direccion'),
+    ('Ciudad', 'ciudad'),
+    ('Tipo', 'tipo'),
+    ('Número Contrato', 'num_contrato'),
+    ('Tipo Plan', 'tipo_plan'),
+    ('Tipo Canal', 'tipo_canal'),
+    ('Valor Mensual', 'valor_mensual'),
+]
+
+# Column width bounds (characters)
+MIN_COLUMN_WIDTH = 15
+MAX_COLUMN_WIDTH = 60
+
+
+def _report_styles(wb):
+    """
+    Register the report's named styles once per workbook and return a
+    prototype cell per style. Cells copy the prototype's style reference
+    instead of getting their own Font/Fill/Border objects.
+    """
+    thin = Side(style='thin')
+    thin_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    header = dict(
+        font=Font(bold=True, color="FFFFFF", size=11),
+        alignment=Alignment(horizontal="center", vertical="center", wrap_text=True),
+        border=thin_border
+    )
+    solid = lambda color: PatternFill(start_color=color, end_color=color, fill_type="solid")
+    styles = [
+        NamedStyle(name="reporte_header", fill=solid("2563EB"), **header),
+        NamedStyle(name="reporte_header_valor", fill=solid("10B981"), **header),
+        NamedStyle(name="reporte_header_fecha", fill=solid("F59E0B"), **header),
+        NamedStyle(name="reporte_texto", border=thin_border),
+        NamedStyle(name="reporte_numero", border=thin_border, number_format='#,##0'),
+        NamedStyle(name="reporte_valor", border=thin_border, number_format='#,##0', font=Font(bold=True)),
     ]
+    ws = wb.worksheets[0]
+    prototypes = {}
+    for style in styles:
+        wb.add_named_style(style)
+        cell = WriteOnlyCell(ws)
+        cell.style = style.name
+        prototypes[style.name] = cell._style
+    return prototypes
+
+
+def _report_column_widths(data: List[dict], months: List[tuple]) -> List[float]:
+    """Widths from the longest header/value per static column; month columns are fixed"""
+    widths = [len(header) + 2 for header, _ in STATIC_HEADERS]
+    text_columns = [(i, key) for i, (_, key) in enumerate(STATIC_HEADERS) if key != 'valor_mensual']
+    for item in data:
+        for i, key in text_columns:
+            length = len(item[key] or '') + 2
+            if length > widths[i]:
+                widths[i] = length
+    widths = [min(max(w, MIN_COLUMN_WIDTH), MAX_COLUMN_WIDTH) for w in widths]
+    return widths + [MIN_COLUMN_WIDTH] * (2 * len(months))
+
+
+def create_excel_report(data: List[dict], months: List[tuple], titulo: str = "Reporte de Contratos"):
+    """
+    Create Excel workbook with report data.
+    Write-only workbook: rows go straight to a temp file as they are added,
+    so memory stays flat regardless of contracts x months. Cells reuse the
+    named styles from _report_styles.
+    """
+    if not EXCEL_AVAILABLE:
+        raise ImportError("openpyxl is not installed. Run: pip install openpyxl")
+    
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Reporte")
+    styles = _report_styles(wb)
+    
+    def cell(value, style):
+        c = WriteOnlyCell(ws, value=value)
+        c._style = styles[style]
+        return c
+    
+    # Column widths and frozen header must be set before the first row
+    for col_idx, width in enumerate(_report_column_widths(data, months), 1):
+        ws.column_dimensions[get_column_letter(col_idx)].width = width
+    ws.freeze_panes = 'A2'
     
-    # Write headers
-    col = 1
-    for header in static_headers:
-        cell = ws.cell(row=1, column=col, value=header)
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-        col += 1
-    
-    # Dynamic month headers
+    # Headers: static, then Valor/Fecha per month
+    header_row = [cell(header, "reporte_header") for header, _ in STATIC_HEADERS]
+    month_keys = []
     for year, month in months:
         month_name = MESES[month]
         year_short = str(year)[-2:]  # Last 2 digits of year
-        
-        # Valor column
-        cell = ws.cell(row=1, column=col, value=f"Valor {month_name} {year_short}")
-        cell.font = header_font
-        cell.fill = month_header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-        col += 1
-        
-        # Fecha column
-        cell = ws.cell(row=1, column=col, value=f"Fecha {month_name} {year_short}")
-        cell.font = header_font
-        cell.fill = date_header_fill
-        cell.alignment = header_alignment
-        cell.border = thin_border
-        col += 1
-    
-    # Write data rows
-    row_num = 2
+        header_row.append(cell(f"Valor {month_name} {year_short}", "reporte_header_valor"))
+        header_row.append(cell(f"Fecha {month_name} {year_short}", "reporte_header_fecha"))
+        month_keys.append(f"{year}-{month:02d}")
+    ws.append(header_row)
+    
+    text_keys = [key for _, key in STATIC_HEADERS if key != 'valor_mensual']
     for item in data:
-        col = 1
+        row = [cell(item[key], "reporte_texto") for key in text_keys]
+        row.append(cell(item['valor_mensual'], "reporte_numero"))
         
-        # Static columns
-        ws.cell(row=row_num, column=col, value=item['nit_proveedor']).border = thin_border; col += 1
-        ws.cell(row=row_num, column=col, value=item['nombre_proveedor']).border = thin_border; col += 1
-        ws.cell(row=row_num, column=col, value=item['cod_oficina']).border = thin_border; col += 1
-        ws.cell(row=row_num, column=col, value=item['nombre_oficina']).border = thin_border; col += 1
-        ws.cell(row=row_num, column=col, value=item['direccion']).border = thin_border; col += 1
-        ws.cell(row=row_num, column=col, value=item['ciudad']).border = thin_border; col += 1
-        ws.cell(row=row_num, column=col, value=item['tipo']).border = thin_border; col += 1
-        ws.cell(row=row_num, column=col, value=item['num_contrato']).border = thin_border; col += 1
-        ws.cell(row=row_num, column=col, value=item['tipo_plan']).border = thin_border; col += 1
-        ws.cell(row=row_num, column=col, value=item['tipo_canal']).border = thin_border; col += 1
-        
-        valor_cell = ws.cell(row=row_num, column=col, value=item['valor_mensual'])
-        valor_cell.border = thin_border
-        valor_cell.number_format = '#,##0'
-        col += 1
-        
-        # Dynamic month columns
-        for year, month in months:
-            # Use same string key format as data
-            month_key = f"{year}-{month:02d}"
-            pago_data = item['pagos'].get(month_key, {})
-            
-            # Valor
-            valor = pago_data.get('valor', 0)
-            valor_cell = ws.cell(row=row_num, column=col, value=valor if valor > 0 else '')
-            valor_cell.border = thin_border
+        pagos = item['pagos']
+        for month_key in month_keys:
+            pago_data = pagos.get(month_key)
+            valor = pago_data['valor'] if pago_data else 0
             if valor > 0:
-                valor_cell.number_format = '#,##0'
-                valor_cell.font = currency_font
-            col += 1
-            
-            # Fecha
-            fecha = pago_data.get('fecha')
-            fecha_cell = ws.cell(row=row_num, column=col, value=fecha if fecha else '')
-            fecha_cell.border = thin_border
-            col += 1
+                row.append(cell(valor, "reporte_valor"))
+            else:
+                row.append(cell('', "reporte_texto"))
+            fecha = pago_data['fecha'] if pago_data else None
+            row.append(cell(fecha if fecha else '', "reporte_texto"))
         
-        row_num += 1
-    
-    # Adjust column widths
-    for col_idx, header in enumerate(static_headers, 1):
-        ws.column_dimensions[get_column_letter(col_idx)].width = max(len(header) + 2, 15)
-    
-    # Adjust month columns
-    month_col_start = len(static_headers) + 1
-    for i, (year, month) in enumerate(months):
-        valor_col = month_col_start + (i * 2)
-        fecha_col = valor_col + 1
-        ws.column_dimensions[get_column_letter(valor_col)].width = 15
-        ws.column_dimensions[get_column_letter(fecha_col)].width = 15
-    
-    # Freeze first row
-    ws.freeze_panes = 'A2'
+        ws.append(row)
     
     return wb
 
 
+def save_excel_report(data: List[dict], months: List[tuple], destination):
+    """Render the report and save it to destination (runs in the excel_render pool)"""
+    wb = create_excel_report(data, months)
+    wb.save(destination)
+
+
+def report_filename() -> str:
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    return f"reporte_contratos_{timestamp}.xlsx"
+
+
 @router.get("/reportes/preview")
 async def preview_report(
     proveedor_id: Optional[int] = Query(None, description="Filtrar por proveedor"),
@@ -365,15 +544,19 @@ async def preview_report(
     tipo: Optional[str] = Query(None, description="Tipo de contrato (Fijo, Movil, Colaboracion, Leasing)"),
     estado: Optional[str] = Query(None, description="Estado del contrato (ACTIVO, CANCELADO)"),
     ciudad: Optional[str] = Query(None, description="Ciudad de la oficina"),
+    skip: int = Query(0, ge=0, description="Registros a omitir"),
+    limit: int = Query(PREVIEW_PAGE_SIZE, ge=1, le=PREVIEW_MAX_PAGE_SIZE, description="Registros por pagina"),
     db: AsyncSession = Depends(get_db)
 ):
-    """Preview report data as JSON"""
+    """Preview one page of the report as JSON (total_registros counts every contract)"""
     # Parse dates
     fecha_desde_dt = datetime.strptime(fecha_desde, '%Y-%m-%d').date() if fecha_desde else None
     fecha_hasta_dt = datetime.strptime(fecha_hasta, '%Y-%m-%d').date() if fecha_hasta else None
     
-    data, months = await get_report_data(
+    data, months, total = await get_report_page(
         db,
+        skip=skip,
+        limit=limit,
         proveedor_id=proveedor_id,
         oficina_id=oficina_id,
         fecha_desde=fecha_desde_dt,
@@ -391,11 +574,14 @@ async def preview_report(
         for y, m in months
     ]
     
-    return {
-        "total_registros": len(data),
+    # Rendered directly with orjson (Decimal/date rows, no jsonable_encoder pass)
+    return FastJSONResponse({
+        "total_registros": total,
+        "skip": skip,
+        "limit": limit,
         "meses": months_formatted,
-        "data": data[:50]  # Return first 50 for preview
-    }
+        "data": data
+    })
 
 
 @router.get("/reportes/export")
@@ -409,16 +595,37 @@ async def export_report_excel(
     tipo: Optional[str] = Query(None, description="Tipo de contrato (Fijo, Movil, Colaboracion, Leasing)"),
     estado: Optional[str] = Query(None, description="Estado del contrato (ACTIVO, CANCELADO)"),
     ciudad: Optional[str] = Query(None, description="Ciudad de la oficina"),
+    formato: str = Query("xlsx", alias="format", description="xlsx, csv o parquet"),
     db: AsyncSession = Depends(get_db)
 ):
-    """Export report to Excel file"""
-    if not EXCEL_AVAILABLE:
-        return {"error": "openpyxl not installed. Run: pip install openpyxl"}
+    """
+    Export report to Excel file.
+    For full-year/all-offices reports use POST /exportaciones/reportes (background job).
     
+    format=csv / format=parquet stream plain rows instead (months pivoted as
+    valor_YYYY_MM / fecha_YYYY_MM columns), without building a workbook.
+    """
     # Parse dates
     fecha_desde_dt = datetime.strptime(fecha_desde, '%Y-%m-%d').date() if fecha_desde else None
     fecha_hasta_dt = datetime.strptime(fecha_hasta, '%Y-%m-%d').date() if fecha_hasta else None
     
+    if formato != "xlsx":
+        tabular_export.check_format(formato)
+        start_date, end_date, months = get_report_months(fecha_desde_dt, fecha_hasta_dt, año, mes)
+        batches = stream_report_rows(
+            months, start_date, end_date,
+            proveedor_id=proveedor_id,
+            oficina_id=oficina_id,
+            tipo=tipo,
+            estado=estado,
+            ciudad=ciudad
+        )
+        basename = f"reporte_contratos_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+        return tabular_export.streaming_response(formato, report_columns(months), batches, basename)
+    
+    if not EXCEL_AVAILABLE:
+        return {"error": "openpyxl not installed. Run: pip install openpyxl"}
+    
     data, months = await get_report_data(
         db,
         proveedor_id=proveedor_id,
@@ -432,28 +639,28 @@ async def export_report_excel(
         ciudad=ciudad
     )
     
-    # Create Excel
-    wb = create_excel_report(data, months)
-    
-    # Save to buffer
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
+    # Create Excel in the render pool (off the event loop)
+    try:
+        path = await excel_render.render_to_file("reportes", save_excel_report, data, months)
+    except excel_render.ExcelRenderBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
     
-    # Generate filename
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"reporte_contratos_{timestamp}.xlsx"
-    
-    return StreamingResponse(
-        buffer,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    return excel_render.file_response(
+        path,
+        headers={"Content-Disposition": f"attachment; filename={report_filename()}"}
     )
 
 
 @router.get("/reportes/filtros")
-async def get_report_filters(db: AsyncSession = Depends(get_db)):
-    """Get available filter options for reports"""
+async def get_report_filters(request: Request, db: AsyncSession = Depends(get_db)):
+    """Get available filter options for reports (cached, see response_cache)"""
+    return await response_cache.respond(
+        request, ("proveedores", "oficinas", "pagos"), lambda: build_report_filters(db)
+    )
+
+
+async def build_report_filters(db: AsyncSession):
+    """Filter options: proveedores, oficinas, years with payments and cities"""
     # Get all providers
     proveedores_result = await db.execute(
         select(models.Proveedor).order_by(models.Proveedor.nombre)
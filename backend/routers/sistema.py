@@ -0,0 +1,89 @@
+"""
+Sistema Router - Runtime diagnostics for the API (connection pools, outbound calls, Oracle)
+"""
+from fastapi import APIRouter
+
+from database import get_pool_status
+from excel_render import get_render_status
+from http_clients import http_clients
+from oracle_database import get_oracle_status
+from response_cache import response_cache
+import autocomplete
+
+router = APIRouter()
+
+
+@router.get("/sistema/http-clients")
+async def get_http_clients_stats():
+    """
+    Per-target stats for the shared outbound HTTP clients.
+    Includes request count, errors and latency (avg/max/last) in milliseconds.
+    """
+    return {
+        "success": True,
+        "targets": http_clients.stats()
+    }
+
+
+@router.get("/sistema/db-pool")
+async def get_db_pool_stats():
+    """
+    Postgres connection pool stats.
+    Shows pool occupancy (size, checked in/out, overflow) and how long
+    connections are held per checkout.
+    """
+    return {
+        "success": True,
+        "pool": get_pool_status()
+    }
+
+
+@router.get("/sistema/oracle")
+async def get_oracle_pool_stats():
+    """
+    Oracle thread pool stats.
+    Shows how many Oracle calls are running, timeouts and latency (avg/max) in milliseconds.
+    """
+    return {
+        "success": True,
+        "oracle": get_oracle_status()
+    }
+
+
+@router.get("/sistema/excel-render")
+async def get_excel_render_stats():
+    """
+    Excel render pool stats.
+    Shows renders running, requests turned away while busy and render time (avg/max) in milliseconds.
+    """
+    return {
+        "success": True,
+        "render": get_render_status()
+    }
+
+
+@router.get("/sistema/response-cache")
+async def get_response_cache_stats():
+    """
+    Response cache stats: entries per tag, hits, misses and 304s served.
+    """
+    return {
+        "success": True,
+        "cache": response_cache.stats()
+    }
+
+
+@router.get("/sistema/autocomplete")
+async def get_autocomplete_stats():
+    """Size and age of the in-memory typeahead indexes"""
+    return {
+        "success": True,
+        "indexes": {name: index.stats() for name, index in autocomplete.INDEXES.items()}
+    }
+
+
+@router.delete("/sistema/response-cache")
+async def clear_response_cache():
+    """Drop every cached response in this worker"""
+    response_cache.clear()
+    return {"success": True}
@@ -0,0 +1,178 @@
+"""
+Schema Migrations Module
+Applies the versioned SQL files in migrations/ in order and records them in
+the schema_migrations table.
+
+Files are named NNNN_description.sql. Each file runs in its own transaction
+and is applied only once.
+
+Usage:
+    python schema_migrations.py            # apply pending migrations
+    python schema_migrations.py --status   # list applied/pending migrations
+"""
+import asyncio
+import hashlib
+import os
+import re
+import sys
+from typing import List, Dict, Any
+from dotenv import load_dotenv
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+load_dotenv()
+
+# Apply pending migrations on startup (disable when they are run as a deploy step)
+DB_AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "true").lower() in ("1", "true", "si", "yes")
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+MIGRATION_FILE_PATTERN = re.compile(r'^(\d{4})_(.+)\.sql$')
+
+# Arbitrary key so that only one worker applies migrations at a time (Postgres)
+MIGRATION_LOCK_KEY = 20250101
+
+CREATE_VERSION_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR(255) NOT NULL,
+        checksum VARCHAR(64),
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+def discover_migrations() -> List[Dict[str, Any]]:
+    """Return the migration files sorted by version"""
+    migrations = []
+    for filename in os.listdir(MIGRATIONS_DIR):
+        match = MIGRATION_FILE_PATTERN.match(filename)
+        if not match:
+            continue
+        path = os.path.join(MIGRATIONS_DIR, filename)
+        with open(path, encoding='utf-8') as f:
+            sql = f.read()
+        migrations.append({
+            "version": int(match.group(1)),
+            "name": match.group(2),
+            "path": path,
+            "sql": sql,
+            "checksum": hashlib.sha256(sql.encode('utf-8')).hexdigest()
+        })
+    migrations.sort(key=lambda m: m["version"])
+    return migrations
+
+
+def split_sql_statements(sql: str) -> List[str]:
+    """
+    Split a SQL file into statements.
+    Removes -- comments and splits on semicolons outside of quoted strings.
+    """
+    statements = []
+    current = []
+    in_string = False
+    i = 0
+    while i < len(sql):
+        char = sql[i]
+        if in_string:
+            current.append(char)
+            if char == "'":
+                in_string = False
+        elif char == "'":
+            in_string = True
+            current.append(char)
+        elif char == '-' and sql[i:i + 2] == '--':
+            # Skip to end of line
+            newline = sql.find('\n', i)
+            i = len(sql) if newline == -1 else newline
+            continue
+        elif char == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+        else:
+            current.append(char)
+        i += 1
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+async def get_applied_versions(conn) -> Dict[int, str]:
+    result = await conn.execute(text("SELECT version, checksum FROM schema_migrations"))
+    return {row[0]: row[1] for row in result.all()}
+
+
+async def run_migrations(engine: AsyncEngine) -> List[str]:
+    """
+    Apply all pending migrations.
+    Returns the list of applied migration file names.
+    """
+    applied_now = []
+    is_postgres = engine.dialect.name == 'postgresql'
+
+    async with engine.begin() as conn:
+        await conn.execute(text(CREATE_VERSION_TABLE))
+
+    for migration in discover_migrations():
+        async with engine.begin() as conn:
+            if is_postgres:
+                # Released automatically at the end of the transaction
+                await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+
+            applied = await get_applied_versions(conn)
+            if migration["version"] in applied:
+                if applied[migration["version"]] != migration["checksum"]:
+                    print(f"Warning: migration {migration['version']:04d}_{migration['name']} changed after being applied")
+                continue
+
+            for statement in split_sql_statements(migration["sql"]):
+                await conn.exec_driver_sql(statement)
+
+            await conn.execute(
+                text("INSERT INTO schema_migrations (version, name, checksum) VALUES (:version, :name, :checksum)"),
+                {"version": migration["version"], "name": migration["name"], "checksum": migration["checksum"]}
+            )
+            applied_now.append(os.path.basename(migration["path"]))
+            print(f"[INFO] Migracion aplicada: {os.path.basename(migration['path'])}")
+
+    return applied_now
+
+
+async def migration_status(engine: AsyncEngine) -> List[Dict[str, Any]]:
+    """List every migration file with its applied state"""
+    async with engine.begin() as conn:
+        await conn.execute(text(CREATE_VERSION_TABLE))
+        applied = await get_applied_versions(conn)
+
+    return [
+        {
+            "version": m["version"],
+            "name": m["name"],
+            "applied": m["version"] in applied,
+            "checksum_ok": applied.get(m["version"], m["checksum"]) == m["checksum"]
+        }
+        for m in discover_migrations()
+    ]
+
+
+async def main():
+    from database import engine
+
+    if "--status" in sys.argv:
+        for m in await migration_status(engine):
+            estado = "APLICADA" if m["applied"] else "PENDIENTE"
+            aviso = "" if m["checksum_ok"] else " (modificada)"
+            print(f"{m['version']:04d}_{m['name']}: {estado}{aviso}")
+    else:
+        applied = await run_migrations(engine)
+        if not applied:
+            print("[INFO] No hay migraciones pendientes")
+        else:
+            print(f"[SUCCESS] {len(applied)} migraciones aplicadas")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
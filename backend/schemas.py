@@ -31,6 +31,7 @@ class OficinaCreate(OficinaBase):
 
 class Oficina(OficinaBase):
     id: int
+    codigo_ccosto: Optional[str] = None
     class Config:
         from_attributes = True
 
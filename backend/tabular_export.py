@@ -0,0 +1,147 @@
+"""
+Tabular Export Module
+Streaming CSV and Parquet responses for BI tools.
+
+Exports produce rows in batches (an async iterator of lists of tuples,
+usually one batch per server-side cursor partition). Each batch is
+encoded and sent as soon as it is ready, so neither the dataset nor the
+file is held in memory:
+- CSV: UTF-8, comma separated, header row first
+- Parquet: one row group per batch (needs pyarrow, optional)
+
+Column types (for Parquet): "str", "int", "float", "date", "datetime".
+"""
+import csv
+import io
+from datetime import date, datetime
+from decimal import Decimal
+from typing import AsyncIterator, List, Sequence, Tuple
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+# Try to import pyarrow for Parquet output
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+FORMATS = ("csv", "parquet")
+
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+PARQUET_MEDIA_TYPE = "application/vnd.apache.parquet"
+
+# (name, type) per column
+Columns = Sequence[Tuple[str, str]]
+RowBatches = AsyncIterator[List[tuple]]
+
+
+def _csv_value(value):
+    if isinstance(value, Decimal):
+        # Plain notation: no exponent for values like 1E+2
+        return format(value, "f")
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+async def csv_stream(columns: Columns, batches: RowBatches) -> AsyncIterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    writer.writerow([name for name, _ in columns])
+    yield buffer.getvalue().encode("utf-8")
+    async for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_value(v) for v in row] for row in rows)
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that keeps what was written until drain() (Parquet writer sink)"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _arrow_schema(columns: Columns):
+    types = {
+        "str": pa.string(),
+        "int": pa.int64(),
+        "float": pa.float64(),
+        "date": pa.date32(),
+        "datetime": pa.timestamp("us"),
+    }
+    return pa.schema([(name, types[kind]) for name, kind in columns])
+
+
+def _arrow_value(value, kind: str):
+    if value is None or value == "":
+        return None
+    if kind == "float":
+        return float(value)
+    if kind == "date" and isinstance(value, str):
+        return date.fromisoformat(value)
+    if kind == "date" and isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+async def parquet_stream(columns: Columns, batches: RowBatches) -> AsyncIterator[bytes]:
+    schema = _arrow_schema(columns)
+    kinds = [kind for _, kind in columns]
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        async for rows in batches:
+            if not rows:
+                continue
+            arrays = [
+                pa.array([_arrow_value(row[i], kind) for row in rows], type=schema.field(i).type)
+                for i, kind in enumerate(kinds)
+            ]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def check_format(formato: str):
+    """Raise 400/500 for unknown formats or Parquet without pyarrow"""
+    if formato not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Formato no soportado: {formato}")
+    if formato == "parquet" and not PARQUET_AVAILABLE:
+        raise HTTPException(status_code=500, detail="pyarrow no esta instalado. Run: pip install pyarrow")
+
+
+def streaming_response(formato: str, columns: Columns, batches: RowBatches, basename: str) -> StreamingResponse:
+    """CSV or Parquet download streamed batch by batch (call check_format first)"""
+    if formato == "parquet":
+        body, media_type = parquet_stream(columns, batches), PARQUET_MEDIA_TYPE
+    else:
+        body, media_type = csv_stream(columns, batches), CSV_MEDIA_TYPE
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={basename}.{formato}"}
+    )
@@ -0,0 +1,94 @@
+"""
+Shared fixtures: the app on a throwaway database.
+
+Runs against a temporary SQLite file unless TEST_DATABASE_URL points to a
+Postgres database (its tables are dropped and recreated).
+Run from backend/:
+    python -m pytest tests
+"""
+import asyncio
+import itertools
+import os
+import sys
+import tempfile
+
+# Modules of the app are imported as top-level modules (uvicorn main:app)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Before the app modules read their settings: no Oracle, no migrations
+os.environ["DATABASE_URL"] = os.getenv(
+    "TEST_DATABASE_URL",
+    f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(prefix='facturacion_tests_'), 'test.db')}",
+)
+os.environ["DB_AUTO_MIGRATE"] = "false"
+os.environ["MANAGER_SYNC_ON_STARTUP"] = "false"
+os.environ["MANAGER_SYNC_INTERVAL_MIN"] = "0"
+
+import pytest
+from fastapi.testclient import TestClient
+
+pytest_plugins = ["pytest_query_budget"]
+
+_seq = itertools.count(1)
+
+
+async def _create_schema():
+    from database import Base, engine
+    import models  # noqa: F401 (registers the tables)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    await engine.dispose()
+
+
+@pytest.fixture(scope="session")
+def client():
+    asyncio.run(_create_schema())
+    import main
+
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def proveedor_con_contrato(client):
+    """A proveedor, an oficina and an active contrato between them"""
+    n = next(_seq)
+    proveedor = client.post("/api/proveedores/", json={"nit": f"900{n:06d}", "nombre": f"Proveedor {n}"}).json()
+    # Without cod_oficina: no centro de costo lookup in Manager
+    oficina = client.post("/api/oficinas/", json={"nombre": f"Oficina {n}", "ciudad": "Medellin"}).json()
+    contrato = client.post("/api/contratos/", json={
+        "proveedor_id": proveedor["id"],
+        "oficina_id": oficina["id"],
+        "num_contrato": f"CT-{n:06d}",
+        "estado": "ACTIVO",
+        "valor_mensual": "1000000",
+    }).json()
+    return proveedor, oficina, contrato
+
+
+@pytest.fixture
+def factura(client, proveedor_con_contrato):
+    """A PENDIENTE factura of the proveedor_con_contrato proveedor"""
+    proveedor, _, _ = proveedor_con_contrato
+    response = client.post("/api/facturas/", json={
+        "proveedor_id": proveedor["id"],
+        "numero_factura": f"FE-{next(_seq)}",
+        "fecha_factura": "2025-01-15",
+        "valor": "1000000",
+    })
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+@pytest.fixture
+def factura_con_oficina(client, proveedor_con_contrato, factura):
+    """The factura with the oficina assigned; returns (factura, asignacion_id)"""
+    _, oficina, _ = proveedor_con_contrato
+    response = client.put(f"/api/facturas/{factura['id']}/oficinas-multiples", json={
+        "oficinas": [{"oficina_id": oficina["id"], "valor": "1000000"}],
+    })
+    assert response.status_code == 200, response.text
+    asignaciones = client.get(f"/api/facturas/{factura['id']}").json()["oficinas_asignadas"]
+    return factura, asignaciones[0]["id"]
@@ -0,0 +1,108 @@
+"""
+Causation ledgers and NUMEDOC blocks (no Manager needed: the Oracle
+insert is replaced where a test runs it).
+"""
+import asyncio
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from routers import archivo_plano
+from routers.archivo_plano import (
+    CausacionLoteProveedor,
+    CausacionLoteProveedorResultado,
+    FacturaArchivoPlano,
+    OficinaArchivoPlano,
+    build_causacion_ledger,
+    causacion_documentos,
+    causacion_lotes,
+)
+
+CCOSTOS = {"OF01": "1001", "OF02": "1002", "OF03": "1003"}
+
+
+def _factura(numero, *valores):
+    return FacturaArchivoPlano(
+        numero_factura=numero,
+        fecha_factura=date(2025, 1, 31),
+        oficinas=[OficinaArchivoPlano(cod_oficina=f"OF{i:02d}", valor=Decimal(v)) for i, v in enumerate(valores, 1)],
+    )
+
+
+def _proveedor(nit, *facturas, tiene_iva=True, porcentaje_retefuente=4):
+    return CausacionLoteProveedor(
+        proveedor_nit=nit, tiene_iva=tiene_iva, porcentaje_retefuente=porcentaje_retefuente, facturas=list(facturas)
+    )
+
+
+@pytest.mark.parametrize("tiene_iva", [True, False])
+@pytest.mark.parametrize("porcentaje_retefuente", [0, 4, 11])
+@pytest.mark.parametrize("valores", [("1000000",), ("333333", "777777"), ("123457", "98765", "1")])
+def test_ledger_balances(tiene_iva, porcentaje_retefuente, valores):
+    asientos = build_causacion_ledger(_factura("FE-1", *valores), tiene_iva, porcentaje_retefuente, CCOSTOS)
+    assert sum(a["debito"] for a in asientos) == sum(a["credito"] for a in asientos)
+    assert asientos[-1]["cuenta"] == "23355002"
+    assert ("24081003" in [a["cuenta"] for a in asientos]) == tiene_iva
+    assert ("23652501" in [a["cuenta"] for a in asientos]) == (porcentaje_retefuente > 0)
+
+
+def test_documentos_skip_facturas_without_offices():
+    facturas = [_factura("FE-1", "100000"), _factura("FE-2"), _factura("FE-3", "200000", "300000")]
+    documentos = causacion_documentos(facturas, 500, True, 4, CCOSTOS)
+    assert [(numedoc, factura.numero_factura) for numedoc, factura, _ in documentos] == [(500, "FE-1"), (501, "FE-3")]
+
+
+def test_lotes_get_contiguous_blocks_in_order():
+    proveedores = [
+        _proveedor("900001", _factura("A-1", "100000"), _factura("A-2"), _factura("A-3", "200000")),
+        _proveedor("900002", _factura("B-1")),
+        _proveedor("900003", _factura("C-1", "100000", "50000"), tiene_iva=False, porcentaje_retefuente=0),
+    ]
+    lotes = causacion_lotes(proveedores, 1000, CCOSTOS)
+
+    assert [(proveedor.proveedor_nit, bloque) for proveedor, bloque, _ in lotes] == [("900001", 1000), ("900003", 1002)]
+    numedocs = [numedoc for _, _, documentos in lotes for numedoc, _, _ in documentos]
+    assert numedocs == [1000, 1001, 1002]
+    for proveedor, bloque, documentos in lotes:
+        assert documentos[0][0] == bloque
+        for _, _, asientos in documentos:
+            assert sum(a["debito"] for a in asientos) == sum(a["credito"] for a in asientos)
+
+
+def test_lote_inserts_are_capped(monkeypatch):
+    running = []
+    peak = []
+    lock = threading.Lock()
+
+    def fake_insert(mngdoc, mngmcn):
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.05)
+        with lock:
+            running.pop()
+        return len(mngdoc), len(mngmcn)
+
+    monkeypatch.setattr(archivo_plano, "_insertar_causacion_oracle", fake_insert)
+    proveedores = [_proveedor(f"9000{i:02d}", _factura(f"F-{i}", "100000")) for i in range(6)]
+    lotes = causacion_lotes(proveedores, 1, CCOSTOS)
+    resultados = [
+        CausacionLoteProveedorResultado(
+            proveedor_nit=proveedor.proveedor_nit, proveedor_nombre=None, numedoc_inicial=bloque,
+            numedoc_final=bloque, total_facturas=1, total_debitos=0, total_creditos=0, insertado=False,
+            total_registros_mngdoc=0, total_registros_mngmcn=0
+        )
+        for proveedor, bloque, _ in lotes
+    ]
+
+    async def run():
+        # The module semaphore belongs to the app's event loop
+        monkeypatch.setattr(archivo_plano, "_insert_slots", asyncio.Semaphore(2))
+        await archivo_plano._insertar_lotes(lotes, resultados, "2025-01-31")
+
+    asyncio.run(run())
+    assert max(peak) == 2
+    assert all(r.insertado and r.total_registros_mngdoc == 1 for r in resultados)
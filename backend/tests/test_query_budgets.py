@@ -0,0 +1,39 @@
+"""
+Statement budgets of the factura flows that reload the factura after
+writing it (create -> get_factura, assign -> get_factura twice).
+Only the test body is counted, not the fixtures that seed the data.
+"""
+import pytest
+
+
+# proveedor check, INSERT, refresh, get_factura (factura + selectin loads)
+@pytest.mark.query_budget(6, max_duplicates=1)
+def test_create_factura(client, proveedor_con_contrato):
+    proveedor, _, _ = proveedor_con_contrato
+    response = client.post("/api/facturas/", json={
+        "proveedor_id": proveedor["id"],
+        "numero_factura": "FE-NUEVA",
+        "valor": "500000",
+    })
+    assert response.status_code == 200, response.text
+    assert response.json()["estado"] == "PENDIENTE"
+
+
+# get_factura, contrato lookup, UPDATE, get_factura again (the repeats)
+@pytest.mark.query_budget(11, max_duplicates=3)
+def test_asignar_oficina_a_factura(client, proveedor_con_contrato, factura):
+    _, oficina, contrato = proveedor_con_contrato
+    response = client.put(f"/api/facturas/{factura['id']}/asignar-oficina", json={"oficina_id": oficina["id"]})
+    assert response.status_code == 200, response.text
+    data = response.json()
+    assert data["estado"] == "ASIGNADA"
+    assert data["contrato_id"] == contrato["id"]
+
+
+# assignment, DELETE, remaining oficinas, get_factura, estado UPDATE
+@pytest.mark.query_budget(7, max_duplicates=0)
+def test_remove_oficina_from_factura(client, factura_con_oficina, query_record):
+    factura, asignacion_id = factura_con_oficina
+    response = client.delete(f"/api/facturas/{factura['id']}/oficinas/{asignacion_id}")
+    assert response.status_code == 200, response.text
+    assert [r.label for r in query_record.requests] == ["DELETE /api/facturas/{factura_id}/oficinas/{asignacion_id}"]
@@ -81,15 +81,12 @@ export default function UploadFacturaModal({ isOpen, onClose, onSuccess }: Uploa
             }
 
             try {
-                const res = await fetch(`${API_URL}/proveedores/?limit=100`);
+                // NIT / name typeahead served by the backend index
+                const params = new URLSearchParams({ q: formData.proveedor_nit, limit: '20' });
+                const res = await fetch(`${API_URL}/autocomplete/proveedores?${params}`);
                 if (res.ok) {
-                    const data: Proveedor[] = await res.json();
-                    const searchTerm = formData.proveedor_nit.toLowerCase();
-                    const filtered = data.filter(p =>
-                        p.nit.toLowerCase().includes(searchTerm) ||
-                        p.nombre.toLowerCase().includes(searchTerm)
-                    );
-                    setProveedores(filtered);
+                    const data: { data: Proveedor[] } = await res.json();
+                    setProveedores(data.data);
                 }
             } catch (e) {
                 console.error('Error searching proveedores:', e);
@@ -34,7 +34,6 @@ export default function FacturasPage() {
     const [filterOficinaId, setFilterOficinaId] = useState<number | null>(null);
     const [filterOficinaSearch, setFilterOficinaSearch] = useState('');
     const [filterOficinaSelected, setFilterOficinaSelected] = useState<Oficina | null>(null);
-    const [allOficinas, setAllOficinas] = useState<Oficina[]>([]);
     const [filteredOficinas, setFilteredOficinas] = useState<Oficina[]>([]);
     const [showOficinaSuggestions, setShowOficinaSuggestions] = useState(false);
 
@@ -99,6 +98,8 @@ export default function FacturasPage() {
     // Multi-select for consolidado
     const [selectedFacturaIds, setSelectedFacturaIds] = useState<Set<number>>(new Set());
     const [generatingConsolidado, setGeneratingConsolidado] = useState(false);
+    // Consolidado of every factura matching the filters (all pages): their total, null = selected ids
+    const [consolidadoFiltroTotal, setConsolidadoFiltroTotal] = useState<number | null>(null);
 
     // Archivo Plano generation
     const [generatingArchivoPlano, setGeneratingArchivoPlano] = useState(false);
@@ -147,14 +148,30 @@ export default function FacturasPage() {
         numedoc_inicial: number;
         numedoc_final: number;
     };
+    type CausacionRequestBody = {
+        factura_ids: number[];
+        numedoc?: number;
+        tiene_iva?: boolean;
+        porcentaje_retefuente?: number;
+    };
     const [isCausacionModalOpen, setIsCausacionModalOpen] = useState(false);
     const [loadingCausacionPreview, setLoadingCausacionPreview] = useState(false);
     const [causacionPreviewData, setCausacionPreviewData] = useState<CausacionPreviewData | null>(null);
-    const [causacionConfig, setCausacionConfig] = useState({
+    const [causacionConfig, setCausacionConfig] = useState<{
+        tiene_iva: boolean;
+        porcentaje_retefuente: number;
+        numedoc: number | null;
+    }>({
         tiene_iva: true,
         porcentaje_retefuente: 0,
-        numedoc: 1290
+        numedoc: null
     });
+    // Fields the user changed: only those are sent, the rest is decided by the backend
+    const [causacionEditado, setCausacionEditado] = useState({ numedoc: false, impuestos: false });
+    // Why the contracts do not decide the taxes (422 from the backend)
+    const [causacionAviso, setCausacionAviso] = useState<string | null>(null);
+    // Body of the preview shown, reused by the insert
+    const [causacionRequest, setCausacionRequest] = useState<CausacionRequestBody | null>(null);
     const [showCausacionTable, setShowCausacionTable] = useState(false);
 
     // Historial modal - previous invoices for same proveedor + oficina
@@ -201,6 +218,7 @@ export default function FacturasPage() {
 
     // Toggle factura selection
     const toggleFacturaSelection = (facturaId: number) => {
+        setConsolidadoFiltroTotal(null);
         setSelectedFacturaIds(prev => {
             const newSet = new Set(prev);
             if (newSet.has(facturaId)) {
@@ -214,6 +232,7 @@ export default function FacturasPage() {
 
     // Select/deselect all visible facturas
     const toggleSelectAll = () => {
+        setConsolidadoFiltroTotal(null);
         if (selectedFacturaIds.size === facturas.length) {
             setSelectedFacturaIds(new Set());
         } else {
@@ -223,19 +242,60 @@ export default function FacturasPage() {
 
     // Clear selection
     const clearSelection = () => {
+        setConsolidadoFiltroTotal(null);
         setSelectedFacturaIds(new Set());
     };
 
+    // Current filters in the /consolidado request format
+    const consolidadoFiltros = () => ({
+        estado: filterEstado || null,
+        fecha_desde: filterFechaDesde || null,
+        fecha_hasta: filterFechaHasta || null,
+        oficina_id: filterOficinaId
+    });
+
+    // Every visible factura selected, more pages and a filter (no free-text search) applied
+    const puedeSeleccionarFiltro = hasMore && !search.trim() && facturas.length > 0
+        && facturas.every(f => selectedFacturaIds.has(f.id))
+        && Boolean(filterEstado || filterFechaDesde || filterFechaHasta || filterOficinaId);
+
+    // Explicit "select every factura of the filter" for the consolidado
+    const selectAllFiltro = async () => {
+        try {
+            const res = await fetch(`${API_URL}/consolidado/contar`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify(consolidadoFiltros())
+            });
+            const data = await res.json();
+            if (res.ok) {
+                setConsolidadoFiltroTotal(data.total);
+            } else {
+                alert(`Error: ${data.detail || 'No se pudieron contar las facturas del filtro'}`);
+            }
+        } catch (error) {
+            console.error('Error counting facturas', error);
+        }
+    };
+
     // Generate consolidado Excel
     const generateConsolidado = async () => {
         if (selectedFacturaIds.size === 0) return;
 
+        if (consolidadoFiltroTotal !== null && !window.confirm(
+            `Se generará el consolidado de las ${consolidadoFiltroTotal} facturas que coinciden con los filtros (todas las páginas).\n\n¿Desea continuar?`
+        )) return;
+
+        const body = consolidadoFiltroTotal !== null
+            ? consolidadoFiltros()
+            : { factura_ids: Array.from(selectedFacturaIds) };
+
         setGeneratingConsolidado(true);
         try {
             const res = await fetch(`${API_URL}/consolidado/generar`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ factura_ids: Array.from(selectedFacturaIds) })
+                body: JSON.stringify(body)
             });
 
             if (res.ok) {
@@ -385,84 +445,48 @@ export default function FacturasPage() {
     const openCausacionModal = async () => {
         if (selectedFacturaIds.size === 0) return;
 
-        // Get selected facturas
-        const selectedFacturasData = facturas.filter(f => selectedFacturaIds.has(f.id));
-
-        // Validate: all must be from same proveedor
-        const proveedores = new Set(selectedFacturasData.map(f => f.proveedor_id));
-        if (proveedores.size > 1) {
-            alert('Todas las facturas seleccionadas deben ser del mismo proveedor');
-            return;
-        }
-
-        // Check that at least one factura has assigned offices
-        let hasOfficinas = false;
-        let firstContrato: { tiene_iva?: string; tiene_retefuente?: string; retefuente_pct?: number } | null = null;
-
-        for (const factura of selectedFacturasData) {
-            if (factura.oficinas_asignadas && factura.oficinas_asignadas.length > 0) {
-                for (const oa of factura.oficinas_asignadas) {
-                    if (oa.oficina?.cod_oficina && oa.valor) {
-                        hasOfficinas = true;
-                        if (!firstContrato && oa.contrato) {
-                            firstContrato = oa.contrato;
-                        }
-                        break;
-                    }
-                }
-            }
-            if (hasOfficinas && firstContrato) break;
-        }
-
-        if (!hasOfficinas) {
-            alert('Las facturas seleccionadas no tienen oficinas asignadas con código y valor');
-            return;
-        }
-
-        // Pre-fill IVA and Retefuente from contract data
-        let tieneIva = true;
-        let porcentajeRetefuente = 0;
-
-        if (firstContrato) {
-            tieneIva = firstContrato.tiene_iva === 'si';
-            if (firstContrato.tiene_retefuente === 'si' && firstContrato.retefuente_pct) {
-                porcentajeRetefuente = firstContrato.retefuente_pct;
-            }
-        }
-
         // Reset state
         setCausacionPreviewData(null);
         setShowCausacionTable(false);
-        setCausacionConfig({
-            tiene_iva: tieneIva,
-            porcentaje_retefuente: porcentajeRetefuente,
-            numedoc: 1290
-        });
+        setCausacionAviso(null);
+        setCausacionEditado({ numedoc: false, impuestos: false });
+        setCausacionConfig({ tiene_iva: true, porcentaje_retefuente: 0, numedoc: null });
+        setConsecutivoManager({ consecutivo: null, nombre_documento: null, cargado: false });
 
         // Open modal
         setIsCausacionModalOpen(true);
 
-        // Load consecutivo
+        // Proveedor, taxes (from the contracts) and next NUMEDOC are decided by the backend
         setLoadingConsecutivo(true);
         try {
-            const res = await fetch(`${API_URL}/consecutivo-documento/DC07`);
+            const res = await fetch(`${API_URL}/causacion-manager/facturas/preview`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ factura_ids: Array.from(selectedFacturaIds) })
+            });
+            const data = await res.json();
+
             if (res.ok) {
-                const data = await res.json();
-                if (data.success && data.data) {
-                    const nuevoConsecutivo = (data.data.consecutivo_actual || 0) + 1;
-                    setConsecutivoManager({
-                        consecutivo: nuevoConsecutivo,
-                        nombre_documento: data.data.nombre_documento,
-                        cargado: true
-                    });
-                    setCausacionConfig(prev => ({
-                        ...prev,
-                        numedoc: nuevoConsecutivo
-                    }));
-                }
+                setCausacionConfig({
+                    tiene_iva: data.tiene_iva,
+                    porcentaje_retefuente: data.porcentaje_retefuente,
+                    numedoc: data.numedoc_inicial
+                });
+                setConsecutivoManager({
+                    consecutivo: data.numedoc_inicial,
+                    nombre_documento: 'DC07',
+                    cargado: true
+                });
+            } else if (res.status === 422) {
+                // The contracts do not decide IVA/retefuente: the user has to choose them
+                setCausacionAviso(data.detail);
+                setCausacionEditado(prev => ({ ...prev, impuestos: true }));
+            } else {
+                setIsCausacionModalOpen(false);
+                alert(`Error: ${data.detail || 'No se pudo preparar la causación'}`);
             }
         } catch (error) {
-            console.error('Error loading consecutivo from Manager', error);
+            console.error('Error loading causacion defaults', error);
         } finally {
             setLoadingConsecutivo(false);
         }
@@ -473,50 +497,18 @@ export default function FacturasPage() {
         setLoadingCausacionPreview(true);
 
         try {
-            const selectedFacturasData = facturas.filter(f => selectedFacturaIds.has(f.id));
-            const firstFactura = selectedFacturasData[0];
-            const proveedorNit = firstFactura.proveedor?.nit || '';
-            const proveedorNombre = firstFactura.proveedor?.nombre || '';
-
-            // Build facturas array with grouped offices
-            const facturasForRequest: Array<{
-                numero_factura: string;
-                fecha_factura: string | null;
-                oficinas: Array<{ cod_oficina: string; valor: number; nombre_oficina: string }>;
-            }> = [];
-
-            for (const factura of selectedFacturasData) {
-                const oficinas: Array<{ cod_oficina: string; valor: number; nombre_oficina: string }> = [];
-                if (factura.oficinas_asignadas && factura.oficinas_asignadas.length > 0) {
-                    for (const oa of factura.oficinas_asignadas) {
-                        if (oa.oficina?.cod_oficina && oa.valor) {
-                            oficinas.push({
-                                cod_oficina: oa.oficina.cod_oficina,
-                                valor: oa.valor,
-                                nombre_oficina: oa.oficina.nombre || oa.oficina.cod_oficina
-                            });
-                        }
-                    }
-                }
-                if (oficinas.length > 0) {
-                    facturasForRequest.push({
-                        numero_factura: factura.numero_factura || '',
-                        fecha_factura: factura.fecha_factura || null,
-                        oficinas: oficinas
-                    });
-                }
+            // Offices, values and NIT are read by the backend from the stored facturas;
+            // NUMEDOC and taxes only go when the user changed them
+            const requestBody: CausacionRequestBody = { factura_ids: Array.from(selectedFacturaIds) };
+            if (causacionEditado.numedoc && causacionConfig.numedoc) {
+                requestBody.numedoc = causacionConfig.numedoc;
+            }
+            if (causacionEditado.impuestos) {
+                requestBody.tiene_iva = causacionConfig.tiene_iva;
+                requestBody.porcentaje_retefuente = causacionConfig.porcentaje_retefuente;
             }
 
-            const requestBody = {
-                proveedor_nit: proveedorNit,
-                proveedor_nombre: proveedorNombre,
-                tiene_iva: causacionConfig.tiene_iva,
-                porcentaje_retefuente: causacionConfig.porcentaje_retefuente,
-                numedoc: causacionConfig.numedoc,
-                facturas: facturasForRequest
-            };
-
-            const res = await fetch(`${API_URL}/causacion-manager/preview`, {
+            const res = await fetch(`${API_URL}/causacion-manager/facturas/preview`, {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
                 body: JSON.stringify(requestBody)
@@ -524,6 +516,7 @@ export default function FacturasPage() {
 
             if (res.ok) {
                 const data = await res.json();
+                setCausacionRequest(requestBody);
                 setCausacionPreviewData(data);
                 setShowCausacionTable(true);
             } else {
@@ -674,18 +667,6 @@ export default function FacturasPage() {
         }
     };
 
-    // Load all oficinas for filter dropdown
-    const loadAllOficinas = async () => {
-        try {
-            const res = await fetch(`${API_URL}/oficinas/?limit=500`);
-            if (res.ok) {
-                setAllOficinas(await res.json());
-            }
-        } catch (error) {
-            console.error("Failed to load oficinas", error);
-        }
-    };
-
     // Handle periodo change - set fechas automatically
     const handlePeriodoChange = (periodo: string) => {
         setFilterPeriodo(periodo);
@@ -710,6 +691,8 @@ export default function FacturasPage() {
 
     // Debounced search effect
     useEffect(() => {
+        // The filter-wide consolidado selection belongs to the previous filters
+        setConsolidadoFiltroTotal(null);
         const timer = setTimeout(() => {
             setPage(1);
             fetchFacturas(search, 1);
@@ -719,23 +702,28 @@ export default function FacturasPage() {
 
     useEffect(() => {
         fetchStats();
-        loadAllOficinas();
     }, []);
 
-    // Filter oficinas based on search input - show all when empty, filter when typing
+    // Oficina suggestions from the backend typeahead (code, name, city) as the user types
     useEffect(() => {
-        if (filterOficinaSearch.trim() === '') {
-            // Show all when empty (will be triggered on focus)
-            setFilteredOficinas(allOficinas.slice(0, 15)); // Show first 15
-        } else {
-            const searchLower = filterOficinaSearch.toLowerCase();
-            const filtered = allOficinas.filter(o =>
-                (o.nombre || '').toLowerCase().includes(searchLower) ||
-                (o.ciudad || '').toLowerCase().includes(searchLower)
-            ).slice(0, 15); // Limit to 15 suggestions
-            setFilteredOficinas(filtered);
+        const query = filterOficinaSearch.trim();
+        if (query === '') {
+            setFilteredOficinas([]);
+            return;
         }
-    }, [filterOficinaSearch, allOficinas]);
+        const timer = setTimeout(async () => {
+            try {
+                const params = new URLSearchParams({ q: query, limit: '15' });
+                const res = await fetch(`${API_URL}/autocomplete/oficinas?${params}`);
+                if (res.ok) {
+                    setFilteredOficinas((await res.json()).data);
+                }
+            } catch (error) {
+                console.error("Failed to search oficinas", error);
+            }
+        }, 200);
+        return () => clearTimeout(timer);
+    }, [filterOficinaSearch]);
 
     // Handle oficina selection from autocomplete
     const handleSelectOficina = (oficina: Oficina) => {
@@ -964,14 +952,11 @@ export default function FacturasPage() {
         if (query.length < 2) return;
         setLoadingProveedores(true);
         try {
-            const res = await fetch(`${API_URL}/proveedores/?limit=100`);
+            const params = new URLSearchParams({ q: query, limit: '20' });
+            const res = await fetch(`${API_URL}/autocomplete/proveedores?${params}`);
             if (res.ok) {
-                const data: Proveedor[] = await res.json();
-                const filtered = data.filter(p =>
-                    p.nombre.toLowerCase().includes(query.toLowerCase()) ||
-                    p.nit.toLowerCase().includes(query.toLowerCase())
-                );
-                setEditProveedores(filtered);
+                const data: { data: Proveedor[] } = await res.json();
+                setEditProveedores(data.data);
             }
         } catch (error) {
             console.error("Failed to search proveedores", error);
@@ -1157,6 +1142,20 @@ export default function FacturasPage() {
                         </button>
                     </div>
 
+                    {/* Consolidado scope: selected ids or every factura of the filter */}
+                    {consolidadoFiltroTotal !== null ? (
+                        <div className="text-xs text-emerald-300">
+                            Consolidado: las {consolidadoFiltroTotal} facturas del filtro (todas las páginas).{' '}
+                            <button onClick={() => setConsolidadoFiltroTotal(null)} className="underline hover:text-white">
+                                Solo las seleccionadas
+                            </button>
+                        </div>
+                    ) : puedeSeleccionarFiltro && (
+                        <button onClick={selectAllFiltro} className="text-xs text-emerald-300 underline hover:text-white text-left">
+                            Seleccionar todas las facturas del filtro para el consolidado
+                        </button>
+                    )}
+
                     {/* Action Buttons */}
                     <div className="flex flex-col gap-2 pt-1">
                         {/* Generar Consolidado */}
@@ -1172,7 +1171,7 @@ export default function FacturasPage() {
                                     <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M9 17v-2m3 2v-4m3 4v-6m2 10H7a2 2 0 01-2-2V5a2 2 0 012-2h5.586a1 1 0 01.707.293l5.414 5.414a1 1 0 01.293.707V19a2 2 0 01-2 2z" />
                                 </svg>
                             )}
-                            Generar Consolidado
+                            Generar Consolidado{consolidadoFiltroTotal !== null && ` (${consolidadoFiltroTotal})`}
                         </button>
 
                         {/* Generar Archivo Plano */}
@@ -2426,6 +2425,16 @@ export default function FacturasPage() {
                                             <p className="text-sm text-emerald-600">
                                                 Siguiente consecutivo disponible: <span className="font-bold text-lg">{consecutivoManager.consecutivo}</span>
                                             </p>
+                                            <p className="text-xs text-emerald-600 mt-1">
+                                                IVA y retefuente tomados de los contratos de las oficinas asignadas
+                                            </p>
+                                        </div>
+                                    )}
+
+                                    {causacionAviso && (
+                                        <div className="bg-amber-50 border border-amber-200 rounded-lg p-4">
+                                            <p className="font-semibold text-amber-700 mb-1">Seleccione IVA y retefuente</p>
+                                            <p className="text-sm text-amber-600">{causacionAviso}</p>
                                         </div>
                                     )}
 
@@ -2436,11 +2445,15 @@ export default function FacturasPage() {
                                         </label>
                                         <input
                                             type="number"
-                                            value={causacionConfig.numedoc}
-                                            onChange={(e) => setCausacionConfig(prev => ({
-                                                ...prev,
-                                                numedoc: parseInt(e.target.value) || 0
-                                            }))}
+                                            value={causacionConfig.numedoc ?? ''}
+                                            placeholder="Siguiente consecutivo DC07 de Manager"
+                                            onChange={(e) => {
+                                                setCausacionConfig(prev => ({
+                                                    ...prev,
+                                                    numedoc: parseInt(e.target.value) || null
+                                                }));
+                                                setCausacionEditado(prev => ({ ...prev, numedoc: true }));
+                                            }}
                                             className="w-full px-3 py-2 border border-gray-300 rounded-lg focus:ring-2 focus:ring-purple-500 focus:border-transparent"
                                         />
                                     </div>
@@ -2451,10 +2464,13 @@ export default function FacturasPage() {
                                             <input
                                                 type="checkbox"
                                                 checked={causacionConfig.tiene_iva}
-                                                onChange={(e) => setCausacionConfig(prev => ({
-                                                    ...prev,
-                                                    tiene_iva: e.target.checked
-                                                }))}
+                                                onChange={(e) => {
+                                                    setCausacionConfig(prev => ({
+                                                        ...prev,
+                                                        tiene_iva: e.target.checked
+                                                    }));
+                                                    setCausacionEditado(prev => ({ ...prev, impuestos: true }));
+                                                }}
                                                 className="w-5 h-5 rounded border-gray-300 text-purple-600 focus:ring-purple-500"
                                             />
                                             <div>
@@ -2474,10 +2490,13 @@ export default function FacturasPage() {
                                                         name="causacion_retefuente"
                                                         value="0"
                                                         checked={causacionConfig.porcentaje_retefuente === 0}
-                                                        onChange={() => setCausacionConfig(prev => ({
-                                                            ...prev,
-                                                            porcentaje_retefuente: 0
-                                                        }))}
+                                                        onChange={() => {
+                                                            setCausacionConfig(prev => ({
+                                                                ...prev,
+                                                                porcentaje_retefuente: 0
+                                                            }));
+                                                            setCausacionEditado(prev => ({ ...prev, impuestos: true }));
+                                                        }}
                                                         className="w-4 h-4 text-purple-600 focus:ring-purple-500"
                                                     />
                                                     <span className="text-sm text-gray-700">Sin retefuente</span>
@@ -2488,10 +2507,13 @@ export default function FacturasPage() {
                                                         name="causacion_retefuente"
                                                         value="4"
                                                         checked={causacionConfig.porcentaje_retefuente === 4}
-                                                        onChange={() => setCausacionConfig(prev => ({
-                                                            ...prev,
-                                                            porcentaje_retefuente: 4
-                                                        }))}
+                                                        onChange={() => {
+                                                            setCausacionConfig(prev => ({
+                                                                ...prev,
+                                                                porcentaje_retefuente: 4
+                                                            }));
+                                                            setCausacionEditado(prev => ({ ...prev, impuestos: true }));
+                                                        }}
                                                         className="w-4 h-4 text-purple-600 focus:ring-purple-500"
                                                     />
                                                     <span className="text-sm text-gray-700">4%</span>
@@ -2502,10 +2524,13 @@ export default function FacturasPage() {
                                                         name="causacion_retefuente"
                                                         value="6"
                                                         checked={causacionConfig.porcentaje_retefuente === 6}
-                                                        onChange={() => setCausacionConfig(prev => ({
-                                                            ...prev,
-                                                            porcentaje_retefuente: 6
-                                                        }))}
+                                                        onChange={() => {
+                                                            setCausacionConfig(prev => ({
+                                                                ...prev,
+                                                                porcentaje_retefuente: 6
+                                                            }));
+                                                            setCausacionEditado(prev => ({ ...prev, impuestos: true }));
+                                                        }}
                                                         className="w-4 h-4 text-purple-600 focus:ring-purple-500"
                                                     />
                                                     <span className="text-sm text-gray-700">6%</span>
@@ -2662,7 +2687,7 @@ export default function FacturasPage() {
                                 {!showCausacionTable ? (
                                     <button
                                         onClick={loadCausacionPreview}
-                                        disabled={loadingCausacionPreview}
+                                        disabled={loadingCausacionPreview || loadingConsecutivo}
                                         className="px-6 py-2 bg-purple-600 hover:bg-purple-700 text-white rounded-lg font-medium transition-colors flex items-center gap-2 disabled:opacity-50"
                                     >
                                         {loadingCausacionPreview ? (
@@ -2788,47 +2813,14 @@ export default function FacturasPage() {
                                                 if (!confirmed) return;
 
                                                 try {
-                                                    // Prepare the request body matching the preview request
-                                                    const selectedFacturasData = facturas.filter(f => selectedFacturaIds.has(f.id));
-
-                                                    const facturasForRequest: Array<{
-                                                        numero_factura: string;
-                                                        fecha_factura: string | null;
-                                                        oficinas: Array<{ cod_oficina: string; valor: number; nombre_oficina: string }>;
-                                                    }> = [];
-
-                                                    for (const factura of selectedFacturasData) {
-                                                        const oficinas: Array<{ cod_oficina: string; valor: number; nombre_oficina: string }> = [];
-                                                        if (factura.oficinas_asignadas && factura.oficinas_asignadas.length > 0) {
-                                                            for (const oa of factura.oficinas_asignadas) {
-                                                                if (oa.oficina?.cod_oficina && oa.valor) {
-                                                                    oficinas.push({
-                                                                        cod_oficina: oa.oficina.cod_oficina,
-                                                                        valor: oa.valor,
-                                                                        nombre_oficina: oa.oficina.nombre || oa.oficina.cod_oficina
-                                                                    });
-                                                                }
-                                                            }
-                                                        }
-                                                        if (oficinas.length > 0) {
-                                                            facturasForRequest.push({
-                                                                numero_factura: factura.numero_factura || '',
-                                                                fecha_factura: factura.fecha_factura || null,
-                                                                oficinas: oficinas
-                                                            });
-                                                        }
-                                                    }
-
+                                                    // Same request as the preview, with the NUMEDOC it showed
                                                     const requestBody = {
-                                                        proveedor_nit: causacionPreviewData.proveedor_nit,
-                                                        proveedor_nombre: causacionPreviewData.proveedor_nombre,
-                                                        tiene_iva: causacionPreviewData.tiene_iva,
-                                                        porcentaje_retefuente: causacionPreviewData.porcentaje_retefuente,
-                                                        numedoc: causacionPreviewData.numedoc_inicial,
-                                                        facturas: facturasForRequest
+                                                        ...causacionRequest,
+                                                        factura_ids: causacionRequest?.factura_ids ?? Array.from(selectedFacturaIds),
+                                                        numedoc: causacionPreviewData.numedoc_inicial
                                                     };
 
-                                                    const res = await fetch(`${API_URL}/causacion-manager/insertar`, {
+                                                    const res = await fetch(`${API_URL}/causacion-manager/facturas/insertar`, {
                                                         method: 'POST',
                                                         headers: { 'Content-Type': 'application/json' },
                                                         body: JSON.stringify(requestBody)
@@ -2836,7 +2828,9 @@ export default function FacturasPage() {
 
                                                     const result = await res.json();
 
-                                                    if (result.success) {
+                                                    if (!res.ok) {
+                                                        alert(`❌ ERROR EN CAUSACIÓN\n\n${result.detail || 'No se pudo insertar la causación'}`);
+                                                    } else if (result.success) {
                                                         alert(
                                                             `✅ CAUSACIÓN EXITOSA\n\n` +
                                                             `${result.message}\n\n` +
@@ -12,7 +12,6 @@ export default function PendientesPorLlegarPage() {
     const [search, setSearch] = useState('');
     const [oficinaSearch, setOficinaSearch] = useState('');
     const [selectedOficina, setSelectedOficina] = useState<Oficina | null>(null);
-    const [allOficinas, setAllOficinas] = useState<Oficina[]>([]);
     const [filteredOficinas, setFilteredOficinas] = useState<Oficina[]>([]);
     const [showOficinaSuggestions, setShowOficinaSuggestions] = useState(false);
 
@@ -32,36 +31,30 @@ export default function PendientesPorLlegarPage() {
         }
     };
 
-    const loadOficinas = async () => {
-        try {
-            const res = await fetch(`${API_URL}/oficinas/?limit=1000`);
-            if (res.ok) {
-                setAllOficinas(await res.json());
-            }
-        } catch (error) {
-            console.error("Failed to load oficinas", error);
-        }
-    };
-
     useEffect(() => {
         fetchPendientes();
-        loadOficinas();
     }, []);
 
-    // Filter oficinas as user types
+    // Oficina suggestions from the backend typeahead as the user types
     useEffect(() => {
-        if (oficinaSearch.trim() === '') {
+        const query = oficinaSearch.trim();
+        if (query === '') {
             setFilteredOficinas([]);
             return;
         }
-        const term = oficinaSearch.toLowerCase();
-        const filtered = allOficinas.filter((o: Oficina) =>
-            o.nombre?.toLowerCase().includes(term) ||
-            o.cod_oficina?.toLowerCase().includes(term) ||
-            o.ciudad?.toLowerCase().includes(term)
-        ).slice(0, 8);
-        setFilteredOficinas(filtered);
-    }, [oficinaSearch, allOficinas]);
+        const timer = setTimeout(async () => {
+            try {
+                const params = new URLSearchParams({ q: query, limit: '8' });
+                const res = await fetch(`${API_URL}/autocomplete/oficinas?${params}`);
+                if (res.ok) {
+                    setFilteredOficinas((await res.json()).data);
+                }
+            } catch (error) {
+                console.error("Failed to search oficinas", error);
+            }
+        }, 200);
+        return () => clearTimeout(timer);
+    }, [oficinaSearch]);
 
     // Local filtering of contracts
     const filteredContratos = contratos.filter((c: Contrato) => {
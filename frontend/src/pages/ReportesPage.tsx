@@ -1,6 +1,7 @@
 import { useState, useEffect, useRef, useMemo } from 'react';
 
 const API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000/api';
+const PREVIEW_PAGE_SIZE = 50;
 
 interface Proveedor {
     id: number;
@@ -53,6 +54,8 @@ interface ReportRow {
 
 interface PreviewResponse {
     total_registros: number;
+    skip: number;
+    limit: number;
     meses: MonthData[];
     data: ReportRow[];
 }
@@ -514,10 +517,12 @@ export default function ReportesPage() {
         return params;
     };
 
-    const handlePreview = async () => {
+    const handlePreview = async (skip: number = 0) => {
         setLoading(true);
         try {
             const params = buildQueryParams();
+            params.append('skip', skip.toString());
+            params.append('limit', PREVIEW_PAGE_SIZE.toString());
             const res = await fetch(`${API_URL}/reportes/preview?${params}`);
             const data = await res.json();
             setPreview(data);
@@ -721,7 +726,7 @@ export default function ReportesPage() {
 
                 {/* Action Buttons */}
                 <div className="flex flex-wrap gap-3 mt-6">
-                    <button onClick={handlePreview} disabled={loading} className="flex items-center gap-2 px-6 py-3 bg-blue-600 text-white rounded-xl hover:bg-blue-700 transition-all disabled:opacity-50 shadow-lg hover:shadow-xl">
+                    <button onClick={() => handlePreview()} disabled={loading} className="flex items-center gap-2 px-6 py-3 bg-blue-600 text-white rounded-xl hover:bg-blue-700 transition-all disabled:opacity-50 shadow-lg hover:shadow-xl">
                         {loading ? <div className="w-5 h-5 border-2 border-white border-t-transparent rounded-full animate-spin" /> : <svg className="w-5 h-5" fill="none" stroke="currentColor" viewBox="0 0 24 24"><path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M15 12a3 3 0 11-6 0 3 3 0 016 0z" /><path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M2.458 12C3.732 7.943 7.523 5 12 5c4.478 0 8.268 2.943 9.542 7-1.274 4.057-5.064 7-9.542 7-4.477 0-8.268-2.943-9.542-7z" /></svg>}
                         Vista Previa
                     </button>
@@ -753,7 +758,7 @@ export default function ReportesPage() {
                         <div className="flex justify-between items-center">
                             <div>
                                 <h3 className="text-lg font-semibold">Vista Previa del Reporte</h3>
-                                <p className="text-blue-100 text-sm">Mostrando primeros 50 de {preview.total_registros} registros</p>
+                                <p className="text-blue-100 text-sm">Mostrando {preview.data.length > 0 ? preview.skip + 1 : 0}-{preview.skip + preview.data.length} de {preview.total_registros} registros</p>
                             </div>
                             <div className="flex gap-4 text-sm">
                                 <div className="bg-white/20 rounded-lg px-3 py-1"><span className="font-semibold">{preview.total_registros}</span> contratos</div>
@@ -818,9 +823,27 @@ export default function ReportesPage() {
                         </table>
                     </div>
 
-                    {preview.total_registros > 50 && (
-                        <div className="bg-yellow-50 border-t border-yellow-100 px-4 py-3 text-center text-sm text-yellow-700">
-                            ⚠️ Vista previa limitada a 50 registros. Exporta a Excel para ver los {preview.total_registros} registros completos.
+                    {preview.total_registros > preview.limit && (
+                        <div className="flex justify-center items-center gap-4 py-4 border-t border-gray-100">
+                            <button
+                                onClick={() => handlePreview(Math.max(0, preview.skip - preview.limit))}
+                                disabled={preview.skip === 0 || loading}
+                                className="px-4 py-2 bg-white border border-gray-300 rounded-lg hover:bg-gray-50 disabled:opacity-50 disabled:cursor-not-allowed transition-colors"
+                            >
+                                ← Anterior
+                            </button>
+
+                            <span className="text-sm text-gray-600">
+                                Página {Math.floor(preview.skip / preview.limit) + 1} de {Math.ceil(preview.total_registros / preview.limit)}
+                            </span>
+
+                            <button
+                                onClick={() => handlePreview(preview.skip + preview.limit)}
+                                disabled={preview.skip + preview.limit >= preview.total_registros || loading}
+                                className="px-4 py-2 bg-white border border-gray-300 rounded-lg hover:bg-gray-50 disabled:opacity-50 disabled:cursor-not-allowed transition-colors"
+                            >
+                                Siguiente →
+                            </button>
                         </div>
                     )}
                 </div>